@@ -2,27 +2,49 @@
 # -*- coding: UTF-8 -*-
 
 import os
+import sys
+import cProfile
+import tracemalloc
+
+# --profile starts before the heavy imports, the other options are read later on
+startup_profile = None
+if '--profile' in sys.argv[1:]:
+    tracemalloc.start()
+    startup_profile = cProfile.Profile()
+    startup_profile.enable()
+
 import wx
 import wx.adv
-import sys
+import re
 import json
 import stat
 import time
+import io
+import errno
+import bisect
+import gc
+import gzip
 import random
+import signal
 import shutil
+import socket
+import tarfile
+import zipfile
+import asyncio
+import contextvars
 import hashlib
+import hmac
 import logging
 import tempfile
 import platform
 import pyperclip
 import requests
 import subprocess
-from urllib.parse import urlparse
+from urllib.parse import urlparse, urljoin
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
 from threading import *
-
-# AWS S3 upload
-import boto3
-from botocore.exceptions import ClientError
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, CancelledError
 
 game_name = 'Beyond All Reason'
 log_file_name = 'bar-launcher.log'
@@ -30,8 +52,8 @@ logs_bucket = 'bar-infologs'
 logs_url = f'https://{logs_bucket}.s3.amazonaws.com/'
 window_size = (800, 380)
 
-# Global variable for a child process. Since we're running everything sequentially, "there can be only one" (c)
-child_process = None
+# Held by whoever is currently writing into the data dir (update or background prefetch)
+update_lock = Lock()
 
 main_frame = None # global variable for a window to send all events to
 
@@ -42,10 +64,12 @@ def EVT_EXEC_FINISHED(win, func):
     win.Connect(-1, -1, EVT_EXEC_FINISHED_ID, func)
 
 class ExecFinishedEvent(wx.PyEvent):
-    def __init__(self, data):
+    def __init__(self, data, cancelled=False, report=None):
         wx.PyEvent.__init__(self)
         self.SetEventType(EVT_EXEC_FINISHED_ID)
         self.data = data
+        self.cancelled = cancelled
+        self.report = report # Readiness of the configs after updating them all, data is the summary then
 
 # Custom event to notify about log upload finished
 EVT_LOG_UPLOADED_ID = int(wx.NewIdRef(count=1))
@@ -95,6 +119,31 @@ class IconizeWindowEvent(wx.PyEvent):
         self.SetEventType(EVT_ICONIZE_WINDOW_ID)
         self.data = data
 
+# Custom event to update the background prefetch status
+EVT_PREFETCH_STATUS_ID = int(wx.NewIdRef(count=1))
+
+def EVT_PREFETCH_STATUS(win, func):
+    win.Connect(-1, -1, EVT_PREFETCH_STATUS_ID, func)
+
+class PrefetchStatusEvent(wx.PyEvent):
+    def __init__(self, data):
+        wx.PyEvent.__init__(self)
+        self.SetEventType(EVT_PREFETCH_STATUS_ID)
+        self.data = data
+
+# Custom event to swap in a window asset (icon, background or font) once it's downloaded
+EVT_ASSET_LOADED_ID = int(wx.NewIdRef(count=1))
+
+def EVT_ASSET_LOADED(win, func):
+    win.Connect(-1, -1, EVT_ASSET_LOADED_ID, func)
+
+class AssetLoadedEvent(wx.PyEvent):
+    def __init__(self, resource_name, path):
+        wx.PyEvent.__init__(self)
+        self.SetEventType(EVT_ASSET_LOADED_ID)
+        self.resource_name = resource_name
+        self.path = path
+
 # Custom event to catch logger messages and add them to text control
 EVT_LOGGER_MSG_ID = int(wx.NewIdRef(count=1))
 
@@ -110,12 +159,182 @@ class LoggerMsgEvent(wx.PyEvent):
 
 # Custom logging handler to send logger events
 class LoggerToTextCtlHandler(logging.StreamHandler):
+    suspended = False # While the game runs in the low-footprint mode, the messages only go to the log file
+
     def emit(self, record):
+        if self.suspended:
+            return
         message = self.format(record)
         event = LoggerMsgEvent(message=message, levelname=record.levelname)
         if main_frame:
             wx.PostEvent(main_frame, event)
 
+# Custom event to pass a command from another launcher instance to this one
+EVT_INSTANCE_COMMAND_ID = int(wx.NewIdRef(count=1))
+
+def EVT_INSTANCE_COMMAND(win, func):
+    win.Connect(-1, -1, EVT_INSTANCE_COMMAND_ID, func)
+
+class InstanceCommandEvent(wx.PyEvent):
+    def __init__(self, data):
+        wx.PyEvent.__init__(self)
+        self.SetEventType(EVT_INSTANCE_COMMAND_ID)
+        self.data = data
+
+# One launcher per install dir. A second one hands its command over to the running one and exits, before opening the log or downloading anything
+class InstanceGuard():
+    lock_path = os.path.abspath('bar-launcher.lock')
+    info_path = os.path.abspath('bar-launcher-instance.json') # How to reach the running instance
+    connect_timeout = 10 # Seconds, the running instance may still be starting up
+    forwarded_flags = ['--start', '--update-all']
+    exclusive_flags = ['--gc', '--dry-run', '--export-bundle', '--import-bundle'] # Can't run next to another launcher
+    unguarded_flags = ['--upgrade', '--make-chunk-index'] # Don't touch the data dir
+
+    def __init__(self, *args, **kwds):
+        self.lock_file = None
+        self.token = None
+        self.shared = False # Running next to another launcher without the lock, mustn't touch its log or config
+
+    def acquire(self):
+        lock_file = open(self.lock_path, 'a+')
+        try:
+            if platform.system() == 'Windows':
+                import msvcrt
+                lock_file.seek(0)
+                msvcrt.locking(lock_file.fileno(), msvcrt.LK_NBLCK, 1)
+            else:
+                import fcntl
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            return False
+        # Held until the process exits, the OS releases it even after a crash
+        self.lock_file = lock_file
+        return True
+
+    def release(self):
+        if self.lock_file:
+            self.lock_file.close()
+            self.lock_file = None
+
+    def get_socket_path(self):
+        # Unix socket paths are short, so it goes to the temp dir under a name unique for the install dir
+        return os.path.join(tempfile.gettempdir(), 'bar-launcher-{0}.sock'.format(hashlib.md5(os.getcwd().encode('utf-8')).hexdigest()[:12]))
+
+    def get_command(self, args):
+        if '--update-all' in args:
+            return {'command': 'update_all'}
+        if '--start' in args:
+            config = args[args.index('--config') + 1] if '--config' in args and args.index('--config') + 1 < len(args) else None
+            return {'command': 'start', 'config': config}
+        return {'command': 'show'}
+
+    # Returns if this is the only launcher, otherwise forwards the command line to the running one and exits
+    def check(self, args):
+        # Not holding the lock, --upgrade starts the new launcher before it exits
+        if any(flag in args for flag in self.unguarded_flags):
+            self.shared = not self.acquire()
+            self.release()
+            return
+
+        if self.acquire():
+            return
+
+        if any(flag in args for flag in self.exclusive_flags):
+            print('Another BAR Launcher is running in this directory, close it first!')
+            sys.exit(1)
+
+        command = self.get_command(args)
+        if self.send(command):
+            print(f'BAR Launcher is already running, passed "{command["command"]}" over to it')
+            sys.exit()
+
+        print('Another BAR Launcher is running in this directory, but it doesn\'t respond!')
+        sys.exit(1)
+
+    def send(self, command):
+        deadline = time.monotonic() + self.connect_timeout
+        while time.monotonic() < deadline:
+            try:
+                with open(self.info_path, 'r') as f:
+                    info = json.load(f)
+                if 'unix' in info:
+                    client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+                    address = info['unix']
+                else:
+                    client = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+                    address = ('127.0.0.1', info['port'])
+                with client:
+                    client.settimeout(5)
+                    client.connect(address)
+                    client.sendall(json.dumps(dict(command, token=info['token'])).encode('utf-8') + b'\n')
+                    if client.makefile('rb').readline().strip() == b'ok':
+                        return True
+            except (OSError, ValueError, KeyError):
+                pass
+            time.sleep(0.5)
+        return False
+
+    # Called by the running launcher once it can handle the commands
+    def serve(self, handle_command):
+        global logger
+
+        self.token = os.urandom(16).hex()
+        server = None
+        info = {'pid': os.getpid(), 'token': self.token}
+        if hasattr(socket, 'AF_UNIX'):
+            socket_path = self.get_socket_path()
+            try:
+                if os.path.exists(socket_path):
+                    os.remove(socket_path) # Left by a launcher that crashed, the lock says it's gone
+                server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+                server.bind(socket_path)
+                os.chmod(socket_path, 0o600)
+                info['unix'] = socket_path
+            except OSError:
+                server = None
+
+        # No Unix sockets on Windows, the token keeps the other local users out
+        if not server:
+            server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            server.bind(('127.0.0.1', 0))
+            info['port'] = server.getsockname()[1]
+
+        server.listen(4)
+        with open(self.info_path, 'w') as f:
+            json.dump(info, f)
+        Thread(target=self.accept_commands, args=(server, handle_command), name='InstanceGuard', daemon=True).start()
+        logger.info(f'Listening for the commands of the other launchers on {info.get("unix", info.get("port"))}')
+
+    def accept_commands(self, server, handle_command):
+        global logger
+
+        while True:
+            try:
+                connection, _ = server.accept()
+            except OSError:
+                return
+
+            try:
+                with connection:
+                    connection.settimeout(5)
+                    message = json.loads(connection.makefile('rb').readline(64 * 1024))
+                    if not hmac.compare_digest(str(message.pop('token', '')), self.token):
+                        logger.warning('Ignoring a command with a wrong token')
+                        continue
+                    handle_command(message)
+                    connection.sendall(b'ok\n')
+            except:
+                logger.warning('Couldn\'t receive a command from another launcher:')
+                e = str(sys.exc_info()[1])
+                logger.warning(e)
+
+instance_guard = InstanceGuard()
+
+# Before the log is truncated and the launcher config is downloaded below
+if __name__ == "__main__":
+    instance_guard.check(sys.argv[1:])
+
 logger = logging.getLogger()
 log_formatter_short = logging.Formatter('%(message)s')
 log_formatter_long = logging.Formatter('%(asctime)s %(levelname)s %(message)s')
@@ -128,7 +347,8 @@ log_text_ctl_handler = LoggerToTextCtlHandler()
 log_text_ctl_handler.setFormatter(log_formatter_short)
 logger.addHandler(log_text_ctl_handler)
 
-log_file_handler = logging.FileHandler(log_file_name, mode='w')
+# Appending if another launcher is writing the log
+log_file_handler = logging.FileHandler(log_file_name, mode='a' if instance_guard.shared else 'w')
 log_file_handler.setFormatter(log_formatter_long)
 logger.addHandler(log_file_handler)
 
@@ -168,8 +388,37 @@ class FileManager():
     def rename(self, current_path, new_path):
         return os.rename(current_path, new_path)
 
-    def rename(self, current_path, new_path):
-        return os.rename(current_path, new_path)
+    def replace(self, current_path, new_path):
+        return os.replace(current_path, new_path)
+
+    def get_file_size(self, path):
+        return os.path.getsize(path)
+
+    def calc_file_hash(self, path, algorithm='sha256'):
+        file_hash = hashlib.new(algorithm)
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                file_hash.update(chunk)
+        return file_hash.hexdigest()
+
+    def format_size(self, size):
+        for unit in ['B', 'KB', 'MB', 'GB']:
+            if abs(size) < 1024 or unit == 'GB':
+                break
+            size /= 1024
+        return f'{size:.1f} {unit}' if unit != 'B' else f'{int(size)} B'
+
+    def read_json(self, path):
+        with open(path, 'r') as f:
+            return json.load(f)
+
+    def write_json(self, path, data):
+        # Writing to a temp file first and renaming it, so a crash can't leave a half-written file behind
+        temp_path = f'{path}.tmp'
+        self.make_dirs(self.extract_dir_name(path))
+        with open(temp_path, 'w') as f:
+            json.dump(data, f, indent=4)
+        self.replace(temp_path, path)
 
     def remove(self, path):
         global logger
@@ -198,7 +447,9 @@ class PlatformManager():
     current_dir = file_manager.get_current_dir()
     data_dir = file_manager.join_path(current_dir, 'data')
     executable_dir = file_manager.join_path(current_dir, 'bin')
+    executables_lock = Lock()
 
+    # Any 'url' here (and any entry of 'downloads' below) can also be a list of mirrors for the same file, the fastest one is used
     resources = {
         'launcher_config': {
             'url': 'https://raw.githubusercontent.com/beyond-all-reason/BYAR-Chobby/master/dist_cfg/config.json',
@@ -265,7 +516,8 @@ class PlatformManager():
             #logger.info(f'File {resource_path} already exists, skipping download...')
             return True
 
-        if not http_downloader.download_file(resource_url, resource_path):
+        # Existing files are only re-downloaded if they were changed on the server
+        if not http_downloader.download_file(resource_url, resource_path, conditional=True):
             if (ignore_download_fail and file_manager.file_exists(resource_path)):
                 logger.error(f'Downloading {resource_name} failed, will use the existing file!')
                 return True
@@ -279,16 +531,15 @@ class PlatformManager():
             resources_list = self.resources[resource_name].copy()
             while True:
                 # Trying to pick a random resource from the list and download it
-                resource_num = random.randrange(len(resources_list))
+                resource = random.choice(resources_list)
+                resource_num = self.resources[resource_name].index(resource)
                 if self.ensure_resource_exists(resource_name, force_download_fresh, ignore_download_fail, resource_num) or ignore_download_fail:
-                    break # Exiting the loop after successfully downloading a resource
+                    return resource['path']
 
-                resources_list.pop(resource_num) # Removing a failed resource from the list
+                resources_list.remove(resource) # Removing a failed resource from the list, so it isn't picked again
                 if len(resources_list) <= 0:
                     raise Exception(f'Couldn\'t find or download any of the {resource_name} to use!')
 
-            return resources_list[resource_num]['path']
-
         if not self.ensure_resource_exists(resource_name, force_download_fresh, ignore_download_fail):
             raise Exception(f'Couldn\'t find or download the {resource_name} to use!')
 
@@ -441,365 +692,4154 @@ class PlatformManager():
         full_command = self.get_executable_full_command(name)
         executable_full_path = full_command[0]
 
-        # Only download the missing executables
-        if not file_manager.file_exists(executable_full_path):
-            logger.warning(f'Executable for {name} wasn\'t found in: {executable_full_path}')
-            self.download_executable(name, target_dir)
-        else:
-            logger.info(f'Executable for {name} already exists')
+        # Concurrent extractions may ask for 7zip at the same time, downloading it once
+        with self.executables_lock:
+            # Only download the missing executables
+            if not file_manager.file_exists(executable_full_path):
+                logger.warning(f'Executable for {name} wasn\'t found in: {executable_full_path}')
+                self.download_executable(name, target_dir)
+            else:
+                logger.info(f'Executable for {name} already exists')
 
 platform_manager = PlatformManager()
 
-class ProcessStarter():
-    def start_process(self, command, nowait=False):
-        global main_frame
-        global logger
-        global child_process
-
-        logger.info('Starting a process:')
-        logger.info(' '.join(command))
-        try:
-            if nowait:
-                subprocess.Popen(command)
-                return True
-
-            with subprocess.Popen(command, stdout=subprocess.PIPE) as proc:
-                child_process = proc
-                while True:
-                    line = proc.stdout.readline()
-                    if not line:
-                        break
-                    if len(line.rstrip()) > 0:
-                        logger.info(line.rstrip().decode('utf-8'))
+class CommandLineManager():
+    def __init__(self, args):
+        self.args = args
+
+    def has_flag(self, name):
+        return name in self.args
+
+    def get_option(self, name, default=None):
+        if name in self.args:
+            n = self.args.index(name)
+            if n + 1 < len(self.args):
+                return self.args[n + 1]
+        return default
+
+command_line = CommandLineManager(sys.argv[1:])
+
+class SettingsManager():
+    settings_path = file_manager.join_path(platform_manager.data_dir, 'launcher_settings.json')
+
+    defaults = {
+        'background_prefetch': False, # Opt-in, downloads updates in the background while idle or in-game
+        'prefetch_interval': 900, # Seconds between the launcher config polls
+        'prefetch_max_rate': 512 * 1024, # Bytes per second for the background downloads, 0 for unlimited
+        'bandwidth_limit': 0, # KB per second for all downloads together, 0 for unlimited
+        'max_concurrent_downloads': 4,
+        'adaptive_concurrency': True, # Tune the number of parallel downloads (up to the max) by the measured throughput
+        'engine_gc': False, # Opt-in, cleans up the engines no config refers to after updating
+        'engine_disk_budget': 2048, # MB of unreferenced engines to keep around, the least recently used ones go first
+        'engine_archive_dir': '', # Move the collected engines here instead of deleting them
+        'extract_threads': 0, # 7zip threads per archive, 0 to split the cores between the concurrent extractions
+        'max_concurrent_extractions': 0, # 0 for automatic, up to 2 depending on the cores
+        'game_telemetry': False, # Sample the game process and summarize the session in the log (Linux only)
+        'telemetry_interval': 5, # Seconds between the game process samples
+        'prewarm_cache': False, # Read the engine and game files into the OS cache before starting the game
+        'prewarm_budget': 2048, # MB to prewarm at most, also limited to half of the available memory
+        'metrics_port': 0, # Serve the metrics on http://127.0.0.1:<port>/metrics, 0 to disable
+        'metrics_textfile': '', # Write the metrics to this file for the node exporter textfile collector, empty to disable
+        'peer_cache': False, # Share the verified downloads with the launchers on the LAN and try them first
+        'peer_port': 0, # HTTP port to serve the peers on, 0 for any free one
+        'peer_discovery_port': 8201, # UDP port the peers announce themselves on
+        'peer_cache_budget': 4096, # MB of downloaded archives to keep for the peers
+        'fast_start': True, # Without updating, start with the cached lobby config and refresh it in the background
+        'download_attempts': 3, # Rounds over all the mirrors before giving up on a download
+        'retry_backoff': 1, # Seconds, doubled after every round and randomized
+        'retry_backoff_max': 30, # Seconds
+        'connect_timeout': 5, # Seconds
+        'read_timeout': 10, # Seconds of silence from the server, more for the larger files
+        'low_footprint': True, # Release the window images and the log view while the game is running
+        'chunked_updates': True, # Only download the changed chunks of the engines that publish a chunk index
+    }
 
-                #streamdata = proc.communicate()[0]
-                proc.wait()
+    # Command line options overriding the settings for this run only: option -> (setting name, type)
+    command_line_options = {
+        '--bandwidth-limit': ('bandwidth_limit', int),
+        '--max-downloads': ('max_concurrent_downloads', int),
+        '--download-attempts': ('download_attempts', int),
+        '--extract-threads': ('extract_threads', int),
+        '--max-extractions': ('max_concurrent_extractions', int),
+        '--metrics-port': ('metrics_port', int),
+        '--metrics-textfile': ('metrics_textfile', str),
+        '--peer-port': ('peer_port', int),
+    }
 
-                child_process = None
+    def __init__(self, *args, **kwds):
+        self.settings = dict(self.defaults)
+        self.overrides = {}
+        self.read_settings()
+        self.apply_command_line()
 
-                retcode = proc.returncode
-                logger.info(f'Process ended with status {retcode}')
+    def apply_command_line(self):
+        global logger
 
-                return retcode == 0
-        except:
-            child_process = None
-            logger.error('Process start failed!')
-            e = str(sys.exc_info()[1])
-            logger.error(e)
-            return False
+        for option, (name, value_type) in self.command_line_options.items():
+            value = command_line.get_option(option)
+            if value is None:
+                continue
+            try:
+                self.overrides[name] = value_type(value)
+            except ValueError:
+                logger.error(f'Invalid value for {option}: {value}')
 
-        return True
+        if command_line.has_flag('--no-adaptive-concurrency'):
+            self.overrides['adaptive_concurrency'] = False
 
-process_starter = ProcessStarter()
+        if command_line.has_flag('--telemetry'):
+            self.overrides['game_telemetry'] = True
 
-class ArchiveExtractor():
-    def extract_7zip(self, archive_name, destination):
-        global logger
+        if command_line.has_flag('--prewarm'):
+            self.overrides['prewarm_cache'] = True
 
-        platform_manager.ensure_executable_exists('7zip')
+        if command_line.has_flag('--engine-gc'):
+            self.overrides['engine_gc'] = True
 
-        zip_command = platform_manager.get_executable_full_command('7zip')
-        zip_executable = zip_command[0]
-        logger.info(f'Extracting archive: "{archive_name}" "{destination}"')
-        zip_command.extend(['x', archive_name, '-y', f'-o{destination}'])
-        return process_starter.start_process(zip_command)
+        if command_line.has_flag('--peer-cache'):
+            self.overrides['peer_cache'] = True
 
-archive_extractor = ArchiveExtractor()
+        if command_line.has_flag('--no-low-footprint'):
+            self.overrides['low_footprint'] = False
 
-class HttpDownloader():
-    def download_file(self, source_url, target):
+    def read_settings(self):
         global logger
 
-        logger.info(f'Downloading: "{source_url}" to: "{target}"')
-        try:
-            if file_manager.dir_exists(target): # Target is a directory, adding a filename from the URL to it
-                target_file = file_manager.join_path(target, file_manager.extract_filename(urlparse(source_url).path))
-            else:
-                target_file = target
+        if not file_manager.file_exists(self.settings_path):
+            return
 
-            logger.info(f'Creating directories for "{target_file}" if needed...')
-            file_manager.make_dirs(file_manager.extract_dir_name(target_file))
+        try:
+            self.settings.update(file_manager.read_json(self.settings_path))
+        except:
+            logger.error('Couldn\'t read the launcher settings, using defaults!')
+            e = str(sys.exc_info()[1])
+            logger.error(e)
 
-            response = requests.get(source_url, allow_redirects=True, timeout=3)
-            if response.status_code >= 300:
-                raise Exception('Bad response: {status_code} ({content})'.format(status_code=str(response.status_code), content=response.content.decode('utf-8')))
+    def save_settings(self):
+        global logger
 
-            open(target_file, 'wb').write(response.content)
+        try:
+            file_manager.write_json(self.settings_path, self.settings)
         except:
-            logger.error('Download failed:')
+            logger.error('Couldn\'t save the launcher settings!')
             e = str(sys.exc_info()[1])
             logger.error(e)
-            return None
-        return target_file
 
-http_downloader = HttpDownloader()
+    def get(self, name):
+        if name in self.overrides:
+            return self.overrides[name]
+        return self.settings.get(name, self.defaults.get(name))
+
+    def set(self, name, value):
+        self.overrides.pop(name, None)
+        self.settings[name] = value
+        self.save_settings()
+
+settings_manager = SettingsManager()
+
+# Counters and histograms in the Prometheus text format, opt-in through the metrics_port and metrics_textfile settings
+class MetricsRegistry():
+    prefix = 'bar_launcher_'
+    buckets = (0.5, 1, 5, 10, 30, 60, 120, 300, 600, 1800) # Seconds
+
+    # name -> (type, help)
+    definitions = {
+        'download_bytes_total': ('counter', 'Bytes downloaded over HTTP by host'),
+        'download_duration_seconds': ('histogram', 'Duration of the successful downloads by kind (http or rapid)'),
+        'download_retries_total': ('counter', 'Failed download attempts by host, each one moving on to the next mirror or giving up'),
+        'cache_requests_total': ('counter', 'Downloads checked against a cache (http, prefetch or peer) by result (hit or miss)'),
+        'extract_duration_seconds': ('histogram', 'Duration of the archive extractions by format'),
+        'process_exits_total': ('counter', 'Child process exits by executable and exit code'),
+        'time_to_game_seconds': ('histogram', 'Time from pressing the button to starting the game by mode (update or start)'),
+        'runs_total': ('counter', 'Update/Start runs by mode and result'),
+    }
 
-class PrDownloader():
-    def download_game(self, data_dir, game_name):
+    def __init__(self, *args, **kwds):
+        self.lock = Lock()
+        self.values = {} # name -> {sorted labels tuple -> counter value or histogram [bucket counts, sum, count]}
+        self.server = None
+
+    def get_key(self, labels):
+        return tuple(sorted((name, str(value)) for name, value in labels.items()))
+
+    def inc(self, name, value=1, **labels):
+        key = self.get_key(labels)
+        with self.lock:
+            series = self.values.setdefault(name, {})
+            series[key] = series.get(key, 0) + value
+
+    def observe(self, name, value, **labels):
+        key = self.get_key(labels)
+        with self.lock:
+            series = self.values.setdefault(name, {})
+            if key not in series:
+                series[key] = [[0] * len(self.buckets), 0, 0]
+            histogram = series[key]
+            for n in range(len(self.buckets)):
+                if value <= self.buckets[n]:
+                    histogram[0][n] += 1
+            histogram[1] += value
+            histogram[2] += 1
+
+    def format_labels(self, labels):
+        if not labels:
+            return ''
+        escaped = [(name, str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')) for name, value in labels]
+        return '{' + ','.join(f'{name}="{value}"' for name, value in escaped) + '}'
+
+    def render(self):
+        lines = []
+        with self.lock:
+            for name, (metric_type, help_text) in self.definitions.items():
+                full_name = self.prefix + name
+                lines.append(f'# HELP {full_name} {help_text}')
+                lines.append(f'# TYPE {full_name} {metric_type}')
+                for key, value in sorted(self.values.get(name, {}).items()):
+                    labels = list(key)
+                    if metric_type == 'counter':
+                        lines.append(f'{full_name}{self.format_labels(labels)} {value}')
+                        continue
+
+                    counts, total, count = value
+                    for n in range(len(self.buckets)):
+                        lines.append(f'{full_name}_bucket{self.format_labels(labels + [("le", str(self.buckets[n]))])} {counts[n]}')
+                    lines.append(f'{full_name}_bucket{self.format_labels(labels + [("le", "+Inf")])} {count}')
+                    lines.append(f'{full_name}_sum{self.format_labels(labels)} {total}')
+                    lines.append(f'{full_name}_count{self.format_labels(labels)} {count}')
+        return '\n'.join(lines) + '\n'
+
+    def start(self):
         global logger
 
-        platform_manager.ensure_executable_exists('pr_downloader')
+        port = settings_manager.get('metrics_port')
+        if port <= 0 or self.server:
+            return
 
-        logger.info(f'Downloading: "{game_name}" to: "{data_dir}"')
-        command = platform_manager.get_executable_full_command('pr_downloader')
-        command.extend(['--filesystem-writepath', data_dir, '--download-game', game_name])
-        return process_starter.start_process(command)
+        registry = self
 
-pr_downloader = PrDownloader()
+        class MetricsRequestHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path != '/metrics':
+                    self.send_error(404)
+                    return
+                body = registry.render().encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
 
-# Thread class that executes logs upload
-class LogUploaderThread(Thread):
-    def __init__(self, file_name, bucket, object_name):
-        Thread.__init__(self)
-        self.file_name = file_name
-        self.bucket = bucket
-        self.object_name = object_name
-        self.start()
+            def log_message(self, format, *args):
+                pass # Scrapes would flood the launcher log
 
-    def run(self):
-        global main_frame
+        try:
+            # Localhost only, the machines at events are scraped by a local agent
+            self.server = ThreadingHTTPServer(('127.0.0.1', port), MetricsRequestHandler)
+            self.server.daemon_threads = True
+            Thread(target=self.server.serve_forever, name='Metrics', daemon=True).start()
+            logger.info(f'Serving the metrics on http://127.0.0.1:{port}/metrics')
+        except OSError as e:
+            logger.error(f'Couldn\'t serve the metrics on port {port}: {e}')
+
+    def write_textfile(self):
         global logger
 
-        file_name = self.file_name
-        bucket = self.bucket
-        object_name = self.object_name
+        path = settings_manager.get('metrics_textfile')
+        if not path:
+            return
 
+        # The collector may read it at any time, so it's replaced as a whole
+        temp_path = f'{path}.tmp'
         try:
-            resp = requests.get(f'{logs_url}c', allow_redirects=True)
-            c = resp.json()
-            s3_client = boto3.client(
-                's3',
-                aws_access_key_id=c['access_key_id'],
-                aws_secret_access_key=c['secret_access_key']
-            )
-            logger.info(f'Uploading: "{file_name}" to: "{bucket}"')
-            response = s3_client.upload_file(file_name, bucket, object_name, ExtraArgs={'ContentType': 'text/plain'})
-            result = f'{logs_url}{object_name}'
-            if main_frame:
-                wx.PostEvent(main_frame, LogUploadedEvent(result))
-        except:
-            logger.error('Upload failed!')
-            e = str(sys.exc_info()[1])
-            logger.error(e)
-            if main_frame:
-                wx.PostEvent(main_frame, LogUploadedEvent(None))
+            with open(temp_path, 'w') as f:
+                f.write(self.render())
+            file_manager.replace(temp_path, path)
+        except OSError as e:
+            logger.error(f'Couldn\'t write the metrics to "{path}": {e}')
+
+metrics = MetricsRegistry()
+
+# Remembers ETag/Last-Modified of the downloaded files to make conditional requests next time
+# Downloads and extractions happen in unique per-job paths inside the data dir, so committing them is a rename on the same filesystem
+class StagingManager():
+    staging_dir = file_manager.join_path(platform_manager.data_dir, 'staging')
+
+    def get_job_name(self, name):
+        return name.replace('/', '_').replace(os.sep, '_')
+
+    # Jobs are tracked by the current cancel scope, so a cancelled update can clean up after itself
+    def track_job(self, path):
+        scope = current_scope.get()
+        if scope:
+            scope.partial_paths.add(path)
+        return path
+
+    def untrack_job(self, path):
+        scope = current_scope.get()
+        if scope:
+            scope.partial_paths.discard(path)
+
+    def create_job(self, name):
+        file_manager.make_dirs(self.staging_dir)
+        fd, path = tempfile.mkstemp(prefix=f'{os.getpid()}-', suffix=f'-{self.get_job_name(name)}', dir=self.staging_dir)
+        os.close(fd)
+        return self.track_job(path)
+
+    def create_job_dir(self, name):
+        file_manager.make_dirs(self.staging_dir)
+        return self.track_job(tempfile.mkdtemp(prefix=f'{os.getpid()}-', suffix=f'-{self.get_job_name(name)}', dir=self.staging_dir))
+
+    def remove_job(self, path):
+        self.untrack_job(path)
+        if file_manager.dir_exists(path):
+            shutil.rmtree(path, ignore_errors=True)
+        elif file_manager.file_exists(path):
+            file_manager.remove(path)
+
+    def preallocate(self, f, size):
+        # Reserving the space upfront avoids fragmentation and fails early if the disk is full
+        try:
+            if hasattr(os, 'posix_fallocate'):
+                os.posix_fallocate(f.fileno(), 0, size)
+            else:
+                f.truncate(size)
+        except OSError as e:
+            if e.errno == errno.ENOSPC:
+                raise
 
-class ClipboardManager():
-    def copy(self, text):
+    def commit(self, path, destination):
         global logger
 
+        logger.info(f'Moving "{path}" to: "{destination}"')
+        file_manager.make_dirs(file_manager.extract_dir_name(destination))
         try:
-            logger.info(f'Copying to clipboard: "{text}"')
-            pyperclip.copy(text)
-        except:
-            logger.error('Copying failed:')
-            e = str(sys.exc_info()[1])
-            logger.error(e)
-            return False
-        return True
+            file_manager.replace(path, destination)
+        except OSError as e:
+            if e.errno != errno.EXDEV:
+                raise
+            # Destination is on another filesystem, can't avoid copying
+            logger.warning(f'"{destination}" is on another filesystem, copying')
+            shutil.move(path, destination)
+        self.untrack_job(path)
 
-clipboard_manager = ClipboardManager()
+staging_manager = StagingManager()
 
-class ConfigManager():
-    compatible_configs = []
-    current_config = {}
+class HttpMetadataCache():
+    cache_path = file_manager.join_path(platform_manager.data_dir, 'http_cache.json')
 
     def __init__(self, *args, **kwds):
-        self.compatible_configs = self.get_compatible_configs()
+        self.lock = Lock()
+        self.entries = {}
+        self.read_cache()
 
-    def read_config(self):
+    def read_cache(self):
         global logger
 
-        launcher_config_path = platform_manager.get_resource_local_path('launcher_config', force_download_fresh=True, ignore_download_fail=True)
-
-        logger.info(f'Reading the config file from {launcher_config_path}')
-        f = open(launcher_config_path)
-        data = json.load(f)
-        f.close()
-        return data
+        if not file_manager.file_exists(self.cache_path):
+            return
 
-    def get_compatible_configs(self):
-        data = self.read_config()
-        result = []
+        try:
+            self.entries = file_manager.read_json(self.cache_path)
+        except:
+            logger.error('Couldn\'t read the HTTP metadata cache!')
+            e = str(sys.exc_info()[1])
+            logger.error(e)
 
-        if not 'setups' in data:
-            raise Exception('Not a valid config file, missing "setups" section!')
+    def get_conditional_headers(self, url):
+        with self.lock:
+            entry = self.entries.get(url, {})
+
+        headers = {}
+        if 'etag' in entry:
+            headers['If-None-Match'] = entry['etag']
+        if 'last_modified' in entry:
+            headers['If-Modified-Since'] = entry['last_modified']
+        return headers
+
+    def get_entry(self, url):
+        with self.lock:
+            return dict(self.entries.get(url, {}))
+
+    def set_entries(self, entries):
+        with self.lock:
+            self.entries.update(entries)
+            file_manager.write_json(self.cache_path, self.entries)
+
+    def update(self, url, headers):
+        entry = {}
+        if 'ETag' in headers:
+            entry['etag'] = headers['ETag']
+        if 'Last-Modified' in headers:
+            entry['last_modified'] = headers['Last-Modified']
+        if 'Content-Length' in headers and headers.get('Content-Encoding', 'identity') == 'identity':
+            entry['size'] = int(headers['Content-Length']) # For scaling the timeouts next time
+
+        with self.lock:
+            if not entry and not url in self.entries:
+                return
+            self.entries[url] = entry
+            file_manager.write_json(self.cache_path, self.entries)
 
-        for setup in data['setups']:
-            if not 'package' in setup or not 'platform' in setup['package'] or not 'launch' in setup:
-                raise Exception('Not a valid config setup, missing "package->platform" or "launch" section!')
+http_metadata_cache = HttpMetadataCache()
 
-            if ((setup['package']['platform'] == 'win32' and platform_manager.current_platform == 'Windows') \
-                    or (setup['package']['platform'] == 'linux' and platform_manager.current_platform == 'Linux') \
-                    or (setup['package']['platform'] == 'darwin' and platform_manager.current_platform == 'Darwin')):
-                result.append(setup)
-        return result
+# Runs an asyncio loop in a background thread. Worker threads hand their downloads and child processes to it
+# and wait for the results, so the wx main loop is never blocked and everything in flight can be cancelled
+class AsyncEngine():
+    def __init__(self, *args, **kwds):
+        self.lock = Lock()
+        self.loop = None
+        self.loop_thread = None
+        self.processes = set() # All the running child processes
+
+    def get_loop(self):
+        with self.lock:
+            if not self.loop:
+                self.loop = asyncio.new_event_loop()
+                self.loop_thread = Thread(target=self.loop.run_forever, name='AsyncEngine', daemon=True)
+                self.loop_thread.start()
+            return self.loop
+
+    async def run_in_scope(self, coro, scope):
+        if not scope:
+            return await coro
+
+        current_scope.set(scope)
+        task = asyncio.current_task()
+        scope.tasks.add(task)
+        try:
+            if scope.cancelled:
+                coro.close()
+                raise asyncio.CancelledError()
+            return await coro
+        finally:
+            scope.tasks.discard(task)
+
+    def submit(self, coro, scope=None):
+        return asyncio.run_coroutine_threadsafe(self.run_in_scope(coro, scope), self.get_loop())
+
+    # Blocks the calling worker thread until the coroutine is done, running it in the cancel scope of that thread
+    def run(self, coro):
+        if current_thread() is self.loop_thread:
+            coro.close()
+            raise Exception('Can\'t wait for a coroutine on the async engine thread!')
+
+        return self.submit(coro, current_scope.get()).result()
+
+    # For the blocking calls from coroutines, keeping the cancel scope of the caller
+    async def run_in_thread(self, func, *args):
+        context = contextvars.copy_context()
+        return await asyncio.get_running_loop().run_in_executor(None, context.run, func, *args)
+
+    def cancel_tasks(self, tasks):
+        loop = self.get_loop()
+        for task in list(tasks):
+            loop.call_soon_threadsafe(task.cancel)
+
+    def terminate_processes(self):
+        loop = self.get_loop()
+        for proc in list(self.processes):
+            loop.call_soon_threadsafe(process_starter.terminate_process_nowait, proc)
+
+async_engine = AsyncEngine()
+
+# Cancel scope of the current thread or task, anything started within it gets cancelled together
+current_scope = contextvars.ContextVar('current_scope', default=None)
+
+class CancelScope():
+    def __init__(self, name):
+        self.name = name
+        self.cancelled = False
+        self.tasks = set()
+        self.partial_paths = set() # Staging files and directories to remove if cancelled
+
+    def cancel(self):
+        global logger
 
-    def get_compatible_configs_names(self):
-        result = []
-        for config in self.compatible_configs:
-            result.append(config['package']['display'])
-        return result
+        if self.cancelled:
+            return
 
-config_manager = ConfigManager()
+        logger.warning(f'Cancelling the {self.name}...')
+        self.cancelled = True
+        async_engine.cancel_tasks(self.tasks)
 
-# Thread class that executes Update/Start
-class UpdaterStarterThread(Thread):
-    def __init__(self, is_update):
-        Thread.__init__(self)
-        self.is_update = is_update
-        self.start()
+    # Raises if cancelled, for the worker threads to call between the steps
+    def check(self):
+        if self.cancelled:
+            raise CancelledError()
 
-    def run(self):
-        global main_frame
+    def cleanup(self):
         global logger
 
-        config = config_manager.current_config
-
-        total_progress_steps = 2 # Without updating, only 2 steps (update lobby config and start)
-        current_progres_step = 0
+        for path in list(self.partial_paths):
+            logger.info(f'Removing a partial download: "{path}"')
+            staging_manager.remove_job(path)
 
-        def calc_file_md5(path):
-            with open(path, 'rb') as f:
-                file_hash = hashlib.md5()
-                chunk = f.read(8192)
-                while chunk:
-                    file_hash.update(chunk)
-                    chunk = f.read(8192)
-            print()
-
-            return file_hash.hexdigest()
+class ProcessStarter():
+    terminate_timeout = 3 # Seconds to wait after SIGTERM before killing
+    drain_timeout = 1 # Seconds to wait for the output after exit, in case a grandchild still holds the pipes
+    stats_path = file_manager.get_full_path(file_manager.split_extension(log_file_name)[0] + '-processes.json')
 
-        def set_gauge_range(value):
-            if main_frame:
-                wx.PostEvent(main_frame, ProgressUpdateEvent({'range': value}))
+    def __init__(self, *args, **kwds):
+        # Own threads for the blocking pipe reads and waits, a long game session shouldn't hold the shared executor
+        self.executor = ThreadPoolExecutor(max_workers=32, thread_name_prefix='process')
+        self.stats_lock = Lock()
+        self.stats = [] # Usage of every child process this run, written to stats_path
+
+    def get_low_priority_options(self, command):
+        # Lowest CPU and I/O priority for the background work, so it doesn't compete with the game
+        if platform_manager.current_platform == 'Windows':
+            return command, {'creationflags': subprocess.IDLE_PRIORITY_CLASS}
+
+        # Through the commands rather than preexec_fn, no Python code may run between fork and exec with the other threads around
+        if platform_manager.current_platform == 'Linux' and shutil.which('ionice'):
+            command = ['ionice', '-c', '3'] + command
+        if shutil.which('nice'):
+            command = ['nice', '-n', '19'] + command
+
+        return command, {}
+
+    def terminate_process_nowait(self, proc, kill=False):
+        if proc.returncode is not None:
+            return
 
-        def set_gauge_progress(value):
-            if main_frame:
-                wx.PostEvent(main_frame, ProgressUpdateEvent({'value': value}))
+        try:
+            if platform_manager.current_platform == 'Windows':
+                if kill:
+                    proc.kill()
+                else:
+                    proc.terminate()
+            else:
+                # Not through Popen, its poll() could reap the child before wait4 gets the usage
+                os.kill(proc.pid, signal.SIGKILL if kill else signal.SIGTERM) # send sigkill/sigterm
+        except OSError:
+            pass
 
-        def set_status_text(current_step, total_steps, message):
-            text = f'Step {current_step} out of {total_steps}: {message}'
-            logger.info(text)
-            if main_frame:
-                wx.PostEvent(main_frame, StatusUpdateEvent(text))
+    async def terminate_process(self, proc, waiter):
+        self.terminate_process_nowait(proc)
+        done, _ = await asyncio.wait([waiter], timeout=self.terminate_timeout)
+        if not done:
+            self.terminate_process_nowait(proc, kill=True)
+            await asyncio.wait([waiter])
 
-        set_gauge_range(total_progress_steps)
-        set_gauge_progress(current_progres_step)
+    # Returns the CPU time and peak RSS of the child, where the platform reports them
+    def wait_process(self, proc):
+        if not hasattr(os, 'wait4'):
+            proc.wait()
+            return None, None
 
         try:
-            if self.is_update:
-                pr_downloader_games = {}
-                http_resources = {}
-                launchers = []
+            _, status, usage = os.wait4(proc.pid, 0)
+        except ChildProcessError:
+            proc.wait()
+            return None, None
+
+        proc.returncode = os.waitstatus_to_exitcode(status)
+        # Linux reports the peak RSS in KB, macOS in bytes
+        max_rss = usage.ru_maxrss if platform_manager.current_platform == 'Darwin' else usage.ru_maxrss * 1024
+        return usage.ru_utime + usage.ru_stime, max_rss
+
+    def drain_stream(self, stream, log):
+        # Replacing the undecodable bytes, a stray one in the output shouldn't fail the run
+        for line in iter(stream.readline, b''):
+            line = line.rstrip().decode('utf-8', errors='replace')
+            if len(line) > 0:
+                log(line)
+        stream.close()
+
+    def record_stats(self, stats):
+        global logger
 
-                # Self-update
-                total_progress_steps += 1
+        cpu_time = 'n/a' if stats['cpu_time'] is None else f'{stats["cpu_time"]:.1f}s'
+        max_rss = 'n/a' if stats['max_rss'] is None else file_manager.format_size(stats['max_rss'])
+        logger.info(f'Process ended with status {stats["returncode"]} (wall time: {stats["wall_time"]:.1f}s, CPU time: {cpu_time}, peak RSS: {max_rss})')
 
-                # Updating the game according to the current config
-                if 'games' in config['downloads']:
-                    for game in config['downloads']['games']:
-                        pr_downloader_games.update({game: game})
-                        total_progress_steps += 1
+        if stats['timed_out']:
+            exit_code = 'timeout'
+        elif stats['cancelled']:
+            exit_code = 'cancelled'
+        else:
+            exit_code = stats['returncode']
+        metrics.inc('process_exits_total', executable=stats['executable'], code=exit_code)
+
+        with self.stats_lock:
+            self.stats.append(stats)
+            try:
+                file_manager.write_json(self.stats_path, self.stats)
+            except OSError as e:
+                logger.warning(f'Couldn\'t write the process stats: {e}')
+
+    # monitor is an optional coroutine function, running with the Popen object until the process exits
+    async def run_process(self, command, low_priority=False, timeout=None, monitor=None):
+        global logger
 
-                if 'resources' in config['downloads']:
-                    total_progress_steps += 1 # Only one step for all resources, as they are fast to update
-                    for resource in config['downloads']['resources']:
-                        http_resources.update({resource['url']: resource})
+        executable = file_manager.extract_filename(command[0])
+        options = {}
+        if low_priority:
+            command, options = self.get_low_priority_options(command)
+
+        loop = asyncio.get_running_loop()
+        started = time.monotonic()
+        proc = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, **options)
+        async_engine.processes.add(proc)
+
+        # Reading both pipes at once, a child blocked on a full stderr pipe would never exit otherwise
+        drains = [
+            loop.run_in_executor(self.executor, self.drain_stream, proc.stdout, logger.info),
+            loop.run_in_executor(self.executor, self.drain_stream, proc.stderr, logger.warning),
+        ]
+        waiter = loop.run_in_executor(self.executor, self.wait_process, proc)
+        monitor_task = asyncio.create_task(monitor(proc)) if monitor else None
+
+        stats = {
+            'command': command,
+            'executable': executable,
+            'started': time.time(),
+            'returncode': None,
+            'wall_time': 0,
+            'cpu_time': None,
+            'max_rss': None,
+            'timed_out': False,
+            'cancelled': False,
+        }
+        try:
+            try:
+                await asyncio.wait_for(asyncio.shield(waiter), timeout)
+            except asyncio.TimeoutError:
+                logger.error(f'Process timed out after {timeout}s, terminating...')
+                stats['timed_out'] = True
+                await self.terminate_process(proc, waiter)
+
+            await asyncio.wait(drains, timeout=self.drain_timeout)
+        except asyncio.CancelledError:
+            logger.warning('Process cancelled, terminating...')
+            stats['cancelled'] = True
+            await self.terminate_process(proc, waiter)
+            raise
+        finally:
+            async_engine.processes.discard(proc)
+            if monitor_task:
+                monitor_task.cancel()
+            if waiter.done() and not waiter.exception():
+                stats['cpu_time'], stats['max_rss'] = waiter.result()
+            stats['returncode'] = proc.returncode
+            stats['wall_time'] = time.monotonic() - started
+            self.record_stats(stats)
+
+        return proc.returncode == 0 and not stats['timed_out']
+
+    async def start_process_async(self, command, low_priority=False, timeout=None, monitor=None):
+        global logger
 
-                set_gauge_range(total_progress_steps)
+        logger.info('Starting a process:')
+        logger.info(' '.join(command))
+        try:
+            return await self.run_process(command, low_priority, timeout, monitor)
+        except asyncio.CancelledError:
+            raise
+        except:
+            logger.error('Process start failed!')
+            e = str(sys.exc_info()[1])
+            logger.error(e)
+            return False
 
-                logger.info('Checking for self-update')
-                logger.info('================================================================================')
+    def start_process(self, command, nowait=False, low_priority=False, timeout=None, monitor=None):
+        global main_frame
+        global logger
 
-                current_progres_step += 1
-                set_gauge_progress(current_progres_step)
-                set_status_text(current_progres_step, total_progress_steps, 'checking for self-update')
+        if not nowait:
+            return async_engine.run(self.start_process_async(command, low_priority, timeout, monitor))
 
-                file_hashes_path = platform_manager.get_resource_local_path('file_hashes', force_download_fresh=True, ignore_download_fail=True)
+        logger.info('Starting a process:')
+        logger.info(' '.join(command))
+        try:
+            subprocess.Popen(command)
+            return True
+        except:
+            logger.error('Process start failed!')
+            e = str(sys.exc_info()[1])
+            logger.error(e)
+            return False
 
-                launcher_file_name = platform_manager.get_executable_command('launcher')[0]
-                launcher_full_path = platform_manager.get_executable_full_command('launcher')[0]
-                launcher_file_md5 = calc_file_md5(launcher_full_path)
+process_starter = ProcessStarter()
 
-                f = open(file_hashes_path, 'r')
-                file_hashes_lines = f.readlines()
+class ArchiveExtractor():
+    # Formats the standard library handles, extracted without downloading 7zip and starting a process
+    in_process_formats = {
+        '.zip': 'zip',
+        '.tar': 'tar',
+        '.tgz': 'tar',
+        '.tar.gz': 'tar',
+        '.tar.bz2': 'tar',
+        '.tar.xz': 'tar',
+    }
 
-                for line in file_hashes_lines:
-                    update_filename_hash = line.split()
-                    update_filename = update_filename_hash[1].lstrip('*')
-                    update_hash = update_filename_hash[0]
-                    if update_filename == launcher_file_name:
-                        if launcher_file_md5 == update_hash:
-                            logger.info(f'{update_filename} hash matches the latest version hash ({update_hash}), no update needed')
-                        else:
-                            logger.info(f'{update_filename} hash ({launcher_file_md5}) doesn\'t match the latest version hash ({update_hash}), update needed!')
-                            temp_dir = file_manager.get_temp_dir()
+    max_default_jobs = 2 # Archives extracted at once unless configured, more only fight for the disk
+
+    def get_format(self, archive_name):
+        name = archive_name.lower()
+        for extension, archive_format in self.in_process_formats.items():
+            if name.endswith(extension):
+                return archive_format
+        return '7zip'
+
+    # Number of archives to extract at once out of the given count
+    def get_job_count(self, archive_count):
+        jobs = settings_manager.get('max_concurrent_extractions')
+        if jobs <= 0:
+            jobs = min(self.max_default_jobs, os.cpu_count() or 1)
+        return max(1, min(jobs, archive_count))
+
+    # 7zip threads per archive, splitting the cores between the concurrent jobs
+    def get_thread_count(self, job_count):
+        threads = settings_manager.get('extract_threads')
+        if threads <= 0:
+            threads = (os.cpu_count() or 1) // job_count
+        return max(1, threads)
+
+    async def extract(self, archive_name, destination, threads=1):
+        archive_format = self.get_format(archive_name)
+        started = time.monotonic()
+        if archive_format == '7zip':
+            result = await self.extract_7zip(archive_name, destination, threads)
+        else:
+            result = await self.extract_in_process(archive_name, destination, archive_format)
 
-                            platform_manager.download_executable('launcher', temp_dir)
-                            new_full_path = file_manager.join_path(temp_dir, launcher_file_name)
-                            process_starter.start_process([new_full_path, '--upgrade', launcher_full_path], nowait=True)
-                            sys.exit()
+        if result:
+            metrics.observe('extract_duration_seconds', time.monotonic() - started, format=archive_format)
+        return result
 
-                logger.info('Updating the game repositories')
-                for n in pr_downloader_games:
-                    logger.info('================================================================================')
-                    game = pr_downloader_games[n]
+    async def extract_7zip(self, archive_name, destination, threads=1):
+        global logger
 
-                    current_progres_step += 1
-                    set_gauge_progress(current_progres_step)
-                    set_status_text(current_progres_step, total_progress_steps, f'updating {game}')
+        await async_engine.run_in_thread(platform_manager.ensure_executable_exists, '7zip')
 
-                    if not pr_downloader.download_game(platform_manager.data_dir, game):
-                        raise Exception(f'Error updating {n}!')
+        zip_command = platform_manager.get_executable_full_command('7zip')
+        logger.info(f'Extracting archive: "{archive_name}" "{destination}"')
+        zip_command.extend(['x', archive_name, '-y', f'-mmt{threads}', f'-o{destination}'])
+        return await process_starter.start_process_async(zip_command)
 
-                logger.info('Updating the engine and additional resources')
-                if len(http_resources) > 0:
-                    current_progres_step += 1
-                    set_gauge_progress(current_progres_step)
+    async def extract_in_process(self, archive_name, destination, archive_format):
+        global logger
 
-                for n in http_resources:
+        logger.info(f'Extracting archive in-process: "{archive_name}" "{destination}"')
+        stop_event = Event()
+        future = asyncio.get_running_loop().run_in_executor(None, self.extract_members, archive_name, destination, archive_format, stop_event)
+        try:
+            # Shielded so a cancel doesn't abandon the thread while it still writes into the destination
+            return await asyncio.shield(future)
+        except asyncio.CancelledError:
+            stop_event.set()
+            await asyncio.wait([future])
+            raise
+
+    def check_member_path(self, destination, member_name):
+        path = os.path.realpath(file_manager.join_path(destination, member_name))
+        if os.path.commonpath([destination, path]) != destination:
+            raise Exception(f'Archive member points outside of the destination: {member_name}')
+        return path
+
+    def extract_members(self, archive_name, destination, archive_format, stop_event):
+        global logger
+
+        destination = os.path.realpath(destination)
+        try:
+            if archive_format == 'zip':
+                with zipfile.ZipFile(archive_name) as archive:
+                    for member in archive.infolist():
+                        if stop_event.is_set():
+                            return False
+                        path = self.check_member_path(destination, member.filename)
+                        archive.extract(member, destination)
+
+                        # Zip doesn't restore the permissions, the executables need their flag back
+                        mode = (member.external_attr >> 16) & 0o777
+                        if mode & 0o111 and not member.is_dir():
+                            os.chmod(path, mode)
+            else:
+                with tarfile.open(archive_name) as archive:
+                    for member in archive:
+                        if stop_event.is_set():
+                            return False
+                        self.check_member_path(destination, member.name)
+                        if member.issym() or member.islnk():
+                            link_base = destination if member.islnk() else os.path.dirname(file_manager.join_path(destination, member.name))
+                            self.check_member_path(destination, os.path.relpath(file_manager.join_path(link_base, member.linkname), destination))
+                        archive.extract(member, destination)
+        except:
+            logger.error(f'Error extracting "{archive_name}"!')
+            e = str(sys.exc_info()[1])
+            logger.error(e)
+            return False
+
+        return True
+
+archive_extractor = ArchiveExtractor()
+
+# Shared by all download workers to keep the total bandwidth under the cap
+class TokenBucket():
+    def __init__(self, rate):
+        self.lock = Lock()
+        self.set_rate(rate)
+
+    def set_rate(self, rate):
+        with self.lock:
+            self.rate = rate
+            self.burst = max(rate, 64 * 1024) # At least a single download chunk
+            self.tokens = self.burst
+            self.updated = time.monotonic()
+
+    async def consume(self, amount):
+        with self.lock:
+            if self.rate <= 0:
+                return
+
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            # Going into debt and sleeping it off, so every worker gets its fair share in the order they came
+            self.tokens -= amount
+            delay = -self.tokens / self.rate
+
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+bandwidth_limiter = TokenBucket(settings_manager.get('bandwidth_limit') * 1024)
+
+# Aggregate throughput and error counters of all downloads for the status line and the concurrency controller
+class TransferStats():
+    window = 3 # Seconds to average the current rate over
+
+    def __init__(self, *args, **kwds):
+        self.lock = Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.samples = deque()
+            self.peak_rate = 0
+            self.succeeded = 0
+            self.failed = 0
+
+    def add_bytes(self, amount):
+        with self.lock:
+            self.samples.append((time.monotonic(), amount))
+
+    def record_result(self, success):
+        with self.lock:
+            if success:
+                self.succeeded += 1
+            else:
+                self.failed += 1
+
+    def get_rate(self):
+        with self.lock:
+            now = time.monotonic()
+            while self.samples and self.samples[0][0] < now - self.window:
+                self.samples.popleft()
+            rate = sum(amount for sample_time, amount in self.samples) / self.window
+            self.peak_rate = max(self.peak_rate, rate)
+            return rate
+
+    # Share of the failed transfers since the last call
+    def pop_error_rate(self):
+        with self.lock:
+            total = self.succeeded + self.failed
+            error_rate = self.failed / total if total else 0
+            self.succeeded = 0
+            self.failed = 0
+            return error_rate
+
+    def get_status_text(self):
+        rate = self.get_rate()
+        return f'{file_manager.format_size(rate)}/s, peak {file_manager.format_size(self.peak_rate)}/s, {concurrency_controller.active} connections'
+
+transfer_stats = TransferStats()
+
+# Raises or lowers the number of parallel downloads, depending on whether the last change improved the throughput
+class ConcurrencyController():
+    adjust_interval = 5 # Seconds between the adjustments
+    max_error_rate = 0.2
+
+    def __init__(self, max_limit, adaptive):
+        self.condition = None # Created on the async engine loop when first needed
+        self.active = 0
+        self.configure(max_limit, adaptive)
+
+    # Can be called from any thread, the waiting downloads pick up the new limit right away
+    def configure(self, max_limit, adaptive):
+        self.max_limit = max(1, max_limit)
+        self.adaptive = adaptive
+        # Starting low and probing upwards when adaptive
+        self.limit = min(2, self.max_limit) if adaptive else self.max_limit
+        self.last_rate = None
+        if self.condition:
+            async_engine.submit(self.notify())
+
+    def get_condition(self):
+        if not self.condition:
+            self.condition = asyncio.Condition()
+        return self.condition
+
+    async def notify(self):
+        async with self.get_condition():
+            self.condition.notify_all()
+
+    async def acquire(self):
+        async with self.get_condition():
+            await self.condition.wait_for(lambda: self.active < self.limit)
+            self.active += 1
+
+    async def release(self):
+        async with self.get_condition():
+            self.active -= 1
+            self.condition.notify_all()
+
+    async def adjust(self, rate, error_rate):
+        global logger
+
+        if not self.adaptive:
+            return
+
+        async with self.get_condition():
+            limit = self.limit
+            if error_rate > self.max_error_rate:
+                self.limit = max(1, self.limit // 2)
+            elif self.last_rate is None or rate > self.last_rate * 1.1:
+                self.limit = min(self.max_limit, self.limit + 1)
+            elif rate < self.last_rate * 0.9:
+                self.limit = max(1, self.limit - 1)
+            self.last_rate = rate
+            self.condition.notify_all()
+
+        if limit != self.limit:
+            logger.info(f'Parallel downloads: {limit} -> {self.limit} ({file_manager.format_size(rate)}/s, {int(error_rate * 100)}% errors)')
+
+concurrency_controller = ConcurrencyController(settings_manager.get('max_concurrent_downloads'), settings_manager.get('adaptive_concurrency'))
+
+class MirrorManager():
+    stats_path = file_manager.join_path(platform_manager.data_dir, 'mirror_stats.json')
+    probe_timeout = 3
+    history_weight = 0.3 # How fast the persisted per-host figures follow the new measurements
+
+    def __init__(self, *args, **kwds):
+        self.lock = Lock()
+        self.stats = {}
+        self.read_stats()
+
+    def read_stats(self):
+        global logger
+
+        if not file_manager.file_exists(self.stats_path):
+            return
+
+        try:
+            self.stats = file_manager.read_json(self.stats_path)
+        except:
+            logger.error('Couldn\'t read the mirror stats!')
+            e = str(sys.exc_info()[1])
+            logger.error(e)
+
+    def save_stats(self):
+        global logger
+
+        try:
+            file_manager.write_json(self.stats_path, self.stats)
+        except:
+            logger.error('Couldn\'t save the mirror stats!')
+            e = str(sys.exc_info()[1])
+            logger.error(e)
+
+    # A download entry is either a single URL or a list of mirrors for the same file
+    def get_urls(self, source):
+        if isinstance(source, list):
+            return list(source)
+        return [source]
+
+    # Config resources can list additional mirrors next to the main URL
+    def get_resource_urls(self, resource):
+        return self.get_urls(resource['url']) + list(resource.get('mirrors', []))
+
+    def get_host(self, url):
+        return urlparse(url).netloc
+
+    def get_host_stats(self, url):
+        with self.lock:
+            return dict(self.stats.get(self.get_host(url), {}))
+
+    def probe(self, url):
+        if not circuit_breaker.allow(url):
+            return None
+
+        # Asking for a single byte is enough to measure the time to the first byte
+        started = time.time()
+        try:
+            with requests.get(url, headers={'Range': 'bytes=0-0'}, allow_redirects=True, timeout=self.probe_timeout, stream=True) as response:
+                circuit_breaker.record_success(url)
+                if response.status_code >= 300:
+                    return None
+                return time.time() - started
+        except:
+            circuit_breaker.record_failure(url)
+            return None
+
+    def get_score(self, url, latency):
+        if latency is None:
+            return float('inf')
+
+        # Lower is better: the probe latency, plus the time to get a megabyte at the previously seen throughput, scaled up by recent failures
+        host_stats = self.get_host_stats(url)
+        score = latency
+        if host_stats.get('throughput', 0) > 0:
+            score += 1024 * 1024 / host_stats['throughput']
+        return score * (1 + host_stats.get('failures', 0))
+
+    def rank(self, urls):
+        global logger
+
+        with ThreadPoolExecutor(max_workers=len(urls)) as executor:
+            latencies = list(executor.map(self.probe, urls))
+
+        ranked = sorted(zip(urls, latencies), key=lambda url_latency: self.get_score(*url_latency))
+        for url, latency in ranked:
+            latency_text = 'unreachable' if latency is None else f'{int(latency * 1000)} ms'
+            logger.info(f'Mirror {url}: {latency_text}')
+
+        return [url for url, latency in ranked]
+
+    def record_success(self, url, latency, throughput):
+        with self.lock:
+            host_stats = self.stats.setdefault(self.get_host(url), {})
+            for name, value in (('latency', latency), ('throughput', throughput)):
+                if name in host_stats:
+                    value = host_stats[name] * (1 - self.history_weight) + value * self.history_weight
+                host_stats[name] = value
+            host_stats['failures'] = host_stats.get('failures', 0) / 2
+        self.save_stats()
+
+    def record_failure(self, url):
+        with self.lock:
+            host_stats = self.stats.setdefault(self.get_host(url), {})
+            host_stats['failures'] = host_stats.get('failures', 0) + 1
+        self.save_stats()
+
+mirror_manager = MirrorManager()
+
+# How many times and how long to try the downloads, shared by all of them
+class RetryPolicy():
+    timeout_size_step = 10 * 1024 * 1024 # One more second of read timeout per this many bytes
+    max_read_timeout = 60 # Seconds
+
+    def get_attempts(self):
+        return max(1, settings_manager.get('download_attempts'))
+
+    # Exponential backoff with full jitter, so the downloads that failed together don't retry in lockstep
+    def get_delay(self, attempt):
+        return random.uniform(0, min(settings_manager.get('retry_backoff_max'), settings_manager.get('retry_backoff') * 2 ** attempt))
+
+    # Returns the (connect, read) timeouts, the size defaulting to the one seen the last time
+    def get_timeout(self, url, expected_size=None):
+        if expected_size is None:
+            expected_size = http_metadata_cache.get_entry(url).get('size', 0)
+        read_timeout = min(self.max_read_timeout, settings_manager.get('read_timeout') + expected_size / self.timeout_size_step)
+        return (settings_manager.get('connect_timeout'), read_timeout)
+
+    # Statuses worth trying again, the others (like 404) won't change by asking again
+    def is_retryable_status(self, status_code):
+        return status_code >= 500 or status_code in (408, 429)
+
+retry_policy = RetryPolicy()
+
+# Stops talking to a host after a few failures in a row, so a down host fails all the pending downloads fast
+# instead of each one waiting for its own timeout. After the cooldown a single request checks if it's back
+class CircuitBreaker():
+    failure_threshold = 3
+    cooldown = 30 # Seconds
+
+    def __init__(self, *args, **kwds):
+        self.lock = Lock()
+        self.hosts = {} # host -> {'failures': count in a row, 'opened': time or None, 'trial': a request is checking the host}
+
+    def get_host(self, url):
+        return urlparse(url).netloc
+
+    def allow(self, url):
+        with self.lock:
+            state = self.hosts.get(self.get_host(url))
+            if not state or state['opened'] is None:
+                return True
+            if time.monotonic() - state['opened'] < self.cooldown or state['trial']:
+                return False
+            state['trial'] = True
+            return True
+
+    def record_success(self, url):
+        with self.lock:
+            self.hosts.pop(self.get_host(url), None)
+
+    def record_failure(self, url):
+        global logger
+
+        host = self.get_host(url)
+        with self.lock:
+            state = self.hosts.setdefault(host, {'failures': 0, 'opened': None, 'trial': False})
+            state['failures'] += 1
+            if state['trial'] or (state['opened'] is None and state['failures'] >= self.failure_threshold):
+                logger.warning(f'{host} seems to be down, not trying it for {self.cooldown}s')
+                state['opened'] = time.monotonic()
+                state['trial'] = False
+
+    # A cancelled check neither proves nor disproves anything, letting the next request do it
+    def record_cancelled(self, url):
+        with self.lock:
+            state = self.hosts.get(self.get_host(url))
+            if state:
+                state['trial'] = False
+
+circuit_breaker = CircuitBreaker()
+
+class HttpDownloader():
+    chunk_size = 64 * 1024
+    stall_window = 10 # Seconds to measure the throughput over
+    stall_min_rate = 16 * 1024 # Bytes per second, slower mirrors are dropped in favor of the next one
+
+    def download_file(self, source_url, target, conditional=False, max_rate=0):
+        return self.download_file_status(source_url, target, conditional, max_rate)[0]
+
+    # Returns a tuple of the downloaded file path (None on failure) and whether it was modified on the server
+    def download_file_status(self, source_url, target, conditional=False, max_rate=0):
+        return async_engine.run(self.download_file_async(source_url, target, conditional, max_rate))
+
+    # Returns the size of the file behind the URL (or the first of the mirrors), None if the server doesn't tell
+    def get_content_length(self, source_url):
+        url = mirror_manager.get_urls(source_url)[0]
+        if not circuit_breaker.allow(url):
+            return None
+        try:
+            response = requests.head(url, allow_redirects=True, timeout=retry_policy.get_timeout(url, 0))
+            if response.status_code < 300 and 'Content-Length' in response.headers:
+                return int(response.headers['Content-Length'])
+        except:
+            pass
+        return None
+
+    async def download_file_async(self, source_url, target, conditional=False, max_rate=0):
+        global logger
+
+        source_urls = mirror_manager.get_urls(source_url)
+        primary_url = source_urls[0]
+
+        logger.info(f'Downloading: "{primary_url}" to: "{target}"')
+        try:
+            if file_manager.dir_exists(target): # Target is a directory, adding a filename from the URL to it
+                target_file = file_manager.join_path(target, file_manager.extract_filename(urlparse(primary_url).path))
+            else:
+                target_file = target
+
+            logger.info(f'Creating directories for "{target_file}" if needed...')
+            file_manager.make_dirs(file_manager.extract_dir_name(target_file))
+        except:
+            logger.error('Download failed:')
+            e = str(sys.exc_info()[1])
+            logger.error(e)
+            return (None, True)
+
+        if len(source_urls) > 1:
+            logger.info(f'Probing {len(source_urls)} mirrors...')
+            source_urls = await async_engine.run_in_thread(mirror_manager.rank, source_urls)
+
+        attempts = retry_policy.get_attempts()
+        for attempt in range(attempts):
+            is_retryable = False
+            for n in range(len(source_urls)):
+                url = source_urls[n]
+                is_last = n == len(source_urls) - 1 and attempt == attempts - 1
+
+                # Not worth waiting for the backoff either, the host stays skipped longer than that
+                if not circuit_breaker.allow(url):
+                    logger.warning(f'Skipping "{url}", its host is down')
+                    continue
+
+                result = await self.download_from_mirror(url, primary_url, target_file, conditional, max_rate, abort_on_stall=not is_last)
+                if result:
+                    return result
+
+                is_retryable = is_retryable or result is None
+                if n < len(source_urls) - 1:
+                    logger.warning('Falling back to the next mirror')
+
+            if not is_retryable or attempt == attempts - 1:
+                break
+
+            delay = retry_policy.get_delay(attempt)
+            logger.warning(f'Download failed, retrying in {delay:.1f}s (attempt {attempt + 2} out of {attempts})')
+            await asyncio.sleep(delay)
+
+        return (None, True)
+
+    # Returns None if it's worth trying again, and False if it isn't (like a 404)
+    async def download_from_mirror(self, url, primary_url, target_file, conditional, max_rate, abort_on_stall):
+        global logger
+
+        if url != primary_url:
+            logger.info(f'Downloading from the mirror: "{url}"')
+
+        partial_file = None
+        response = None
+        is_retryable = True
+        try:
+            headers = {}
+            if conditional and file_manager.file_exists(target_file):
+                headers = http_metadata_cache.get_conditional_headers(primary_url)
+
+            # Blocking reads go to the executor one chunk at a time, so cancelling doesn't have to wait for them
+            timeout = retry_policy.get_timeout(primary_url)
+            response = await async_engine.run_in_thread(lambda: requests.get(url, allow_redirects=True, timeout=timeout, stream=True, headers=headers))
+            latency = response.elapsed.total_seconds()
+            if not retry_policy.is_retryable_status(response.status_code):
+                circuit_breaker.record_success(url) # The host answered, whatever the answer was
+
+            if response.status_code == 304:
+                logger.info(f'"{url}" wasn\'t modified, keeping the existing file')
+                metrics.inc('cache_requests_total', cache='http', result='hit')
+                return (target_file, False)
+
+            if headers:
+                metrics.inc('cache_requests_total', cache='http', result='miss')
+
+            if response.status_code >= 300:
+                is_retryable = retry_policy.is_retryable_status(response.status_code)
+                raise Exception('Bad response: {status_code} ({content})'.format(status_code=str(response.status_code), content=response.content.decode('utf-8', errors='replace')[:200]))
+
+            # Size is only known upfront if the content isn't compressed on the fly
+            expected_size = None
+            if 'Content-Length' in response.headers and response.headers.get('Content-Encoding', 'identity') == 'identity':
+                expected_size = int(response.headers['Content-Length'])
+
+            # Downloading into a staging file, so a failed download doesn't destroy the existing one
+            partial_file = staging_manager.create_job(file_manager.extract_filename(target_file))
+            chunks = response.iter_content(chunk_size=self.chunk_size)
+            started = time.time()
+            received = 0
+            window_started = started
+            window_received = 0
+            with open(partial_file, 'wb') as f:
+                if expected_size:
+                    await async_engine.run_in_thread(staging_manager.preallocate, f, expected_size)
+
+                while True:
+                    chunk = await async_engine.run_in_thread(next, chunks, None)
+                    if chunk is None:
+                        break
+
+                    f.write(chunk)
+                    received += len(chunk)
+                    window_received += len(chunk)
+                    transfer_stats.add_bytes(len(chunk))
+                    await bandwidth_limiter.consume(len(chunk))
+
+                    # Pacing the download to stay under the requested rate
+                    if max_rate > 0:
+                        delay = received / max_rate - (time.time() - started)
+                        if delay > 0:
+                            await asyncio.sleep(delay)
+
+                    # Giving up on a mirror that slowed down to a crawl mid-transfer, unless we're limiting the rate ourselves
+                    window_elapsed = time.time() - window_started
+                    if window_elapsed >= self.stall_window:
+                        window_rate = window_received / window_elapsed
+                        if abort_on_stall and window_rate < self.stall_min_rate and not (0 < max_rate <= self.stall_min_rate):
+                            raise Exception(f'Mirror stalled at {int(window_rate)} bytes/s')
+                        window_started = time.time()
+                        window_received = 0
+
+                if expected_size is not None and received != expected_size:
+                    raise Exception(f'Incomplete download: {received} out of {expected_size} bytes')
+                f.truncate()
+
+            staging_manager.commit(partial_file, target_file)
+            partial_file = None
+            http_metadata_cache.update(primary_url, response.headers)
+
+            elapsed = time.time() - started
+            if elapsed > 0 and received > 0:
+                mirror_manager.record_success(url, latency, received / elapsed)
+            transfer_stats.record_result(True)
+            metrics.inc('download_bytes_total', received, host=urlparse(url).hostname)
+            metrics.observe('download_duration_seconds', elapsed, kind='http')
+        except asyncio.CancelledError:
+            logger.warning(f'Download cancelled: "{url}"')
+            circuit_breaker.record_cancelled(url)
+            raise
+        except:
+            logger.error('Download failed:')
+            e = str(sys.exc_info()[1])
+            logger.error(e)
+            mirror_manager.record_failure(url)
+            transfer_stats.record_result(False)
+            metrics.inc('download_retries_total', host=urlparse(url).hostname)
+            if not is_retryable:
+                return False
+            # Only no answer or a server error counts against the host, not a slow transfer
+            if response is None or retry_policy.is_retryable_status(response.status_code):
+                circuit_breaker.record_failure(url)
+            return None
+        finally:
+            if response is not None:
+                response.close()
+            if partial_file:
+                staging_manager.remove_job(partial_file)
+        return (target_file, True)
+
+http_downloader = HttpDownloader()
+
+class PrDownloader():
+    # outdated: the update plan already found it outdated, no need to ask the rapid repository again
+    def download_game(self, data_dir, game_name, low_priority=False, outdated=False):
+        global logger
+
+        # Reading the local rapid metadata is much cheaper than starting pr-downloader to find out nothing changed
+        if not outdated and rapid_repository.is_up_to_date(game_name):
+            logger.info(f'{game_name} is already installed and up to date, skipping pr-downloader')
+            return True
+        logger.info(f'{game_name} needs updating, starting pr-downloader')
+
+        platform_manager.ensure_executable_exists('pr_downloader')
+
+        logger.info(f'Downloading: "{game_name}" to: "{data_dir}"')
+        command = platform_manager.get_executable_full_command('pr_downloader')
+        command.extend(['--filesystem-writepath', data_dir, '--download-game', game_name])
+
+        started = time.monotonic()
+        result = process_starter.start_process(command, low_priority=low_priority)
+        if result:
+            metrics.observe('download_duration_seconds', time.monotonic() - started, kind='rapid')
+        return result
+
+pr_downloader = PrDownloader()
+
+# Reads the rapid repositories and packages pr-downloader keeps in the data dir
+class RapidRepository():
+    rapid_dir = file_manager.join_path(platform_manager.data_dir, 'rapid')
+    packages_dir = file_manager.join_path(platform_manager.data_dir, 'packages')
+    pool_dir = file_manager.join_path(platform_manager.data_dir, 'pool')
+    index_dir = file_manager.join_path(platform_manager.data_dir, 'rapid_index') # Our own copies of the remote indexes
+
+    def get_versions_files(self):
+        versions_files = []
+        for root, dirs, files in os.walk(self.rapid_dir):
+            if 'versions.gz' in files:
+                versions_files.append(file_manager.join_path(root, 'versions.gz'))
+        return versions_files
+
+    # Returns the package hash the tag points to in a versions.gz, or None
+    def read_tag(self, versions_file, tag):
+        with gzip.open(versions_file, 'rt', encoding='utf-8', errors='replace') as f:
+            for line in f:
+                # tag,package hash,dependency,name
+                fields = line.rstrip('\n').split(',')
+                if len(fields) >= 2 and fields[0] == tag:
+                    return fields[1]
+        return None
+
+    # Returns the package hash the tag (like "byar:test") points to, or None
+    def resolve_tag(self, tag):
+        global logger
+
+        for versions_file in self.get_versions_files():
+            try:
+                package_hash = self.read_tag(versions_file, tag)
+                if package_hash:
+                    return package_hash
+            except (OSError, EOFError) as e:
+                logger.warning(f'Couldn\'t read "{versions_file}": {e}')
+        return None
+
+    # pr-downloader keeps the repositories in rapid/<host>/<repository>, returns the URL of the one serving the tag
+    def get_repo_url(self, tag):
+        repo_name = tag.split(':')[0]
+        for versions_file in self.get_versions_files():
+            repo_dir = file_manager.extract_dir_name(versions_file)
+            if file_manager.extract_filename(repo_dir) == repo_name:
+                host = file_manager.extract_filename(file_manager.extract_dir_name(repo_dir))
+                return f'https://{host}/{repo_name}'
+        return None
+
+    def get_package_path(self, package_hash):
+        return file_manager.join_path(self.packages_dir, f'{package_hash}.sdp')
+
+    def get_pool_path(self, file_hash):
+        return file_manager.join_path(self.pool_dir, file_hash[:2], f'{file_hash[2:]}.gz')
+
+    # Returns the MD5 hashes of the files in a .sdp package
+    def read_package_hashes(self, package_path):
+        with gzip.open(package_path, 'rb') as f:
+            data = f.read()
+
+        # Records of: name length (1 byte), name, MD5 (16 bytes), CRC32 (4 bytes), size (4 bytes)
+        file_hashes = []
+        offset = 0
+        while offset < len(data):
+            name_length = data[offset]
+            offset += 1 + name_length
+            file_hashes.append(data[offset:offset + 16].hex())
+            offset += 16 + 4 + 4
+        return file_hashes
+
+    # Returns the pool files of a package, empty if it isn't installed
+    def get_package_files(self, package_hash):
+        package_path = self.get_package_path(package_hash)
+        if not file_manager.file_exists(package_path):
+            return []
+        return [self.get_pool_path(file_hash) for file_hash in self.read_package_hashes(package_path)]
+
+    def get_index_dir(self, repo_url):
+        return file_manager.join_path(self.index_dir, urlparse(repo_url).hostname, file_manager.extract_filename(repo_url))
+
+    # Returns the package hash the tag points to in the repository right now, or None if it can't be told
+    def fetch_remote_tag(self, tag):
+        repo_url = self.get_repo_url(tag)
+        if not repo_url:
+            return None
+
+        # Conditional, an unchanged index costs a single "not modified" response
+        versions_file = http_downloader.download_file(f'{repo_url}/versions.gz', file_manager.join_path(self.get_index_dir(repo_url), 'versions.gz'), conditional=True)
+        if not versions_file:
+            return None
+
+        return self.read_tag(versions_file, tag)
+
+    # Whether the tag resolves to the same package locally and in the repository, and all of its files are in the pool
+    def is_up_to_date(self, tag):
+        global logger
+
+        try:
+            local_hash = self.resolve_tag(tag)
+            if not local_hash:
+                logger.info(f'{tag} isn\'t in the local rapid index')
+                return False
+
+            remote_hash = self.fetch_remote_tag(tag)
+            if not remote_hash:
+                logger.info(f'Couldn\'t resolve {tag} in the remote rapid index')
+                return False
+
+            if local_hash != remote_hash:
+                logger.info(f'{tag} changed: {local_hash} -> {remote_hash}')
+                return False
+
+            if not file_manager.file_exists(self.get_package_path(local_hash)):
+                logger.info(f'Package {local_hash} of {tag} isn\'t installed')
+                return False
+
+            missing_count = len([path for path in self.get_package_files(local_hash) if not file_manager.file_exists(path)])
+            if missing_count:
+                logger.info(f'{missing_count} files of {tag} are missing from the pool')
+                return False
+        except CancelledError:
+            raise
+        except:
+            logger.warning(f'Couldn\'t check whether {tag} is up to date:')
+            e = str(sys.exc_info()[1])
+            logger.warning(e)
+            return False
+
+        return True
+
+    # Fetches the current package of the tag from the repository, returns its hash and the .sdp path, or None
+    def fetch_remote_package(self, tag):
+        package_hash = self.fetch_remote_tag(tag)
+        if not package_hash:
+            return None
+
+        # Packages never change once published, fetching each one once
+        repo_url = self.get_repo_url(tag)
+        package_path = file_manager.join_path(self.get_index_dir(repo_url), 'packages', f'{package_hash}.sdp')
+        if not file_manager.file_exists(package_path):
+            if not http_downloader.download_file(f'{repo_url}/packages/{package_hash}.sdp', package_path):
+                return None
+
+        return package_hash, package_path
+
+rapid_repository = RapidRepository()
+
+# Shares the verified downloads with the other launchers on the LAN and tries them before the internet.
+# Peers find each other by UDP broadcast and serve content by hash over HTTP, so a bad peer can't poison an install:
+# HTTP resources need a sha256 in the config, and the rapid pool files are named by their MD5 anyway
+class PeerCache():
+    service_name = 'bar-launcher-peer'
+    cache_dir = file_manager.join_path(platform_manager.data_dir, 'peer_cache')
+    announce_interval = 10 # Seconds
+    peer_timeout = 35 # Seconds without an announcement before a peer is forgotten
+    max_pool_requests = 8
+    max_pool_file_size = 256 * 1024 * 1024 # Compressed, no pool file comes near it
+    content_hash_pattern = re.compile(r'^[0-9a-f]{64}$')
+    pool_hash_pattern = re.compile(r'^[0-9a-f]{32}$')
+
+    def __init__(self, *args, **kwds):
+        self.lock = Lock()
+        self.instance_id = os.urandom(8).hex() # Several instances on one machine are still different peers
+        self.peers = {} # instance id -> (base URL, last seen)
+        self.bad_peers = set() # Base URLs that served content with a wrong hash
+        self.server = None
+        self.stop_event = Event()
+
+    def is_enabled(self):
+        return settings_manager.get('peer_cache')
+
+    def start(self):
+        global logger
+
+        if not self.is_enabled() or self.server:
+            return
+
+        cache = self
+
+        class PeerRequestHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                path = cache.get_served_path(self.path)
+                if not path:
+                    self.send_error(404)
+                    return
+                try:
+                    with open(path, 'rb') as f:
+                        self.send_response(200)
+                        self.send_header('Content-Type', 'application/octet-stream')
+                        self.send_header('Content-Length', str(os.fstat(f.fileno()).st_size))
+                        self.end_headers()
+                        shutil.copyfileobj(f, self.wfile, HttpDownloader.chunk_size)
+                    os.utime(path) # Recently served files are kept the longest
+                except OSError:
+                    pass # The peer went away mid-transfer
+
+            def log_message(self, format, *args):
+                pass
+
+        try:
+            self.stop_event.clear()
+            self.server = ThreadingHTTPServer(('', settings_manager.get('peer_port')), PeerRequestHandler)
+            self.server.daemon_threads = True
+        except OSError as e:
+            logger.error(f'Couldn\'t start the peer cache: {e}')
+            self.server = None
+            return
+
+        port = self.server.server_address[1]
+        Thread(target=self.server.serve_forever, name='PeerCacheServer', daemon=True).start()
+        Thread(target=self.listen, name='PeerCacheListener', daemon=True).start()
+        Thread(target=self.announce, args=(port,), name='PeerCacheAnnouncer', daemon=True).start()
+        logger.info(f'Peer cache is serving on port {port}')
+
+    def stop(self):
+        if not self.server:
+            return
+
+        self.stop_event.set()
+        self.server.shutdown()
+        self.server.server_close()
+        self.server = None
+        with self.lock:
+            self.peers.clear()
+
+    def get_served_path(self, request_path):
+        parts = request_path.strip('/').split('/')
+        if len(parts) != 2:
+            return None
+
+        kind, content_hash = parts
+        if kind == 'content' and self.content_hash_pattern.match(content_hash):
+            path = file_manager.join_path(self.cache_dir, content_hash)
+        elif kind == 'pool' and self.pool_hash_pattern.match(content_hash):
+            path = rapid_repository.get_pool_path(content_hash)
+        else:
+            return None
+
+        return path if file_manager.file_exists(path) else None
+
+    def create_discovery_socket(self):
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        # Every instance on the machine gets the broadcasts when they all bind with SO_REUSEADDR
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_BROADCAST, 1)
+        return sock
+
+    def announce(self, port):
+        global logger
+
+        message = json.dumps({'service': self.service_name, 'id': self.instance_id, 'port': port}).encode('utf-8')
+        discovery_port = settings_manager.get('peer_discovery_port')
+        with self.create_discovery_socket() as sock:
+            while not self.stop_event.is_set():
+                try:
+                    sock.sendto(message, ('<broadcast>', discovery_port))
+                except OSError:
+                    # No network to broadcast to, the instances on this machine can still find each other
+                    try:
+                        sock.sendto(message, ('127.255.255.255', discovery_port))
+                    except OSError as e:
+                        logger.warning(f'Couldn\'t announce the peer cache: {e}')
+                self.stop_event.wait(self.announce_interval)
+
+    def listen(self):
+        global logger
+
+        with self.create_discovery_socket() as sock:
+            try:
+                sock.bind(('', settings_manager.get('peer_discovery_port')))
+            except OSError as e:
+                logger.error(f'Couldn\'t listen for the peers: {e}')
+                return
+
+            sock.settimeout(1)
+            while not self.stop_event.is_set():
+                try:
+                    data, address = sock.recvfrom(1024)
+                    message = json.loads(data.decode('utf-8'))
+                    if message.get('service') != self.service_name or message.get('id') == self.instance_id:
+                        continue
+                    base_url = f'http://{address[0]}:{int(message["port"])}'
+                except (socket.timeout, ValueError, KeyError, TypeError, AttributeError):
+                    continue
+                except OSError:
+                    break
+
+                with self.lock:
+                    if not message['id'] in self.peers:
+                        logger.info(f'Found a LAN peer: {base_url}')
+                    self.peers[message['id']] = (base_url, time.monotonic())
+
+    def get_peers(self):
+        now = time.monotonic()
+        with self.lock:
+            peers = [base_url for base_url, last_seen in self.peers.values() if now - last_seen < self.peer_timeout and not base_url in self.bad_peers]
+        random.shuffle(peers) # Spreading the load between them
+        return peers
+
+    def mark_bad_peer(self, base_url):
+        global logger
+
+        logger.warning(f'LAN peer {base_url} served content with a wrong hash, not using it anymore')
+        with self.lock:
+            self.bad_peers.add(base_url)
+
+    # The size a peer announces, None if it's missing or not the expected one
+    def get_content_size(self, response, expected_size=None):
+        try:
+            size = int(response.headers['Content-Length'])
+        except (KeyError, ValueError):
+            return None
+        if size < 0 or (expected_size is not None and size != expected_size):
+            return None
+        return size
+
+    # Downloads into the target while hashing, returns whether the content matched.
+    # A peer sending more than it announced is stopped right away, it can't fill up the disk before the hash check
+    def download_content(self, url, target, content_hash, expected_size=None):
+        file_hash = hashlib.sha256()
+        with requests.get(url, timeout=(2, 10), stream=True) as response:
+            if response.status_code != 200:
+                return None
+            size = self.get_content_size(response, expected_size)
+            if size is None:
+                return None
+
+            received = 0
+            with open(target, 'wb') as f:
+                for chunk in response.iter_content(chunk_size=HttpDownloader.chunk_size):
+                    received += len(chunk)
+                    if received > size:
+                        return False
+                    f.write(chunk)
+                    file_hash.update(chunk)
+        return file_hash.hexdigest() == content_hash
+
+    # Returns a staging file with the content from a LAN peer, or None if no peer has it
+    async def fetch_content(self, content_hash, name, size=None):
+        global logger
+
+        for base_url in self.get_peers():
+            job_path = staging_manager.create_job(name)
+            try:
+                result = await async_engine.run_in_thread(self.download_content, f'{base_url}/content/{content_hash}', job_path, content_hash, size)
+            except (requests.RequestException, OSError):
+                result = None
+
+            if result:
+                logger.info(f'Got "{name}" from the LAN peer {base_url}')
+                metrics.inc('cache_requests_total', cache='peer', result='hit')
+                return job_path
+
+            staging_manager.remove_job(job_path)
+            if result is False:
+                self.mark_bad_peer(base_url)
+
+        metrics.inc('cache_requests_total', cache='peer', result='miss')
+        return None
+
+    # Keeps a verified download to serve it to the peers, returns whether the file was taken
+    def store(self, path, content_hash, keep_original=False):
+        global logger
+
+        if not self.is_enabled() or not content_hash:
+            return False
+
+        cache_path = file_manager.join_path(self.cache_dir, content_hash)
+        try:
+            file_manager.make_dirs(self.cache_dir)
+            if keep_original:
+                try:
+                    os.link(path, cache_path + '.tmp')
+                except OSError:
+                    shutil.copy2(path, cache_path + '.tmp')
+                file_manager.replace(cache_path + '.tmp', cache_path)
+            else:
+                file_manager.replace(path, cache_path)
+        except OSError as e:
+            logger.warning(f'Couldn\'t keep "{path}" for the peers: {e}')
+            return False
+
+        self.prune()
+        return True
+
+    # Keeps the cache under the budget, the least recently used files go first
+    def prune(self):
+        budget = settings_manager.get('peer_cache_budget') * 1024 * 1024
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            path = file_manager.join_path(self.cache_dir, name)
+            entries.append((os.path.getmtime(path), file_manager.get_file_size(path), path))
+
+        total_size = sum(entry[1] for entry in entries)
+        for mtime, size, path in sorted(entries):
+            if total_size <= budget:
+                break
+            file_manager.remove(path)
+            total_size -= size
+
+    def fetch_pool_file(self, base_url, file_hash):
+        with requests.get(f'{base_url}/pool/{file_hash}', timeout=(2, 10), stream=True) as response:
+            if response.status_code != 200:
+                return None
+            size = self.get_content_size(response)
+            if size is None or size > self.max_pool_file_size:
+                return None
+
+            job_path = staging_manager.create_job(f'{file_hash}.gz')
+            try:
+                received = 0
+                with open(job_path, 'wb') as f:
+                    for chunk in response.iter_content(chunk_size=HttpDownloader.chunk_size):
+                        received += len(chunk)
+                        if received > size:
+                            return False
+                        f.write(chunk)
+
+                # Pool files are named by the MD5 of the uncompressed content, checked without unpacking it all in memory
+                content_hash = hashlib.md5()
+                with gzip.open(job_path, 'rb') as f:
+                    for chunk in iter(lambda: f.read(HttpDownloader.chunk_size), b''):
+                        content_hash.update(chunk)
+                if content_hash.hexdigest() != file_hash:
+                    return False
+
+                staging_manager.commit(job_path, rapid_repository.get_pool_path(file_hash))
+                job_path = None
+                return True
+            finally:
+                if job_path:
+                    staging_manager.remove_job(job_path)
+
+    async def fetch_pool_files(self, file_hashes):
+        budget = asyncio.Semaphore(self.max_pool_requests)
+
+        async def fetch(file_hash):
+            async with budget:
+                for base_url in self.get_peers():
+                    try:
+                        result = await async_engine.run_in_thread(self.fetch_pool_file, base_url, file_hash)
+                    except (requests.RequestException, OSError, EOFError):
+                        result = None
+                    if result:
+                        return True
+                    if result is False:
+                        self.mark_bad_peer(base_url)
+                return False
+
+        results = await asyncio.gather(*[fetch(file_hash) for file_hash in file_hashes])
+        return len([result for result in results if result])
+
+    # Fills the rapid pool from the peers, so pr-downloader only has to fetch what none of them had
+    def fetch_rapid_package(self, tag):
+        global logger
+
+        if not self.is_enabled() or not self.get_peers():
+            return
+
+        try:
+            remote_package = rapid_repository.fetch_remote_package(tag)
+            if not remote_package:
+                return
+
+            package_hash, package_path = remote_package
+            missing = [file_hash for file_hash in rapid_repository.read_package_hashes(package_path) if not file_manager.file_exists(rapid_repository.get_pool_path(file_hash))]
+            if not missing:
+                return
+
+            fetched = async_engine.run(self.fetch_pool_files(missing))
+            logger.info(f'Got {fetched} of {len(missing)} missing files of {tag} from the LAN peers')
+            metrics.inc('cache_requests_total', fetched, cache='peer', result='hit')
+            metrics.inc('cache_requests_total', len(missing) - fetched, cache='peer', result='miss')
+        except CancelledError:
+            raise
+        except:
+            logger.warning(f'Couldn\'t get {tag} from the LAN peers:')
+            e = str(sys.exc_info()[1])
+            logger.warning(e)
+
+peer_cache = PeerCache()
+
+# Reads the files the game is about to load into the OS page cache, so the game doesn't wait for a cold disk
+class CachePrewarmer():
+    workers = 8
+    read_chunk_size = 1024 * 1024
+    archive_extensions = ('.sdz', '.sd7')
+
+    def get_available_memory(self):
+        try:
+            with open('/proc/meminfo') as f:
+                for line in f:
+                    if line.startswith('MemAvailable:'):
+                        return int(line.split()[1]) * 1024
+        except OSError:
+            pass
+        return None
+
+    # Files in the order they matter the most: the engine, the rapid games, then the archived ones
+    def get_files(self, engine_dir, games):
+        global logger
+
+        files = []
+        for root, dirs, names in os.walk(engine_dir):
+            files.extend(file_manager.join_path(root, name) for name in names)
+
+        for game in games:
+            package_hash = rapid_repository.resolve_tag(game)
+            if not package_hash:
+                continue
+            try:
+                files.extend(rapid_repository.get_package_files(package_hash))
+            except (OSError, EOFError, IndexError) as e:
+                logger.warning(f'Couldn\'t read the package of {game}: {e}')
+
+        games_dir = file_manager.join_path(platform_manager.data_dir, 'games')
+        if file_manager.dir_exists(games_dir):
+            for name in os.listdir(games_dir):
+                if name.lower().endswith(self.archive_extensions):
+                    files.append(file_manager.join_path(games_dir, name))
+
+        return files
+
+    def warm_file(self, path):
+        try:
+            with open(path, 'rb') as f:
+                if hasattr(os, 'posix_fadvise'):
+                    os.posix_fadvise(f.fileno(), 0, 0, os.POSIX_FADV_WILLNEED)
+                else:
+                    # Reading it through is the portable way to get it cached
+                    while f.read(self.read_chunk_size):
+                        pass
+            return True
+        except OSError:
+            return False
+
+    def prewarm(self, engine_dir, games):
+        global logger
+
+        budget = settings_manager.get('prewarm_budget') * 1024 * 1024
+        available_memory = self.get_available_memory()
+        if available_memory is not None:
+            # Leaving the rest of the memory to the game itself
+            budget = min(budget, available_memory // 2)
+
+        started = time.monotonic()
+        selected = {}
+        total_size = 0
+        for path in self.get_files(engine_dir, games):
+            size = file_manager.get_file_size(path) if file_manager.file_exists(path) else 0
+            if size and total_size + size <= budget:
+                selected[path] = size
+                total_size += size
+
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            results = list(executor.map(self.warm_file, selected))
+
+        # Counting only the files that could be read
+        warmed = [path for path, result in zip(selected, results) if result]
+        warmed_size = sum(selected[path] for path in warmed)
+        logger.info(f'Prewarmed {len(warmed)} files, {file_manager.format_size(warmed_size)} in {time.monotonic() - started:.1f}s (budget: {file_manager.format_size(budget)})')
+
+cache_prewarmer = CachePrewarmer()
+
+# Downloads the updates in the background, so the next "Update & Start" only has to commit what is already staged
+class PrefetchManager():
+    prefetch_dir = file_manager.join_path(platform_manager.data_dir, 'prefetch')
+
+    def __init__(self, *args, **kwds):
+        self.suspended = Event()
+        self.scope = None
+        self.status = 'Background prefetch is off'
+
+    def set_status(self, text):
+        global logger
+
+        self.status = text
+        logger.info(f'Prefetch: {text}')
+        if main_frame:
+            wx.PostEvent(main_frame, PrefetchStatusEvent(text))
+
+    def get_staged_path(self, url):
+        # Prefixing with the URL hash, so files with the same name from different URLs don't collide
+        url_hash = hashlib.md5(url.encode('utf-8')).hexdigest()[:16]
+        return file_manager.join_path(self.prefetch_dir, f'{url_hash}_{file_manager.extract_filename(urlparse(url).path)}')
+
+    def get_staged(self, url):
+        staged_path = self.get_staged_path(url)
+        if file_manager.file_exists(staged_path):
+            return staged_path
+        return None
+
+    def stage_resource(self, resource):
+        global logger
+
+        url = resource['url']
+        destination_path = file_manager.join_path(platform_manager.data_dir, resource['destination'])
+        if file_manager.file_exists(destination_path) or file_manager.dir_exists(destination_path) or self.get_staged(url):
+            return
+
+        self.set_status(f'downloading {resource["destination"]}')
+        staged_path = self.get_staged_path(url)
+        # Downloads only get the final name once complete, so the updater never picks up a partial file
+        if http_downloader.download_file(mirror_manager.get_resource_urls(resource), staged_path, max_rate=settings_manager.get('prefetch_max_rate')):
+            logger.info(f'Staged "{url}" as "{staged_path}"')
+
+    # Staged files the current setup still needs, None when there's no setup to tell
+    def get_staged_paths(self):
+        launcher_config_path = platform_manager.resources['launcher_config']['path']
+        if not file_manager.file_exists(launcher_config_path):
+            return None
+        setup = self.get_current_setup(launcher_config_path)
+        if not setup:
+            return None
+
+        staged_paths = set()
+        for resource in setup.get('downloads', {}).get('resources', []):
+            destination_path = file_manager.join_path(platform_manager.data_dir, resource['destination'])
+            if not file_manager.file_exists(destination_path) and not file_manager.dir_exists(destination_path):
+                staged_paths.add(self.get_staged_path(resource['url']))
+        return staged_paths
+
+    def get_current_setup(self, launcher_config_path):
+        if not config_manager.current_config:
+            return None
+
+        display = config_manager.current_config['package']['display']
+        data = file_manager.read_json(launcher_config_path)
+        for setup in data.get('setups', []):
+            if setup.get('package', {}).get('display') == display:
+                return setup
+        return None
+
+    def prefetch(self):
+        global logger
+
+        # Not touching anything while the update is running, trying again on the next poll
+        if self.suspended.is_set() or not update_lock.acquire(blocking=False):
+            return
+
+        try:
+            # Everything started from here gets cancelled at once when the updater needs the data dir
+            self.scope = CancelScope('background prefetch')
+            current_scope.set(self.scope)
+            if self.suspended.is_set():
+                self.scope.cancel()
+
+            self.set_status('checking for updates')
+            resource = platform_manager.resources['launcher_config']
+            launcher_config_path, modified = http_downloader.download_file_status(resource['url'], resource['path'], conditional=True)
+            if not launcher_config_path:
+                self.set_status('launcher config is unavailable, will try again later')
+                return
+
+            setup = self.get_current_setup(launcher_config_path)
+            if not setup or setup.get('no_downloads', False):
+                self.set_status('nothing to prefetch')
+                return
+
+            for resource in setup['downloads'].get('resources', []):
+                self.scope.check()
+                self.stage_resource(resource)
+
+            for game in setup['downloads'].get('games', []):
+                self.scope.check()
+                self.set_status(f'downloading {game}')
+                pr_downloader.download_game(platform_manager.data_dir, game, low_priority=True)
+
+            self.set_status('up to date, last checked at {0}'.format(time.strftime('%H:%M')))
+        finally:
+            self.scope.cleanup()
+            self.scope = None
+            update_lock.release()
+
+    # Called by the updater to get exclusive access to the data dir
+    def suspend(self):
+        self.suspended.set()
+        scope = self.scope
+        if scope:
+            scope.cancel()
+        update_lock.acquire()
+
+    def resume(self):
+        update_lock.release()
+        self.suspended.clear()
+
+prefetch_manager = PrefetchManager()
+
+# Thread class that polls for updates and prefetches them at a limited rate, pr-downloader runs niced
+class PrefetchThread(Thread):
+    def __init__(self, interval):
+        Thread.__init__(self, daemon=True)
+        self.interval = interval
+        self.stop_event = Event()
+        self.start()
+
+    def stop(self):
+        self.stop_event.set()
+
+    def run(self):
+        global logger
+
+        while not self.stop_event.is_set():
+            try:
+                prefetch_manager.prefetch()
+            except CancelledError:
+                prefetch_manager.set_status('interrupted, will continue later')
+            except:
+                logger.error('Background prefetch failed!')
+                e = str(sys.exc_info()[1])
+                logger.error(e)
+            self.stop_event.wait(self.interval)
+
+        prefetch_manager.set_status('Background prefetch is off')
+
+# Thread class that executes logs upload
+class LogUploaderThread(Thread):
+    def __init__(self, file_name, bucket, object_name, attachments=None):
+        Thread.__init__(self)
+        self.file_name = file_name
+        self.bucket = bucket
+        self.object_name = object_name
+        self.attachments = attachments or [] # Zipped together with the log if any
+        self.start()
+
+    def run(self):
+        global main_frame
+        global logger
+
+        file_name = self.file_name
+        bucket = self.bucket
+        object_name = self.object_name
+        content_type = 'text/plain'
+        bundle_path = None
+
+        try:
+            if self.attachments:
+                bundle_path = file_manager.join_path(file_manager.get_temp_dir(), file_manager.split_extension(object_name)[0] + '.zip')
+                with zipfile.ZipFile(bundle_path, 'w', zipfile.ZIP_DEFLATED) as bundle:
+                    for path in [file_name] + self.attachments:
+                        bundle.write(path, file_manager.extract_filename(path))
+                file_name = bundle_path
+                object_name = file_manager.extract_filename(bundle_path)
+                content_type = 'application/zip'
+
+            # Imported on demand, it's heavy and only needed for the uploads
+            import boto3
+
+            resp = requests.get(f'{logs_url}c', allow_redirects=True)
+            c = resp.json()
+            s3_client = boto3.client(
+                's3',
+                aws_access_key_id=c['access_key_id'],
+                aws_secret_access_key=c['secret_access_key']
+            )
+            logger.info(f'Uploading: "{file_name}" to: "{bucket}"')
+            response = s3_client.upload_file(file_name, bucket, object_name, ExtraArgs={'ContentType': content_type})
+            result = f'{logs_url}{object_name}'
+            if main_frame:
+                wx.PostEvent(main_frame, LogUploadedEvent(result))
+        except:
+            logger.error('Upload failed!')
+            e = str(sys.exc_info()[1])
+            logger.error(e)
+            if main_frame:
+                wx.PostEvent(main_frame, LogUploadedEvent(None))
+        finally:
+            if bundle_path and file_manager.file_exists(bundle_path):
+                file_manager.remove(bundle_path)
+
+class ClipboardManager():
+    def copy(self, text):
+        global logger
+
+        try:
+            logger.info(f'Copying to clipboard: "{text}"')
+            pyperclip.copy(text)
+        except:
+            logger.error('Copying failed:')
+            e = str(sys.exc_info()[1])
+            logger.error(e)
+            return False
+        return True
+
+clipboard_manager = ClipboardManager()
+
+# A setup of the launcher config, checked once when the config changes. The rest of the launcher reads it like the JSON
+class ConfigSetup():
+    __slots__ = ('name', 'platform', 'engine', 'start_args', 'games', 'resources', 'no_downloads', 'data')
+
+    platform_names = {'win32': 'Windows', 'linux': 'Linux', 'darwin': 'Darwin'}
+
+    # The setups from the cache were validated when it was written
+    def __init__(self, index, data, validated=False):
+        self.data = data
+        self.name = f'#{index + 1}'
+        if not validated:
+            self.validate()
+
+        package = data['package']
+        launch = data['launch']
+        downloads = data.setdefault('downloads', {})
+        self.name = package['display']
+        self.platform = self.platform_names.get(package['platform'])
+        self.engine = launch.get('engine')
+        self.start_args = launch.get('start_args', [])
+        self.games = downloads.get('games', [])
+        self.resources = downloads.get('resources', [])
+        self.no_downloads = data.get('no_downloads', False)
+
+    # Setups for the other systems are validated too, the config has to be valid as a whole
+    def validate(self):
+        package = self.get_section(self.data, 'package')
+        launch = self.get_section(self.data, 'launch')
+        if not isinstance(package.get('platform'), str) or not isinstance(package.get('display'), str):
+            self.fail('missing "package->platform" or "package->display"')
+        self.name = package['display']
+
+        self.check_field(launch, 'launch->engine', 'engine', str)
+        if not all(isinstance(arg, str) for arg in self.check_field(launch, 'launch->start_args', 'start_args', list)):
+            self.fail('"launch->start_args" should only have strings')
+
+        downloads = self.check_field(self.data, 'downloads', 'downloads', dict)
+        if not all(isinstance(game, str) for game in self.check_field(downloads, 'downloads->games', 'games', list)):
+            self.fail('"downloads->games" should only have strings')
+        for resource in self.check_field(downloads, 'downloads->resources', 'resources', list):
+            if not isinstance(resource, dict) or not isinstance(resource.get('url'), str) or not isinstance(resource.get('destination'), str):
+                self.fail('every "downloads->resources" entry needs a "url" and a "destination"')
+
+        self.check_field(self.data, 'no_downloads', 'no_downloads', bool)
+
+    def fail(self, message):
+        raise Exception(f'Not a valid config setup "{self.name}": {message}!')
+
+    def get_section(self, data, key):
+        if not isinstance(data, dict) or not isinstance(data.get(key), dict):
+            self.fail(f'missing "{key}" section')
+        return data[key]
+
+    # Returns the value, or an empty one if it's optional and missing
+    def check_field(self, data, path, key, kind):
+        if key not in data:
+            return kind()
+        if not isinstance(data[key], kind):
+            self.fail(f'"{path}" should be a {kind.__name__}')
+        return data[key]
+
+    def __getitem__(self, key):
+        return self.data[key]
+
+    def __contains__(self, key):
+        return key in self.data
+
+    def get(self, key, default=None):
+        return self.data.get(key, default)
+
+class ConfigManager():
+    cache_path = file_manager.join_path(platform_manager.data_dir, 'config_cache.json')
+    cache_version = 2 # Bump when ConfigSetup changes
+    compatible_configs = []
+    compatible_configs_by_name = {}
+    current_config = {}
+
+    def __init__(self, *args, **kwds):
+        self.compatible_configs_by_name = self.get_compatible_configs()
+        self.compatible_configs = list(self.compatible_configs_by_name.values())
+
+    # Returns the setups of this platform by display name. The config is only read and validated if it changed since the last time
+    def read_config(self):
+        global logger
+
+        # Next to another launcher, using its copy as it is. A bundle brings its own, so importing one works offline on a fresh install
+        force_download_fresh = not instance_guard.shared and not command_line.get_option('--import-bundle')
+        try:
+            launcher_config_path = platform_manager.get_resource_local_path('launcher_config', force_download_fresh=force_download_fresh, ignore_download_fail=True)
+        except:
+            logger.error('No launcher config, nothing to start:')
+            e = str(sys.exc_info()[1])
+            logger.error(e)
+            return {}
+
+        # The conditional download leaves an unchanged config alone, so its size and mtime tell if it changed
+        stat_result = os.stat(launcher_config_path)
+        config_key = {
+            'version': self.cache_version,
+            'platform': platform_manager.current_platform,
+            'size': stat_result.st_size,
+            'mtime': stat_result.st_mtime_ns,
+        }
+
+        setups = self.read_cache(config_key)
+        if setups is None:
+            logger.info(f'Reading the config file from {launcher_config_path}')
+            setups = self.compile_config(file_manager.read_json(launcher_config_path))
+            self.write_cache(config_key, setups)
+        return setups
+
+    # Validates the setups of this platform only. Invalid ones are left out, one bad entry shouldn't stop the launcher
+    def compile_config(self, data):
+        global logger
+
+        if not isinstance(data, dict) or not isinstance(data.get('setups'), list):
+            raise Exception('Not a valid config file, missing "setups" section!')
+
+        setups = {}
+        for index in range(len(data['setups'])):
+            setup_data = data['setups'][index]
+            package = setup_data.get('package') if isinstance(setup_data, dict) else None
+            if isinstance(package, dict) and ConfigSetup.platform_names.get(package.get('platform')) != platform_manager.current_platform:
+                continue
+
+            try:
+                setup = ConfigSetup(index, setup_data)
+            except:
+                e = str(sys.exc_info()[1])
+                logger.error(f'{e} Ignoring it.')
+                continue
+
+            if setup.name in setups:
+                logger.error(f'Not a valid config setup "{setup.name}": there\'s another {setup.platform} setup with the same "package->display"! Ignoring it.')
+                continue
+            setups[setup.name] = setup
+        return setups
+
+    # Plain data only, the setups are rebuilt from the validated dicts
+    def read_cache(self, config_key):
+        global logger
+
+        if not file_manager.file_exists(self.cache_path):
+            return None
+
+        try:
+            cache = file_manager.read_json(self.cache_path)
+            if cache['key'] == config_key:
+                setups = {}
+                for data in cache['setups']:
+                    setup = ConfigSetup(0, data, validated=True)
+                    setups[setup.name] = setup
+                return setups
+        except:
+            logger.warning('Couldn\'t read the config cache:')
+            e = str(sys.exc_info()[1])
+            logger.warning(e)
+        return None
+
+    def write_cache(self, config_key, setups):
+        global logger
+
+        try:
+            file_manager.write_json(self.cache_path, {'key': config_key, 'setups': [setup.data for setup in setups.values()]})
+        except:
+            logger.warning('Couldn\'t write the config cache:')
+            e = str(sys.exc_info()[1])
+            logger.warning(e)
+
+    def get_compatible_configs(self):
+        return self.read_config()
+
+    def get_compatible_configs_names(self):
+        return list(self.compatible_configs_by_name)
+
+    # Returns the compatible config with the display name, or the first one without a name
+    def get_compatible_config(self, name=None):
+        if name is None:
+            return self.compatible_configs[0] if self.compatible_configs else None
+        return self.compatible_configs_by_name.get(name)
+
+config_manager = ConfigManager()
+
+class DiskManager():
+    engine_dir = file_manager.join_path(platform_manager.data_dir, 'engine')
+    engine_usage_path = file_manager.join_path(platform_manager.data_dir, 'engine_usage.json')
+    extraction_ratio = 3 # Archives take up to this many times their size once extracted
+    free_space_margin = 256 * 1024 * 1024
+    stale_file_age = 60 * 60 # Seconds, younger leftovers might still belong to a running download
+
+    def get_dir_size(self, path):
+        size = 0
+        for root, dirs, files in os.walk(path):
+            for name in files:
+                try:
+                    size += os.lstat(file_manager.join_path(root, name)).st_size
+                except OSError:
+                    pass
+        return size
+
+    def read_engine_usage(self):
+        if file_manager.file_exists(self.engine_usage_path):
+            try:
+                return file_manager.read_json(self.engine_usage_path)
+            except:
+                pass
+        return {}
+
+    def mark_engine_used(self, engine):
+        usage = self.read_engine_usage()
+        usage[engine] = time.time()
+        file_manager.write_json(self.engine_usage_path, usage)
+
+    def get_referenced_engines(self):
+        return set(config.engine for config in config_manager.compatible_configs if config.engine)
+
+    # Returns a list of (engine, path, size, last used time) for the engines no config refers to, least recently used first
+    def get_unreferenced_engines(self):
+        if not file_manager.dir_exists(self.engine_dir):
+            return []
+
+        referenced = self.get_referenced_engines()
+        usage = self.read_engine_usage()
+        result = []
+        for engine in os.listdir(self.engine_dir):
+            path = file_manager.join_path(self.engine_dir, engine)
+            if engine in referenced or not file_manager.dir_exists(path):
+                continue
+            result.append((engine, path, self.get_dir_size(path), usage.get(engine, os.path.getmtime(path))))
+
+        result.sort(key=lambda engine_info: engine_info[3])
+        return result
+
+    def collect_engines(self):
+        global logger
+
+        unreferenced = self.get_unreferenced_engines()
+        budget = settings_manager.get('engine_disk_budget') * 1024 * 1024
+        archive_dir = settings_manager.get('engine_archive_dir')
+        total_size = sum(engine_info[2] for engine_info in unreferenced)
+        reclaimed = 0
+
+        logger.info(f'Unreferenced engines: {len(unreferenced)}, {file_manager.format_size(total_size)} (budget: {file_manager.format_size(budget)})')
+
+        for engine, path, size, last_used in unreferenced:
+            if total_size <= budget:
+                break
+
+            try:
+                if archive_dir:
+                    logger.info(f'Archiving the engine {engine} to "{archive_dir}"')
+                    file_manager.make_dirs(archive_dir)
+                    shutil.move(path, file_manager.join_path(archive_dir, engine))
+                else:
+                    logger.info(f'Removing the engine {engine}')
+                    shutil.rmtree(path)
+            except:
+                logger.error(f'Couldn\'t collect the engine {engine}!')
+                e = str(sys.exc_info()[1])
+                logger.error(e)
+                continue
+
+            total_size -= size
+            reclaimed += size
+
+        return reclaimed
+
+    # Removing the downloads left behind by failed or interrupted updates
+    def collect_stale_downloads(self):
+        global logger
+
+        # Only the launcher's own staging dir, the system temp dir is shared with every other program
+        candidates = []
+        if file_manager.dir_exists(staging_manager.staging_dir):
+            candidates.extend(file_manager.join_path(staging_manager.staging_dir, file_name) for file_name in os.listdir(staging_manager.staging_dir))
+
+        # Prefetched resources the current setup doesn't need anymore, games never land there as pr-downloader installs them directly
+        try:
+            staged_paths = prefetch_manager.get_staged_paths()
+        except:
+            logger.warning('Couldn\'t tell which prefetched files are still needed, keeping them:')
+            e = str(sys.exc_info()[1])
+            logger.warning(e)
+            staged_paths = None
+        if staged_paths is not None and file_manager.dir_exists(prefetch_manager.prefetch_dir):
+            candidates.extend(file_manager.join_path(prefetch_manager.prefetch_dir, file_name) for file_name in os.listdir(prefetch_manager.prefetch_dir))
+
+        reclaimed = 0
+        journal_paths = update_journal.get_paths() # Left for the interrupted update to continue with
+        for path in candidates:
+            if path in journal_paths or path in (staged_paths or ()) or not os.path.exists(path) or time.time() - os.path.getmtime(path) < self.stale_file_age:
+                continue
+            size = self.get_dir_size(path) if file_manager.dir_exists(path) else file_manager.get_file_size(path)
+            logger.info(f'Removing a stale download: "{path}"')
+            staging_manager.remove_job(path)
+            if not os.path.exists(path):
+                reclaimed += size
+        return reclaimed
+
+    def collect_garbage(self):
+        global logger
+
+        logger.info('Collecting unused engines and stale downloads')
+        reclaimed = self.collect_stale_downloads() + self.collect_engines()
+        logger.info(f'Disk space reclaimed: {file_manager.format_size(reclaimed)}')
+        return reclaimed
+
+    # Checking that the downloads (and their extracted contents) will fit before starting any of them
+    def preflight(self, resources):
+        global logger
+
+        if not resources:
+            return
+
+        with ThreadPoolExecutor(max_workers=min(8, len(resources))) as executor:
+            sizes = list(executor.map(lambda resource: http_downloader.get_content_length(mirror_manager.get_resource_urls(resource)), resources))
+
+        required = 0
+        for resource, size in zip(resources, sizes):
+            if size is None:
+                continue
+            if 'extract' in resource and resource['extract']:
+                size *= self.extraction_ratio
+            required += size
+
+        if required <= 0:
+            return
+
+        free = shutil.disk_usage(platform_manager.data_dir).free
+        logger.info(f'Disk space needed: {file_manager.format_size(required)}, available: {file_manager.format_size(free)}')
+        if free < required + self.free_space_margin:
+            raise Exception(f'Not enough disk space: {file_manager.format_size(required)} needed, only {file_manager.format_size(free)} available!')
+
+disk_manager = DiskManager()
+
+# Packs everything a config needs into one tar with a hash manifest, to set up other machines without the internet.
+# The tar is written and read as a stream, so it can go through a pipe, and the manifest is the last member
+class BundleManager():
+    manifest_name = 'manifest.json'
+    bundle_version = 1
+
+    # Returns the files to bundle as arcname -> path, the arcnames being relative to the launcher dir
+    def get_bundle_files(self, config):
+        global logger
+
+        paths = [
+            platform_manager.resources['launcher_config']['path'],
+            platform_manager.resources['lobby_config']['path'],
+            file_manager.join_path(platform_manager.data_dir, 'engine', config['launch']['engine']),
+        ]
+
+        for resource in config['downloads'].get('resources', []):
+            paths.append(file_manager.join_path(platform_manager.data_dir, resource['destination']))
+
+        for game in config['downloads'].get('games', []):
+            package_hash = rapid_repository.resolve_tag(game)
+            if not package_hash:
+                logger.warning(f'{game} isn\'t installed, leaving it out')
+                continue
+            paths.append(rapid_repository.get_package_path(package_hash))
+            paths.extend(rapid_repository.get_package_files(package_hash))
+
+        paths.extend(rapid_repository.get_versions_files())
+        if file_manager.dir_exists(rapid_repository.index_dir):
+            paths.append(rapid_repository.index_dir)
+
+        files = {}
+        for path in paths:
+            if file_manager.dir_exists(path):
+                for root, dirs, names in os.walk(path):
+                    for name in names:
+                        file_path = file_manager.join_path(root, name)
+                        files[self.get_arcname(file_path)] = file_path
+            elif file_manager.file_exists(path):
+                files[self.get_arcname(path)] = path
+            else:
+                logger.warning(f'"{path}" doesn\'t exist, leaving it out')
+        return files
+
+    # The URLs of the bundled files the next update checks with conditional requests
+    def get_cached_urls(self, config):
+        urls = [
+            platform_manager.resources['launcher_config']['url'],
+            platform_manager.resources['lobby_config']['url'],
+        ]
+        for game in config['downloads'].get('games', []):
+            repo_url = rapid_repository.get_repo_url(game)
+            if repo_url:
+                urls.append(f'{repo_url}/versions.gz')
+        return [url for url in urls if isinstance(url, str)]
+
+    def export_bundle(self, bundle_path, config):
+        global logger
+
+        started = time.monotonic()
+        display_name = config['package']['display']
+        logger.info(f'Exporting "{display_name}" to: "{bundle_path}"')
+
+        manifest = {
+            'version': self.bundle_version,
+            'config': display_name,
+            'created': time.time(),
+            'files': {},
+            'http_cache': {},
+        }
+
+        with tarfile.open(bundle_path, 'w|') as bundle:
+            for arcname, path in sorted(self.get_bundle_files(config).items()):
+                if os.path.islink(path):
+                    bundle.addfile(bundle.gettarinfo(path, arcname))
+                    continue
+
+                file_hash = hashlib.sha256()
+                with open(path, 'rb') as f:
+                    info = bundle.gettarinfo(path, arcname, fileobj=f)
+
+                    # Hashing on the way into the tar, so every file is read only once
+                    class HashingReader():
+                        def read(self, size=-1):
+                            data = f.read(size)
+                            file_hash.update(data)
+                            return data
+
+                    bundle.addfile(info, HashingReader())
+                manifest['files'][arcname] = {'sha256': file_hash.hexdigest(), 'size': info.size}
+
+            for url in self.get_cached_urls(config):
+                entry = http_metadata_cache.get_entry(url)
+                if entry:
+                    manifest['http_cache'][url] = entry
+
+            data = json.dumps(manifest, indent=4).encode('utf-8')
+            info = tarfile.TarInfo(self.manifest_name)
+            info.size = len(data)
+            info.mtime = int(time.time())
+            bundle.addfile(info, io.BytesIO(data))
+
+        total_size = sum(entry['size'] for entry in manifest['files'].values())
+        logger.info(f'Exported {len(manifest["files"])} files, {file_manager.format_size(total_size)} in {time.monotonic() - started:.1f}s')
+        return True
+
+    def get_arcname(self, path):
+        return os.path.relpath(path, platform_manager.current_dir).replace(os.sep, '/')
+
+    # The files and directories export_bundle writes for the config, as arcnames. Nothing else may come out of a bundle
+    def get_allowed_paths(self, config):
+        global logger
+
+        files = [
+            self.get_arcname(platform_manager.resources['launcher_config']['path']),
+            self.get_arcname(platform_manager.resources['lobby_config']['path']),
+        ]
+        dirs = [self.get_arcname(path) for path in [rapid_repository.packages_dir, rapid_repository.pool_dir, rapid_repository.rapid_dir, rapid_repository.index_dir]]
+        if config.engine:
+            dirs.append(self.get_arcname(file_manager.join_path(platform_manager.data_dir, 'engine', config.engine)))
+
+        data_dir = os.path.normpath(platform_manager.data_dir)
+        for resource in config.resources:
+            destination = os.path.normpath(file_manager.join_path(data_dir, resource['destination']))
+            if os.path.commonpath([data_dir, destination]) != data_dir or destination == data_dir:
+                logger.warning(f'Resource destination outside of the data dir, leaving it out: {resource["destination"]}')
+                continue
+            files.append(self.get_arcname(destination))
+            dirs.append(self.get_arcname(destination))
+        return files, dirs
+
+    def is_allowed(self, name, allowed_paths):
+        files, dirs = allowed_paths
+        if any(part in ('', '.', '..') for part in name.split('/')):
+            return False
+        return name in files or any(name.startswith(f'{path}/') for path in dirs)
+
+    # The setup the bundle was made for, from the config inside the bundle
+    def get_bundle_config(self, config_path, display_name):
+        setups = config_manager.compile_config(file_manager.read_json(config_path))
+        if display_name not in setups:
+            raise Exception(f'Bundle config "{display_name}" isn\'t in its config.json for {platform_manager.current_platform}!')
+        return setups[display_name]
+
+    def import_bundle(self, bundle_path):
+        global logger
+
+        started = time.monotonic()
+        root_dir = os.path.realpath(platform_manager.current_dir)
+        logger.info(f'Importing the bundle: "{bundle_path}"')
+
+        # Unpacking into a staging directory first, nothing is laid out until everything is verified
+        staging_dir = staging_manager.create_job_dir('bundle')
+        try:
+            hashes = {}
+            links = []
+            manifest = None
+            with tarfile.open(bundle_path, 'r|') as bundle:
+                for member in bundle:
+                    if member.name == self.manifest_name:
+                        manifest = json.load(bundle.extractfile(member))
+                        continue
+
+                    archive_extractor.check_member_path(root_dir, member.name)
+                    if member.isdir():
+                        continue
+                    if member.issym():
+                        links.append(member)
+                        continue
+                    if not member.isreg():
+                        raise Exception(f'Unexpected entry in the bundle: {member.name}')
+
+                    staging_path = file_manager.join_path(staging_dir, member.name)
+                    file_manager.make_dirs(file_manager.extract_dir_name(staging_path))
+                    file_hash = hashlib.sha256()
+                    source = bundle.extractfile(member)
+                    with open(staging_path, 'wb') as f:
+                        for chunk in iter(lambda: source.read(HttpDownloader.chunk_size), b''):
+                            f.write(chunk)
+                            file_hash.update(chunk)
+                    os.chmod(staging_path, member.mode & 0o777)
+                    hashes[member.name] = file_hash.hexdigest()
+
+            if not manifest or manifest.get('version') != self.bundle_version:
+                raise Exception('Not a bundle, or a bundle of an unsupported version!')
+
+            # The manifest comes from the bundle too, so the hashes only catch damage. What may be written is decided here
+            config_arcname = self.get_arcname(platform_manager.resources['launcher_config']['path'])
+            if config_arcname not in hashes:
+                raise Exception(f'Bundle has no {config_arcname}!')
+            allowed_paths = self.get_allowed_paths(self.get_bundle_config(file_manager.join_path(staging_dir, config_arcname), manifest.get('config')))
+            for name in list(hashes) + [member.name for member in links]:
+                if not self.is_allowed(name, allowed_paths):
+                    raise Exception(f'Unexpected file in the bundle: {name}')
+
+            expected = {name: entry['sha256'] for name, entry in manifest['files'].items() if 'sha256' in entry}
+            if hashes != expected:
+                bad_files = sorted(name for name in set(hashes) | set(expected) if hashes.get(name) != expected.get(name))
+                raise Exception(f'Bundle doesn\'t match its manifest: {", ".join(bad_files[:10])}')
+
+            # Symlinks (of the engine libraries) may only point to what the bundle is allowed to write
+            for member in links:
+                link_dir = file_manager.extract_dir_name(file_manager.join_path(root_dir, member.name))
+                target = archive_extractor.check_member_path(root_dir, os.path.relpath(file_manager.join_path(link_dir, member.linkname), root_dir))
+                if not self.is_allowed(os.path.relpath(target, root_dir).replace(os.sep, '/'), allowed_paths):
+                    raise Exception(f'Bundle link points outside of the bundle files: {member.name}')
+
+            for name in hashes:
+                destination = file_manager.join_path(root_dir, name)
+                file_manager.make_dirs(file_manager.extract_dir_name(destination))
+                file_manager.replace(file_manager.join_path(staging_dir, name), destination)
+
+            for member in links:
+                destination = file_manager.join_path(root_dir, member.name)
+                file_manager.make_dirs(file_manager.extract_dir_name(destination))
+                if os.path.lexists(destination):
+                    file_manager.remove(destination)
+                os.symlink(member.linkname, destination)
+        finally:
+            staging_manager.remove_job(staging_dir)
+
+        # The next update sends the same validators the exporting machine got, and gets "not modified" back
+        http_metadata_cache.set_entries(manifest['http_cache'])
+
+        total_size = sum(entry['size'] for entry in manifest['files'].values())
+        logger.info(f'Imported "{manifest["config"]}": {len(hashes)} files, {file_manager.format_size(total_size)} in {time.monotonic() - started:.1f}s')
+        return True
+
+bundle_manager = BundleManager()
+
+# Content-defined chunking of the engine trees, so an engine update only downloads what changed (in the spirit of zsync and casync)
+# Published with --make-chunk-index: <name>.json lists the files of the tree with their chunks, <name>.chunks holds every unique chunk once
+class ChunkedUpdater():
+    index_version = 1
+    index_dir = file_manager.join_path(platform_manager.data_dir, 'chunk_index') # Indexes of the engines being installed
+    cache_dir = file_manager.join_path(platform_manager.data_dir, 'chunk_cache') # Chunks of the installed engine files, so they're only read once
+    min_chunk_size = 16 * 1024
+    max_chunk_size = 256 * 1024
+    boundary_mask = (1 << 16) - 1 # 64 KB chunks on average
+    merge_gap = 64 * 1024 # Fetching a small gap between the missing chunks is cheaper than another request
+    max_range_size = 8 * 1024 * 1024
+    read_size = 1024 * 1024 # Files are chunked in blocks of this size, the boundary search takes about 20 times that in memory
+    window_size = 16 # The masked low 16 bits of the gear hash only depend on the last 16 bytes
+
+    def __init__(self, *args, **kwds):
+        # Fixed seed, the published indexes are only usable if both sides cut the files in the same places
+        gear_random = random.Random(0x424152)
+        self.gear = [gear_random.getrandbits(64) for n in range(256)]
+        self.gear_low = bytes(value & 0xFF for value in self.gear)
+        self.gear_high = bytes((value >> 8) & 0xFF for value in self.gear)
+        self.caches = {}
+
+    # Positions whose 16 byte window ends the gear hash with 16 zero bits, found with big integer arithmetic instead of a loop per byte.
+    # Every position gets a 32 bit lane holding the low 16 bits of its gear value, the shifted sum of 16 lanes can't carry into the next one
+    def find_boundaries(self, data):
+        size = len(data)
+        lanes = bytearray(size * 4)
+        lanes[0::4] = data.translate(self.gear_low)
+        lanes[1::4] = data.translate(self.gear_high)
+        values = int.from_bytes(lanes, 'little')
+
+        # One lane further and one bit higher for every byte back, doubling the summed window every time: 1, 2, 4, 8 and 16 bytes
+        sums = values
+        window = 1
+        while window < self.window_size:
+            sums += sums << (33 * window)
+            window *= 2
+        sums = sums.to_bytes(size * 4 + self.window_size * 5, 'little')[:size * 4]
+
+        # Zero bytes mark the lanes with both low bytes zero
+        low_bits = (int.from_bytes(sums[0::4], 'little') | int.from_bytes(sums[1::4], 'little')).to_bytes(size, 'little')
+        boundaries = []
+        position = low_bits.find(0)
+        while position >= 0:
+            boundaries.append(position)
+            position = low_bits.find(0, position + 1)
+        return boundaries
+
+    # Yields (offset, size) of the chunks of the data, which has to start at a chunk boundary.
+    # Unless it's the end of the file, the tail that may still grow into a longer chunk is left out
+    def split_chunks(self, data, final=True):
+        gear = self.gear
+        mask = self.boundary_mask
+        size = len(data)
+        boundaries = self.find_boundaries(data)
+        start = 0
+        while start < size and (final or size - start >= self.max_chunk_size):
+            end = min(start + self.max_chunk_size, size)
+            cut = end
+            # The hash starts over after the minimal chunk size, its first bytes are still short of a full window
+            first = start + self.min_chunk_size
+            h = 0
+            for i in range(first, min(first + self.window_size - 1, end)):
+                h = ((h << 1) + gear[data[i]]) & 0xFFFFFFFFFFFFFFFF
+                if not h & mask:
+                    cut = i + 1
+                    break
+            else:
+                n = bisect.bisect_left(boundaries, first + self.window_size - 1)
+                if n < len(boundaries) and boundaries[n] < end:
+                    cut = boundaries[n] + 1
+            yield start, cut - start
+            start = cut
+
+    # Yields the chunks of the open file, reading it in blocks and hashing the whole file on the way
+    def read_chunks(self, f, file_hash):
+        data = b''
+        while True:
+            block = f.read(self.read_size)
+            file_hash.update(block)
+            data += block
+            consumed = 0
+            for offset, size in self.split_chunks(data, final=not block):
+                yield data[offset:offset + size]
+                consumed = offset + size
+            data = data[consumed:]
+            if not block:
+                return
+
+    # [[sha256, size], ...] of the file, and the sha256 of the whole file
+    def chunk_file(self, path):
+        file_hash = hashlib.sha256()
+        with open(path, 'rb') as f:
+            chunks = [[hashlib.sha256(chunk).hexdigest(), len(chunk)] for chunk in self.read_chunks(f, file_hash)]
+        return chunks, file_hash.hexdigest()
+
+    def get_cache_path(self, engine):
+        return file_manager.join_path(self.cache_dir, f'{engine}.json')
+
+    def read_cache(self, engine):
+        if engine not in self.caches:
+            cache = {}
+            try:
+                if file_manager.file_exists(self.get_cache_path(engine)):
+                    cache = file_manager.read_json(self.get_cache_path(engine))
+            except:
+                logger.warning(f'Couldn\'t read the chunk cache of {engine}, rebuilding it')
+            self.caches[engine] = cache
+        return self.caches[engine]
+
+    def write_caches(self):
+        global logger
+
+        # The caches of the collected engines go with them
+        if file_manager.dir_exists(self.cache_dir):
+            for name in os.listdir(self.cache_dir):
+                engine = file_manager.split_extension(name)[0]
+                if not file_manager.dir_exists(file_manager.join_path(disk_manager.engine_dir, engine)):
+                    file_manager.remove(file_manager.join_path(self.cache_dir, name))
+
+        for engine, cache in self.caches.items():
+            if not file_manager.dir_exists(file_manager.join_path(disk_manager.engine_dir, engine)):
+                continue
+            try:
+                file_manager.make_dirs(self.cache_dir)
+                file_manager.write_json(self.get_cache_path(engine), cache)
+            except OSError as e:
+                logger.warning(f'Couldn\'t write the chunk cache of {engine}: {e}')
+
+    # Cache entry of an installed engine file, with the whole file hash and, if asked for, its chunks
+    def get_local_entry(self, engine, name, with_chunks=False):
+        path = file_manager.join_path(disk_manager.engine_dir, engine, name)
+        stat_result = os.stat(path)
+        cache = self.read_cache(engine)
+        entry = cache.get(name)
+        if not entry or entry['size'] != stat_result.st_size or entry['mtime'] != stat_result.st_mtime:
+            entry = {'size': stat_result.st_size, 'mtime': stat_result.st_mtime}
+            cache[name] = entry
+        if 'sha256' not in entry or (with_chunks and 'chunks' not in entry):
+            entry['chunks'], entry['sha256'] = self.chunk_file(path)
+        return entry
+
+    def get_local_files(self):
+        files = []
+        if not file_manager.dir_exists(disk_manager.engine_dir):
+            return files
+
+        for engine in sorted(os.listdir(disk_manager.engine_dir)):
+            engine_path = file_manager.join_path(disk_manager.engine_dir, engine)
+            if not file_manager.dir_exists(engine_path):
+                continue
+            for root, dirs, names in os.walk(engine_path):
+                for name in names:
+                    path = file_manager.join_path(root, name)
+                    if not os.path.islink(path) and os.path.isfile(path):
+                        files.append((engine, os.path.relpath(path, engine_path).replace(os.sep, '/'), os.path.getsize(path)))
+        return files
+
+    # Works out where every file of the new tree comes from: copied whole, assembled from the local chunks, or downloaded
+    def find_sources(self, index):
+        local_files = self.get_local_files()
+        by_size = {}
+        by_name = {}
+        for engine, name, size in local_files:
+            by_size.setdefault(size, []).append((engine, name))
+            by_name.setdefault(name, []).append(engine)
+
+        copies = {}
+        local_chunks = {}
+        for entry in index['files']:
+            if 'link' in entry:
+                continue
+
+            # Hashing only the files of the same size, most of the tree is usually the same
+            for engine, name in by_size.get(entry['size'], []):
+                if self.get_local_entry(engine, name)['sha256'] == entry['sha256']:
+                    copies[entry['path']] = file_manager.join_path(disk_manager.engine_dir, engine, name)
+                    break
+            if entry['path'] in copies:
+                continue
+
+            # A changed file shares most of its chunks with its previous versions
+            for engine in by_name.get(entry['path'], []):
+                local_entry = self.get_local_entry(engine, entry['path'], with_chunks=True)
+                path = file_manager.join_path(disk_manager.engine_dir, engine, entry['path'])
+                offset = 0
+                for chunk_hash, size in local_entry['chunks']:
+                    local_chunks.setdefault(chunk_hash, (path, offset, size))
+                    offset += size
+
+        needed = set()
+        for entry in index['files']:
+            if 'link' not in entry and entry['path'] not in copies:
+                needed.update(entry['chunks'])
+        missing = sorted([chunk_hash for chunk_hash in needed if chunk_hash not in local_chunks], key=lambda chunk_hash: index['chunks'][chunk_hash][0])
+        return copies, local_chunks, missing
+
+    # Neighbouring missing chunks of the store are fetched with one range request
+    def get_ranges(self, index, missing):
+        ranges = []
+        for chunk_hash in missing:
+            offset, size = index['chunks'][chunk_hash]
+            if ranges and offset - ranges[-1][1] <= self.merge_gap and offset + size - ranges[-1][0] <= self.max_range_size:
+                ranges[-1][1] = max(ranges[-1][1], offset + size)
+            else:
+                ranges.append([offset, offset + size])
+        return ranges
+
+    async def fetch_range(self, store_url, start, end, spool):
+        global logger
+
+        attempts = retry_policy.get_attempts()
+        for attempt in range(attempts):
+            response = None
+            try:
+                if not circuit_breaker.allow(store_url):
+                    raise Exception(f'"{store_url}" is down')
+                timeout = retry_policy.get_timeout(store_url, end - start)
+                response = await async_engine.run_in_thread(lambda: requests.get(store_url, headers={'Range': f'bytes={start}-{end - 1}'}, timeout=timeout, stream=True))
+                if response.status_code != 206:
+                    # A server without range support would send the whole store, no point in that
+                    raise Exception(f'No range support: {response.status_code}')
+                circuit_breaker.record_success(store_url)
+
+                chunks = response.iter_content(chunk_size=HttpDownloader.chunk_size)
+                position = start
+                while True:
+                    chunk = await async_engine.run_in_thread(next, chunks, None)
+                    if chunk is None:
+                        break
+                    spool.seek(position)
+                    spool.write(chunk)
+                    position += len(chunk)
+                    transfer_stats.add_bytes(len(chunk))
+                    await bandwidth_limiter.consume(len(chunk))
+
+                if position != end:
+                    raise Exception(f'Incomplete range: {position - start} out of {end - start} bytes')
+                metrics.inc('download_bytes_total', end - start, host=urlparse(store_url).hostname)
+                return
+            except asyncio.CancelledError:
+                raise
+            except:
+                e = str(sys.exc_info()[1])
+                if response is None or retry_policy.is_retryable_status(response.status_code):
+                    circuit_breaker.record_failure(store_url)
+                if attempt == attempts - 1 or (response is not None and not retry_policy.is_retryable_status(response.status_code)):
+                    raise Exception(f'Fetching the chunks failed: {e}')
+                delay = retry_policy.get_delay(attempt)
+                logger.warning(f'Fetching the chunks failed ({e}), retrying in {delay:.1f}s')
+                await asyncio.sleep(delay)
+            finally:
+                if response is not None:
+                    response.close()
+
+    async def fetch_chunks(self, store_url, ranges, spool):
+        async def fetch(start, end):
+            await concurrency_controller.acquire()
+            try:
+                await self.fetch_range(store_url, start, end, spool)
+            finally:
+                await concurrency_controller.release()
+
+        tasks = [asyncio.create_task(fetch(start, end)) for start, end in ranges]
+        try:
+            await asyncio.gather(*tasks)
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    # Lays the tree out in the staging directory, checking every chunk and every file against the index
+    def write_tree(self, index, destination, copies, local_chunks, missing, spool_path):
+        destination = os.path.realpath(destination)
+        missing = set(missing)
+        verified = set()
+        sources = {}
+        try:
+            with open(spool_path, 'rb') as spool:
+                for entry in index['files']:
+                    path = archive_extractor.check_member_path(destination, entry['path'])
+                    file_manager.make_dirs(file_manager.extract_dir_name(path))
+
+                    if 'link' in entry:
+                        archive_extractor.check_member_path(destination, os.path.relpath(file_manager.join_path(file_manager.extract_dir_name(path), entry['link']), destination))
+                        os.symlink(entry['link'], path)
+                        continue
+
+                    if entry['path'] in copies:
+                        shutil.copyfile(copies[entry['path']], path)
+                        file_hash = file_manager.calc_file_hash(path)
+                    else:
+                        file_hash = hashlib.sha256()
+                        with open(path, 'wb') as f:
+                            for chunk_hash in entry['chunks']:
+                                if chunk_hash in missing:
+                                    offset, size = index['chunks'][chunk_hash]
+                                    spool.seek(offset)
+                                    data = spool.read(size)
+                                    if chunk_hash not in verified:
+                                        if hashlib.sha256(data).hexdigest() != chunk_hash:
+                                            raise Exception(f'Downloaded chunk {chunk_hash} of {entry["path"]} is corrupted')
+                                        verified.add(chunk_hash)
+                                else:
+                                    source_path, offset, size = local_chunks[chunk_hash]
+                                    if source_path not in sources:
+                                        sources[source_path] = open(source_path, 'rb')
+                                    sources[source_path].seek(offset)
+                                    data = sources[source_path].read(size)
+                                f.write(data)
+                                file_hash.update(data)
+                        file_hash = file_hash.hexdigest()
+
+                    if file_hash != entry['sha256']:
+                        raise Exception(f'"{entry["path"]}" doesn\'t match the manifest')
+                    os.chmod(path, entry.get('mode', 0o644) & 0o777)
+        finally:
+            for source in sources.values():
+                source.close()
+
+    # Returns whether the resource was installed, False to fall back to downloading the whole archive
+    async def install(self, resource):
+        global logger
+
+        destination = resource['destination']
+        destination_path = file_manager.join_path(platform_manager.data_dir, destination)
+        index_url = resource['chunk_index']
+        job_dir = None
+        spool_path = None
+        try:
+            started = time.monotonic()
+            index_path = file_manager.join_path(self.index_dir, file_manager.extract_filename(urlparse(index_url).path))
+            index_path, _ = await http_downloader.download_file_async(index_url, index_path, conditional=True)
+            if not index_path:
+                raise Exception('Chunk index is unavailable')
+            index = file_manager.read_json(index_path)
+            if index.get('version') != self.index_version:
+                raise Exception(f'Unsupported chunk index version: {index.get("version")}')
+
+            logger.info(f'Looking for the chunks of "{destination}" in the installed engines')
+            copies, local_chunks, missing = await async_engine.run_in_thread(self.find_sources, index)
+            ranges = self.get_ranges(index, missing)
+            total_size = sum([entry['size'] for entry in index['files'] if 'link' not in entry])
+            fetch_size = sum([end - start for start, end in ranges])
+            logger.info(f'"{destination}": {len(copies)} files unchanged, {len(missing)} chunks to download in {len(ranges)} requests, {file_manager.format_size(fetch_size)} out of {file_manager.format_size(total_size)}')
+
+            # Downloaded chunks are kept at their offsets of the store, it's a sparse file
+            spool_path = staging_manager.create_job(f'{file_manager.extract_filename(destination)}.chunks')
+            with open(spool_path, 'r+b') as spool:
+                await self.fetch_chunks(urljoin(index_url, index['store']), ranges, spool)
+
+            job_dir = staging_manager.create_job_dir(destination)
+            await async_engine.run_in_thread(self.write_tree, index, job_dir, copies, local_chunks, missing, spool_path)
+            update_journal.set_committing(update_journal.get_resource_key(resource))
+            staging_manager.commit(job_dir, destination_path)
+            job_dir = None
+
+            # The new engine is indexed already, the next update won't have to read it
+            engine = file_manager.extract_filename(destination_path)
+            cache = self.read_cache(engine)
+            for entry in index['files']:
+                if 'link' not in entry:
+                    stat_result = os.stat(file_manager.join_path(destination_path, entry['path']))
+                    cache[entry['path']] = {'size': stat_result.st_size, 'mtime': stat_result.st_mtime, 'sha256': entry['sha256'], 'chunks': [[chunk_hash, index['chunks'][chunk_hash][1]] for chunk_hash in entry['chunks']]}
+            await async_engine.run_in_thread(self.write_caches)
+
+            logger.info(f'Installed "{destination}" from chunks in {time.monotonic() - started:.1f}s, saved {file_manager.format_size(total_size - fetch_size)}')
+            return True
+        except asyncio.CancelledError:
+            raise
+        except:
+            logger.warning(f'Incremental update of "{destination}" failed, downloading the whole archive:')
+            e = str(sys.exc_info()[1])
+            logger.warning(e)
+            return False
+        finally:
+            if job_dir:
+                staging_manager.remove_job(job_dir)
+            if spool_path:
+                staging_manager.remove_job(spool_path)
+
+    # Returns the resources that still need the usual download
+    async def install_resources(self, resources):
+        if not settings_manager.get('chunked_updates'):
+            return resources
+
+        remaining = []
+        for resource in resources:
+            if not resource.get('chunk_index') or not await self.install(resource):
+                remaining.append(resource)
+        return remaining
+
+    # For publishing: writes <prefix>.chunks and the <prefix>.json index of the tree
+    def make_index(self, source_dir, prefix):
+        global logger
+
+        source_dir = os.path.realpath(source_dir)
+        store_path = f'{prefix}.chunks'
+        index = {
+            'version': self.index_version,
+            'store': file_manager.extract_filename(store_path),
+            'chunks': {},
+            'files': [],
+        }
+
+        with open(store_path, 'wb') as store:
+            for root, dirs, names in os.walk(source_dir):
+                dirs.sort()
+                for name in sorted(names):
+                    path = file_manager.join_path(root, name)
+                    relative_path = os.path.relpath(path, source_dir).replace(os.sep, '/')
+                    if os.path.islink(path):
+                        index['files'].append({'path': relative_path, 'link': os.readlink(path)})
+                        continue
+
+                    file_hash = hashlib.sha256()
+                    entry = {'path': relative_path, 'size': 0, 'mode': os.stat(path).st_mode & 0o777, 'chunks': []}
+                    with open(path, 'rb') as f:
+                        for chunk in self.read_chunks(f, file_hash):
+                            chunk_hash = hashlib.sha256(chunk).hexdigest()
+                            if chunk_hash not in index['chunks']:
+                                index['chunks'][chunk_hash] = [store.tell(), len(chunk)]
+                                store.write(chunk)
+                            entry['chunks'].append(chunk_hash)
+                            entry['size'] += len(chunk)
+                    entry['sha256'] = file_hash.hexdigest()
+                    index['files'].append(entry)
+
+        file_manager.write_json(f'{prefix}.json', index)
+        logger.info(f'Indexed {len(index["files"])} files into {len(index["chunks"])} chunks, {file_manager.format_size(file_manager.get_file_size(store_path))}')
+        return True
+
+chunked_updater = ChunkedUpdater()
+
+# Samples the game process from /proc while it runs, and summarizes the session with its infolog afterwards
+class GameSessionMonitor():
+    infolog_name = 'infolog.txt'
+    infolog_line = re.compile(r'^\[t=(\d+):(\d+):(\d+(?:\.\d+)?)\]\[f=(-?\d+)\]')
+    frame_time_marker = re.compile(r'frame ?time\D{0,20}?(\d+(?:\.\d+)?) ?ms', re.IGNORECASE)
+    summary_path = file_manager.get_full_path(file_manager.split_extension(log_file_name)[0] + '-session.json')
+
+    def __init__(self, *args, **kwds):
+        self.samples = []
+        self.started = None
+
+    def is_supported(self):
+        return file_manager.dir_exists('/proc/self')
+
+    def read_sample(self, pid):
+        with open(f'/proc/{pid}/stat') as f:
+            # The process name may contain spaces, the fields after it are counted from the closing bracket
+            fields = f.read().rsplit(')', 1)[1].split()
+
+        sample = {
+            'time': time.monotonic(),
+            'cpu_time': (int(fields[11]) + int(fields[12])) / os.sysconf('SC_CLK_TCK'),
+            'threads': int(fields[17]),
+            'rss': int(fields[21]) * os.sysconf('SC_PAGE_SIZE'),
+            'read_bytes': None,
+            'write_bytes': None,
+        }
+
+        try:
+            with open(f'/proc/{pid}/io') as f:
+                for line in f:
+                    name, value = line.split(':')
+                    if name in ('read_bytes', 'write_bytes'):
+                        sample[name] = int(value)
+        except OSError:
+            pass # Not readable under some hardening settings
+
+        return sample
+
+    async def sample(self, proc):
+        global logger
+
+        self.samples = []
+        self.started = time.time()
+        interval = settings_manager.get('telemetry_interval')
+        logger.info(f'Sampling the game process every {interval}s')
+
+        while True:
+            try:
+                self.samples.append(self.read_sample(proc.pid))
+            except (OSError, IndexError, ValueError):
+                return # Exited
+            await asyncio.sleep(interval)
+
+    def get_percentile(self, values, percentile):
+        values = sorted(values)
+        return values[round(percentile / 100 * (len(values) - 1))]
+
+    def parse_infolog(self, path):
+        load_time = None
+        frame_times = []
+        sim_frame_times = []
+        last_frame = None
+
+        with open(path, encoding='utf-8', errors='replace') as f:
+            for line in f:
+                match = self.infolog_line.match(line)
+                if not match:
+                    continue
+
+                hours, minutes, seconds, frame = match.groups()
+                line_time = int(hours) * 3600 + int(minutes) * 60 + float(seconds)
+                frame = int(frame)
+
+                # Frames are counted from -1 until the game has loaded
+                if load_time is None and frame >= 0:
+                    load_time = line_time
+
+                marker = self.frame_time_marker.search(line, match.end())
+                if marker:
+                    frame_times.append(float(marker.group(1)))
+
+                if frame > 0:
+                    if last_frame and frame > last_frame[1] and line_time > last_frame[0]:
+                        sim_frame_times.append((line_time - last_frame[0]) * 1000 / (frame - last_frame[1]))
+                    last_frame = (line_time, frame)
+
+        # Without frame time lines in the infolog, approximating by the pace of the simulation frames
+        return load_time, (frame_times, 'reported') if frame_times else (sim_frame_times, 'simulation')
+
+    def get_summary(self):
+        global logger
+
+        summary = {
+            'started': self.started,
+            'duration': time.time() - self.started,
+            'load_time': None,
+            'peak_rss': None,
+            'average_cpu': None,
+            'max_threads': None,
+            'read_bytes': None,
+            'write_bytes': None,
+            'frame_time': None,
+        }
+
+        if self.samples:
+            first, last = self.samples[0], self.samples[-1]
+            summary['peak_rss'] = max(sample['rss'] for sample in self.samples)
+            summary['max_threads'] = max(sample['threads'] for sample in self.samples)
+            summary['read_bytes'] = last['read_bytes']
+            summary['write_bytes'] = last['write_bytes']
+            if last['time'] > first['time']:
+                summary['average_cpu'] = (last['cpu_time'] - first['cpu_time']) / (last['time'] - first['time']) * 100
+
+        infolog_path = file_manager.join_path(platform_manager.data_dir, self.infolog_name)
+        try:
+            # Skipping an infolog left over from an earlier session
+            if file_manager.file_exists(infolog_path) and os.path.getmtime(infolog_path) >= self.started:
+                summary['load_time'], (frame_times, source) = self.parse_infolog(infolog_path)
+                if frame_times:
+                    summary['frame_time'] = {
+                        'source': source,
+                        'p50': self.get_percentile(frame_times, 50),
+                        'p95': self.get_percentile(frame_times, 95),
+                        'p99': self.get_percentile(frame_times, 99),
+                    }
+        except OSError as e:
+            logger.warning(f'Couldn\'t read the infolog: {e}')
+
+        return summary
+
+    # Logs the summary, so it's part of the uploaded log as well
+    def report(self):
+        global logger
+
+        if self.started is None:
+            return
+
+        summary = self.get_summary()
+
+        def format_value(value, format_func):
+            return 'n/a' if value is None else format_func(value)
+
+        logger.info('================================================================================')
+        logger.info('Game session summary:')
+        logger.info(f'Duration: {summary["duration"]:.0f}s, load time: {format_value(summary["load_time"], lambda value: f"{value:.1f}s")}')
+        logger.info(f'Peak RSS: {format_value(summary["peak_rss"], file_manager.format_size)}, average CPU: {format_value(summary["average_cpu"], lambda value: f"{value:.0f}%")}, max threads: {format_value(summary["max_threads"], str)}')
+        logger.info(f'Disk read: {format_value(summary["read_bytes"], file_manager.format_size)}, written: {format_value(summary["write_bytes"], file_manager.format_size)}')
+        frame_time = summary['frame_time']
+        if frame_time:
+            logger.info(f'Frame time ({frame_time["source"]}): p50 {frame_time["p50"]:.1f}ms, p95 {frame_time["p95"]:.1f}ms, p99 {frame_time["p99"]:.1f}ms')
+        logger.info('================================================================================')
+
+        try:
+            file_manager.write_json(self.summary_path, summary)
+        except OSError as e:
+            logger.warning(f'Couldn\'t write the session summary: {e}')
+
+        self.started = None
+
+game_session_monitor = GameSessionMonitor()
+
+# Resident memory of the launcher itself, reported around the low-footprint mode
+class MemoryManager():
+    def get_rss(self):
+        try:
+            if platform_manager.current_platform == 'Linux':
+                with open('/proc/self/status', 'r') as f:
+                    for line in f:
+                        if line.startswith('VmRSS:'):
+                            return int(line.split()[1]) * 1024
+            elif platform_manager.current_platform == 'Windows':
+                import ctypes
+                from ctypes import wintypes
+
+                class PROCESS_MEMORY_COUNTERS(ctypes.Structure):
+                    _fields_ = [('cb', wintypes.DWORD), ('PageFaultCount', wintypes.DWORD)] + [(name, ctypes.c_size_t) for name in ('PeakWorkingSetSize', 'WorkingSetSize', 'QuotaPeakPagedPoolUsage', 'QuotaPagedPoolUsage', 'QuotaPeakNonPagedPoolUsage', 'QuotaNonPagedPoolUsage', 'PagefileUsage', 'PeakPagefileUsage')]
+
+                counters = PROCESS_MEMORY_COUNTERS()
+                counters.cb = ctypes.sizeof(counters)
+                if ctypes.windll.psapi.GetProcessMemoryInfo(ctypes.windll.kernel32.GetCurrentProcess(), ctypes.byref(counters), counters.cb):
+                    return counters.WorkingSetSize
+        except (OSError, ValueError, AttributeError):
+            pass
+        # Not available on macOS without extra dependencies
+        return None
+
+    def format_rss(self, rss):
+        return 'n/a' if rss is None else file_manager.format_size(rss)
+
+    # Collects the garbage and gives the freed heap pages back to the OS where the allocator allows it
+    def trim_heap(self):
+        gc.collect()
+        try:
+            if platform_manager.current_platform == 'Linux':
+                import ctypes
+                ctypes.CDLL('libc.so.6').malloc_trim(0)
+            elif platform_manager.current_platform == 'Windows':
+                import ctypes
+                ctypes.windll.psapi.EmptyWorkingSet(ctypes.windll.kernel32.GetCurrentProcess())
+        except (OSError, AttributeError):
+            # musl and other libcs without malloc_trim
+            pass
+
+memory_manager = MemoryManager()
+
+# With --profile, writes the cProfile stats of the startup and of every update/start run, and a tracemalloc report at every step, next to the log
+class ProfileManager():
+    report_path = file_manager.get_full_path(file_manager.split_extension(log_file_name)[0] + '-profile-memory.txt')
+    top_allocations = 25
+    top_growth = 10
+
+    def __init__(self, *args, **kwds):
+        self.enabled = startup_profile is not None
+        self.lock = Lock()
+        self.last_snapshot = None
+        self.runs = 0
+        self.paths = [] # Written this session, for the log upload
+
+    def get_stats_path(self, name):
+        return file_manager.get_full_path(file_manager.split_extension(log_file_name)[0] + f'-profile-{name}.pstats')
+
+    def write_stats(self, profile, name):
+        global logger
+
+        path = self.get_stats_path(name)
+        try:
+            profile.dump_stats(path)
+        except OSError as e:
+            logger.error(f'Couldn\'t write the profile: {e}')
+            return
+        with self.lock:
+            if path not in self.paths:
+                self.paths.append(path)
+        logger.info(f'Profile written: {path}')
+
+    def finish_startup(self):
+        if not self.enabled or not startup_profile:
+            return
+        startup_profile.disable()
+        self.write_stats(startup_profile, 'startup')
+        self.snapshot('Startup finished')
+
+    # cProfile only sees the calling thread, so this is called from the thread to profile
+    def start(self, name):
+        if not self.enabled:
+            return None
+        self.snapshot(f'{name.capitalize()} started')
+        profile = cProfile.Profile()
+        profile.enable()
+        return profile
+
+    def stop(self, profile, name):
+        if not profile:
+            return
+        profile.disable()
+        with self.lock:
+            self.runs += 1
+            run = self.runs
+        self.write_stats(profile, f'{name}-{run}')
+        self.snapshot(f'{name.capitalize()} finished')
+
+    def snapshot(self, step):
+        global logger
+
+        if not self.enabled:
+            return
+
+        with self.lock:
+            snapshot = tracemalloc.take_snapshot().filter_traces((
+                tracemalloc.Filter(False, tracemalloc.__file__),
+                tracemalloc.Filter(False, cProfile.__file__), # The stats it keeps
+                tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+                tracemalloc.Filter(False, '<unknown>'),
+            ))
+            current, peak = tracemalloc.get_traced_memory()
+            lines = [
+                f'== {time.strftime("%H:%M:%S")} {step}',
+                f'Traced: {file_manager.format_size(current)}, peak: {file_manager.format_size(peak)}, RSS: {memory_manager.format_rss(memory_manager.get_rss())}',
+                'Top allocations:',
+            ]
+            for stat in snapshot.statistics('lineno')[:self.top_allocations]:
+                lines.append(f'  {stat}')
+            if self.last_snapshot:
+                lines.append('Grown since the previous step:')
+                for stat in snapshot.compare_to(self.last_snapshot, 'lineno')[:self.top_growth]:
+                    if stat.size_diff > 0:
+                        lines.append(f'  {stat}')
+            self.last_snapshot = snapshot
+
+            try:
+                # Started over every session like the log
+                with open(self.report_path, 'a' if self.report_path in self.paths else 'w', encoding='utf-8') as f:
+                    f.write('\n'.join(lines) + '\n\n')
+                if self.report_path not in self.paths:
+                    self.paths.append(self.report_path)
+            except OSError as e:
+                logger.error(f'Couldn\'t write the memory report: {e}')
+
+    def get_paths(self):
+        with self.lock:
+            return [path for path in self.paths if file_manager.file_exists(path)]
+
+profile_manager = ProfileManager()
+
+# Works out what an update of a config would do before doing any of it, with all the remote checks in parallel
+class UpdatePlanner():
+    max_workers = 8
+    plan_path = file_manager.get_full_path(file_manager.split_extension(log_file_name)[0] + '-plan.json')
+
+    def is_launcher_outdated(self):
+        global logger
+
+        file_hashes_path = platform_manager.get_resource_local_path('file_hashes', force_download_fresh=True, ignore_download_fail=True)
+
+        launcher_file_name = platform_manager.get_executable_command('launcher')[0]
+        launcher_full_path = platform_manager.get_executable_full_command('launcher')[0]
+        launcher_file_md5 = file_manager.calc_file_hash(launcher_full_path, 'md5')
+
+        with open(file_hashes_path, 'r') as f:
+            file_hashes_lines = f.readlines()
+
+        for line in file_hashes_lines:
+            update_filename_hash = line.split()
+            update_filename = update_filename_hash[1].lstrip('*')
+            update_hash = update_filename_hash[0]
+            if update_filename == launcher_file_name:
+                if launcher_file_md5 == update_hash:
+                    logger.info(f'{update_filename} hash matches the latest version hash ({update_hash}), no update needed')
+                    return False
+                logger.info(f'{update_filename} hash ({launcher_file_md5}) doesn\'t match the latest version hash ({update_hash}), update needed!')
+                return True
+        return False
+
+    def get_resource_plan(self, resource):
+        if prefetch_manager.get_staged(resource['url']):
+            size = 0 # Already downloaded in the background, only needs installing
+        else:
+            size = http_downloader.get_content_length(mirror_manager.get_resource_urls(resource))
+        return {'url': resource['url'], 'destination': resource['destination'], 'size': size}
+
+    # The same rapid index may serve several tags, so these go one after another to not download it twice at once
+    def get_outdated_games(self, games):
+        return [game for game in games if not rapid_repository.is_up_to_date(game)]
+
+    def plan(self, config, check_launcher=True):
+        global logger
+
+        downloads = config['downloads']
+        resources = []
+        for resource in downloads.get('resources', []):
+            destination_path = file_manager.join_path(platform_manager.data_dir, resource['destination'])
+            if not file_manager.file_exists(destination_path) and not file_manager.dir_exists(destination_path):
+                resources.append(resource)
+
+        # Every task keeps the cancel scope of the caller
+        def submit(executor, func, *args):
+            return executor.submit(contextvars.copy_context().run, func, *args)
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            launcher_future = submit(executor, self.is_launcher_outdated) if check_launcher else None
+            games_future = submit(executor, self.get_outdated_games, list(dict.fromkeys(downloads.get('games', []))))
+            resource_futures = [submit(executor, self.get_resource_plan, resource) for resource in resources]
+
+            plan = {
+                'config': config['package']['display'],
+                'launcher': launcher_future.result() if launcher_future else False,
+                'games': games_future.result(),
+                'resources': [future.result() for future in resource_futures],
+            }
+
+        sizes = [resource['size'] for resource in plan['resources']]
+        plan['bytes'] = sum([size for size in sizes if size is not None])
+        plan['unknown_sizes'] = len([size for size in sizes if size is None])
+        return plan
+
+    def is_empty(self, plan):
+        return not plan['launcher'] and not plan['games'] and not plan['resources']
+
+    def describe(self, plan):
+        if self.is_empty(plan):
+            return 'up to date'
+
+        parts = []
+        if plan['launcher']:
+            parts.append('launcher update')
+        if plan['games']:
+            parts.append(f'{len(plan["games"])} games')
+        if plan['resources']:
+            size = file_manager.format_size(plan['bytes'])
+            if plan['unknown_sizes']:
+                size = f'{size} + {plan["unknown_sizes"]} of unknown size'
+            parts.append(f'{len(plan["resources"])} files ({size})')
+        return ', '.join(parts)
+
+    def log_plan(self, plan):
+        global logger
+
+        logger.info(f'Update plan for "{plan["config"]}": {self.describe(plan)}')
+        if plan['launcher']:
+            logger.info('  launcher: new version available')
+        for game in plan['games']:
+            logger.info(f'  game: {game} (pr-downloader)')
+        for resource in plan['resources']:
+            size = 'unknown size' if resource['size'] is None else file_manager.format_size(resource['size'])
+            logger.info(f'  resource: {resource["destination"]} from "{resource["url"]}" ({size})')
+
+update_planner = UpdatePlanner()
+
+# Progress of the update tasks, so an update that was killed halfway continues from the last finished step on the next run
+# States go pending -> downloaded -> verified -> extracted -> committed, games go straight to committed
+# A task is marked committing right before moving into its destination, only then the destination is the update's to roll back
+class UpdateJournal():
+    journal_path = file_manager.join_path(platform_manager.data_dir, 'update_journal.json')
+    journal_version = 1
+
+    def __init__(self, *args, **kwds):
+        self.lock = Lock()
+        self.tasks = {}
+        self.read_journal()
+
+    def read_journal(self):
+        global logger
+
+        if not file_manager.file_exists(self.journal_path):
+            return
+
+        try:
+            data = file_manager.read_json(self.journal_path)
+            if data.get('version') == self.journal_version:
+                self.tasks = data['tasks']
+        except:
+            logger.warning('Couldn\'t read the update journal, starting over:')
+            e = str(sys.exc_info()[1])
+            logger.warning(e)
+
+    # Through a synced temp file and a rename, a crash leaves either the old journal or the new one
+    def write_journal(self):
+        temp_path = f'{self.journal_path}.tmp'
+        file_manager.make_dirs(file_manager.extract_dir_name(self.journal_path))
+        with open(temp_path, 'w') as f:
+            json.dump({'version': self.journal_version, 'tasks': self.tasks}, f, indent=4)
+            f.flush()
+            os.fsync(f.fileno())
+        file_manager.replace(temp_path, self.journal_path)
+
+    def get_resource_key(self, resource):
+        return f'resource {resource["url"]} -> {resource["destination"]}'
+
+    def get_game_key(self, game):
+        return f'game {game}'
+
+    def set_state(self, key, state, **fields):
+        with self.lock:
+            task = self.tasks.setdefault(key, {'state': 'pending'})
+            task.update(fields)
+            task['state'] = state
+            self.write_journal()
+
+    # Keeps the state, a move that gets killed halfway leaves a partial destination behind
+    def set_committing(self, key):
+        with self.lock:
+            task = self.tasks.setdefault(key, {'state': 'pending'})
+            task['committing'] = True
+            self.write_journal()
+
+    # For the downloads, shared by every destination of the URL
+    def set_url_state(self, url, state, **fields):
+        with self.lock:
+            for task in self.tasks.values():
+                if task.get('url') == url and task['state'] in ('pending', 'downloaded'):
+                    task.update(fields)
+                    task['state'] = state
+            self.write_journal()
+
+    def get_state(self, key):
+        with self.lock:
+            task = self.tasks.get(key)
+            return task['state'] if task else None
+
+    # The verified download of the URL left by the interrupted update
+    def get_downloaded(self, url):
+        with self.lock:
+            for task in self.tasks.values():
+                if task.get('url') == url and task['state'] in ('verified', 'extracted') and file_manager.file_exists(task.get('downloaded_file') or ''):
+                    return task['downloaded_file']
+        return None
+
+    def get_extracted(self, resource):
+        with self.lock:
+            task = self.tasks.get(self.get_resource_key(resource))
+            if task and task['state'] == 'extracted' and file_manager.dir_exists(task.get('extract_dir') or ''):
+                return task['extract_dir']
+        return None
+
+    # Staging paths the interrupted update still needs, not to be collected as stale
+    def get_paths(self):
+        with self.lock:
+            paths = set()
+            for task in self.tasks.values():
+                paths.update([task[name] for name in ('downloaded_file', 'extract_dir') if task.get(name)])
+            return paths
+
+    # Called before planning the update, rolls back what the interrupted update left half done
+    def recover(self):
+        global logger
+
+        with self.lock:
+            if not self.tasks:
+                return
+
+            logger.info(f'Resuming an interrupted update, {len([task for task in self.tasks.values() if task["state"] == "committed"])} out of {len(self.tasks)} tasks were finished')
+            for key, task in self.tasks.items():
+                if task['state'] == 'committed':
+                    continue
+
+                # Moving into place is only atomic on the same filesystem, a copy across filesystems may have stopped halfway
+                # Without the mark the destination wasn't touched by the update, whatever is there now came from elsewhere
+                committing = task.pop('committing', False)
+                destination_path = task.get('destination_path')
+                if committing and destination_path and os.path.lexists(destination_path):
+                    logger.warning(f'Rolling back the partially committed "{destination_path}"')
+                    staging_manager.remove_job(destination_path)
+
+                # Moving the extraction across filesystems removes it as it goes, it's not complete anymore
+                extract_dir = task.get('extract_dir')
+                if extract_dir and (task['state'] != 'extracted' or committing or not file_manager.dir_exists(extract_dir)):
+                    if os.path.lexists(extract_dir):
+                        logger.warning(f'Rolling back the partial extraction: "{extract_dir}"')
+                        staging_manager.remove_job(extract_dir)
+                    task.pop('extract_dir')
+                    if task['state'] == 'extracted':
+                        task['state'] = 'verified'
+
+                # Not verified before the update was stopped, the file can't be trusted
+                downloaded_file = task.get('downloaded_file')
+                if task['state'] == 'extracted':
+                    continue
+                if task['state'] == 'downloaded' or (downloaded_file and not file_manager.file_exists(downloaded_file)):
+                    if downloaded_file and file_manager.file_exists(downloaded_file):
+                        staging_manager.remove_job(downloaded_file)
+                    task.pop('downloaded_file', None)
+                    task['state'] = 'pending'
+
+                if task['state'] == 'verified' and 'downloaded_file' not in task:
+                    task['state'] = 'pending'
+
+            self.write_journal()
+
+    # Starts tracking the tasks of this update, forgetting the ones it doesn't have anymore
+    def begin(self, games, resources):
+        with self.lock:
+            tasks = {}
+            for game in games:
+                key = self.get_game_key(game)
+                tasks[key] = self.tasks.get(key, {'state': 'pending'})
+            for resource in resources:
+                key = self.get_resource_key(resource)
+                tasks[key] = self.tasks.get(key, {'state': 'pending'})
+                tasks[key].update({'url': resource['url'], 'destination_path': file_manager.join_path(platform_manager.data_dir, resource['destination'])})
+            self.tasks = tasks
+            self.write_journal()
+
+    # Forgets the update once all of it is committed, otherwise the next run continues it
+    def finish(self):
+        with self.lock:
+            if any(task['state'] != 'committed' for task in self.tasks.values()):
+                return False
+            self.tasks = {}
+            if file_manager.file_exists(self.journal_path):
+                file_manager.remove(self.journal_path)
+            return True
+
+update_journal = UpdateJournal()
+
+# Thread class that executes Update/Start
+class UpdaterStarterThread(Thread):
+    report_path = file_manager.get_full_path(file_manager.split_extension(log_file_name)[0] + '-update-report.json')
+
+    def __init__(self, is_update, configs=None):
+        Thread.__init__(self)
+        self.is_update = is_update
+        self.configs = configs # Updating all of these at once without starting the game
+        self.report = None
+        self.scope = CancelScope('update')
+        self.started = time.monotonic() # When the button was pressed
+        self.start()
+
+    # Unique jobs across the configs: games by tag, resources by URL and destination
+    def collect_jobs(self, configs):
+        games = {}
+        resources = {}
+        for config in configs:
+            if config.get('no_downloads', False):
+                continue
+            for game in config['downloads'].get('games', []):
+                games[game] = game
+            for resource in config['downloads'].get('resources', []):
+                resources[(resource['url'], resource['destination'])] = resource
+        return games, resources
+
+    def get_spring_command(self, config):
+        engine_dir = file_manager.join_path(platform_manager.data_dir, 'engine', config['launch']['engine'])
+        spring_command = platform_manager.get_executable_command('spring')
+        spring_command[0] = file_manager.join_path(engine_dir, spring_command[0])
+        return engine_dir, spring_command
+
+    # Config name -> what's missing to launch it, empty if it's ready
+    def get_readiness(self, configs, game_results):
+        report = {}
+        for config in configs:
+            missing = []
+            for game in config['downloads'].get('games', []):
+                if not game_results.get(game, False):
+                    missing.append(game)
+            for resource in config['downloads'].get('resources', []):
+                destination_path = file_manager.join_path(platform_manager.data_dir, resource['destination'])
+                if not file_manager.file_exists(destination_path) and not file_manager.dir_exists(destination_path):
+                    missing.append(resource['destination'])
+            engine_destination = f'engine/{config["launch"]["engine"]}'
+            if not file_manager.file_exists(self.get_spring_command(config)[1][0]) and engine_destination not in missing:
+                missing.append(engine_destination)
+            report[config['package']['display']] = sorted(set(missing))
+        return report
+
+    def write_report(self, report):
+        global logger
+
+        logger.info('================================================================================')
+        for name, missing in report.items():
+            if missing:
+                logger.warning(f'"{name}" is not ready, missing: {", ".join(missing)}')
+            else:
+                logger.info(f'"{name}" is ready to launch')
+        logger.info('================================================================================')
+
+        try:
+            file_manager.write_json(self.report_path, report)
+        except OSError as e:
+            logger.warning(f'Couldn\'t write the update report: {e}')
+
+    def self_update(self):
+        launcher_file_name = platform_manager.get_executable_command('launcher')[0]
+        launcher_full_path = platform_manager.get_executable_full_command('launcher')[0]
+        temp_dir = file_manager.get_temp_dir()
+
+        platform_manager.download_executable('launcher', temp_dir)
+        new_full_path = file_manager.join_path(temp_dir, launcher_file_name)
+        process_starter.start_process([new_full_path, '--upgrade', launcher_full_path], nowait=True)
+        sys.exit()
+
+    # Runs on its own thread outside of the update scope, the game doesn't wait for it and cancelling doesn't stop it
+    def refresh_lobby_config(self):
+        global logger
+
+        try:
+            platform_manager.get_resource_local_path('lobby_config', force_download_fresh=True, ignore_download_fail=True)
+            logger.info('Lobby config refreshed in the background')
+        except:
+            logger.warning('Background lobby config refresh failed:')
+            e = str(sys.exc_info()[1])
+            logger.warning(e)
+
+    # Can be called from the GUI thread, stops the downloads and extractions in flight
+    def cancel(self):
+        self.scope.cancel()
+
+    # Returns a dict of resource URL -> downloaded file, raises if any of them failed (unless the failures are allowed)
+    async def download_resources(self, resources, report_progress, allow_failures=False):
+        global logger
+
+        async def download_resource(resource):
+            name = file_manager.extract_filename(urlparse(resource['url']).path)
+            content_hash = resource.get('sha256')
+
+            # The files from before this update get the same check as the fresh downloads
+            async def is_intact(path):
+                if not content_hash or await async_engine.run_in_thread(file_manager.calc_file_hash, path) == content_hash:
+                    return True
+                logger.error(f'"{path}" doesn\'t match its sha256 from the config, downloading it again')
+                file_manager.remove(path)
+                return False
+
+            downloaded_file = update_journal.get_downloaded(resource['url'])
+            if downloaded_file:
+                if await is_intact(downloaded_file):
+                    logger.info(f'Using the file downloaded by the interrupted update: "{downloaded_file}"')
+                    return downloaded_file
+                update_journal.set_url_state(resource['url'], 'pending', downloaded_file=None)
+
+            downloaded_file = prefetch_manager.get_staged(resource['url'])
+            if downloaded_file and await is_intact(downloaded_file):
+                logger.info(f'Using the prefetched file: "{downloaded_file}"')
+                metrics.inc('cache_requests_total', cache='prefetch', result='hit')
+                update_journal.set_url_state(resource['url'], 'verified', downloaded_file=downloaded_file)
+                return downloaded_file
+            metrics.inc('cache_requests_total', cache='prefetch', result='miss')
+
+            if content_hash and peer_cache.is_enabled():
+                downloaded_file = await peer_cache.fetch_content(content_hash, name, resource.get('size'))
+                if downloaded_file:
+                    update_journal.set_url_state(resource['url'], 'verified', downloaded_file=downloaded_file)
+                    return downloaded_file
+
+            await concurrency_controller.acquire()
+            try:
+                job_path = staging_manager.create_job(name)
+                downloaded_file = (await http_downloader.download_file_async(mirror_manager.get_resource_urls(resource), job_path))[0]
+                if not downloaded_file:
+                    staging_manager.remove_job(job_path)
+            finally:
+                await concurrency_controller.release()
+
+            if not downloaded_file:
+                return None
+            update_journal.set_url_state(resource['url'], 'downloaded', downloaded_file=downloaded_file)
+
+            if content_hash and await async_engine.run_in_thread(file_manager.calc_file_hash, downloaded_file) != content_hash:
+                logger.error(f'"{name}" doesn\'t match its sha256 from the config!')
+                staging_manager.remove_job(downloaded_file)
+                update_journal.set_url_state(resource['url'], 'pending', downloaded_file=None)
+                return None
+
+            # A complete download is kept for the next run if this one fails, the journal knows about it
+            update_journal.set_url_state(resource['url'], 'verified')
+            staging_manager.untrack_job(downloaded_file)
+            return downloaded_file
+
+        downloaded_files = {}
+        if not resources:
+            return downloaded_files
+
+        # Downloading the same URL only once, even if it goes to several destinations
+        unique_resources = list({resource['url']: resource for resource in resources}.values())
+
+        await async_engine.run_in_thread(disk_manager.preflight, [resource for resource in unique_resources if not prefetch_manager.get_staged(resource['url']) and not update_journal.get_downloaded(resource['url'])])
+
+        logger.info(f'Downloading {len(unique_resources)} files')
+        transfer_stats.reset()
+        tasks = [asyncio.create_task(download_resource(resource)) for resource in unique_resources]
+        try:
+            pending = set(tasks)
+            last_adjusted = time.monotonic()
+            while pending:
+                done, pending = await asyncio.wait(pending, timeout=1)
+                report_progress(transfer_stats.get_status_text())
+
+                if time.monotonic() - last_adjusted >= concurrency_controller.adjust_interval:
+                    await concurrency_controller.adjust(transfer_stats.get_rate(), transfer_stats.pop_error_rate())
+                    last_adjusted = time.monotonic()
+        finally:
+            # Stopping the rest if cancelled, and letting them clean up their partial files
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+        logger.info(f'Downloads finished, peak rate: {file_manager.format_size(transfer_stats.peak_rate)}/s')
+
+        for task, resource in zip(tasks, unique_resources):
+            downloaded_file = task.result()
+            if not downloaded_file:
+                url = resource['url']
+                if not allow_failures:
+                    raise Exception(f'Error downloading: {url}!')
+                logger.error(f'Error downloading: {url}!')
+                continue
+            downloaded_files[resource['url']] = downloaded_file
+
+        return downloaded_files
+
+    async def install_resources(self, resources, downloaded_files, report_progress, allow_failures=False):
+        global logger
+
+        resources = [resource for resource in resources if resource['url'] in downloaded_files]
+        # Installs still to use each downloaded file, only the last one may move or remove it
+        users = {}
+        for resource in resources:
+            users[resource['url']] = users.get(resource['url'], 0) + 1
+
+        archive_count = len([resource for resource in resources if 'extract' in resource and resource['extract']])
+        job_count = archive_extractor.get_job_count(archive_count)
+        threads = archive_extractor.get_thread_count(job_count)
+        budget = asyncio.Semaphore(job_count)
+        in_progress = []
+
+        if archive_count:
+            logger.info(f'Extracting {archive_count} archives, {job_count} at once with {threads} threads each')
+
+        # The last install to use the downloaded file gets it out of the way
+        def release_download(resource, downloaded_file):
+            users[resource['url']] -= 1
+            if users[resource['url']] > 0 or not file_manager.file_exists(downloaded_file):
+                return
+
+            if not peer_cache.store(downloaded_file, resource.get('sha256')):
+                logger.info(f'Removing a temp file: "{downloaded_file}"')
+                file_manager.remove(downloaded_file)
+
+        async def install_resource(resource):
+            destination = resource['destination']
+            destination_path = file_manager.join_path(platform_manager.data_dir, destination)
+            downloaded_file = downloaded_files[resource['url']]
+            journal_key = update_journal.get_resource_key(resource)
+
+            extract_dir = update_journal.get_extracted(resource)
+            if extract_dir:
+                logger.info(f'Using the extraction of the interrupted update: "{extract_dir}"')
+                update_journal.set_committing(journal_key)
+                staging_manager.commit(extract_dir, destination_path)
+                update_journal.set_state(journal_key, 'committed')
+                release_download(resource, downloaded_file)
+                return
+
+            if not file_manager.file_exists(downloaded_file):
+                logger.info('Downloaded file didn\'t exist!')
+                return
+
+            if not ('extract' in resource and resource['extract']):
+                if users[resource['url']] > 1:
+                    # Others still need the downloaded file, installing a copy of it
+                    copy_path = staging_manager.create_job(destination)
+                    await async_engine.run_in_thread(shutil.copyfile, downloaded_file, copy_path)
+                    update_journal.set_committing(journal_key)
+                    staging_manager.commit(copy_path, destination_path)
+                    update_journal.set_state(journal_key, 'committed')
+                    release_download(resource, downloaded_file)
+                    return
+                peer_cache.store(downloaded_file, resource.get('sha256'), keep_original=True)
+                update_journal.set_committing(journal_key)
+                staging_manager.commit(downloaded_file, destination_path)
+                update_journal.set_state(journal_key, 'committed')
+                users[resource['url']] -= 1
+                return
+
+            async with budget:
+                in_progress.append(destination)
+                report_progress(in_progress)
+                try:
+                    # Extracting next to the destination and moving it in place only when complete
+                    extract_dir = staging_manager.create_job_dir(destination)
+                    update_journal.set_state(journal_key, 'verified', extract_dir=extract_dir) # To roll it back if the update gets killed
+                    logger.info(f'Extracting to a staging directory: "{extract_dir}"')
+
+                    started = time.monotonic()
+                    if not await archive_extractor.extract(downloaded_file, extract_dir, threads):
+                        staging_manager.remove_job(extract_dir)
+                        raise Exception(f'Error extracting {downloaded_file}!')
+                    logger.info(f'Extracted "{destination}" in {time.monotonic() - started:.1f}s')
+                    update_journal.set_state(journal_key, 'extracted')
+                    staging_manager.untrack_job(extract_dir)
+                finally:
+                    in_progress.remove(destination)
+
+            update_journal.set_committing(journal_key)
+            staging_manager.commit(extract_dir, destination_path)
+            update_journal.set_state(journal_key, 'committed')
+            release_download(resource, downloaded_file)
+
+        tasks = [asyncio.create_task(install_resource(resource)) for resource in resources]
+        try:
+            if allow_failures:
+                # Every one of them gets its chance, the ones that failed are just missing in the end
+                for result in await asyncio.gather(*tasks, return_exceptions=True):
+                    if isinstance(result, asyncio.CancelledError):
+                        raise result
+                    if isinstance(result, BaseException):
+                        logger.error(str(result))
+            else:
+                await asyncio.gather(*tasks)
+        finally:
+            # One failed, stopping the rest and leaving their staging directories to the scope cleanup
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    def run(self):
+        global main_frame
+        global logger
+
+        config = config_manager.current_config
+        current_scope.set(self.scope)
+        mode = 'update' if self.is_update else 'start'
+        if self.configs:
+            mode = 'update_all'
+        profile = profile_manager.start(mode)
+
+        total_progress_steps = 2 # Without updating, only 2 steps (update lobby config and start)
+        if self.configs:
+            total_progress_steps = 0 # Nothing to start after updating all the configs
+        current_progres_step = 0
+
+        def set_gauge_range(value):
+            if main_frame:
+                wx.PostEvent(main_frame, ProgressUpdateEvent({'range': value}))
+
+        def set_gauge_progress(value):
+            self.scope.check() # Every step starts with the progress update, a good place to stop if cancelled
+            profile_manager.snapshot(f'Step {value} out of {total_progress_steps}')
+            if main_frame:
+                wx.PostEvent(main_frame, ProgressUpdateEvent({'value': value}))
+
+        # The progress ticks only go to the window, the log (that users upload) gets the summaries
+        def set_status_text(current_step, total_steps, message, log=True):
+            text = f'Step {current_step} out of {total_steps}: {message}'
+            if log:
+                logger.info(text)
+            if main_frame:
+                wx.PostEvent(main_frame, StatusUpdateEvent(text))
+
+        set_gauge_range(total_progress_steps)
+        set_gauge_progress(current_progres_step)
+
+        # Waiting for the background prefetch to step aside
+        prefetch_manager.suspend()
+        is_suspended = True
+
+        try:
+            if self.is_update:
+                update_journal.recover()
+
+            plan = None
+            if self.is_update and not self.configs:
+                if main_frame:
+                    wx.PostEvent(main_frame, StatusUpdateEvent('Planning the update...'))
+                plan = update_planner.plan(config)
+                update_planner.log_plan(plan)
+                if main_frame:
+                    wx.PostEvent(main_frame, StatusUpdateEvent(f'Update plan: {update_planner.describe(plan)}'))
+
+            if plan and update_planner.is_empty(plan):
+                logger.info('Nothing to update, starting right away')
+            elif self.is_update:
+                # Updating the game according to the current config, or all the configs with every shared job done once
+                pr_downloader_games, http_resources = self.collect_jobs(self.configs or [config])
+                game_results = {}
+                if plan:
+                    # Only what the plan found outdated
+                    pr_downloader_games = {game: game for game in pr_downloader_games if game in plan['games']}
+                    planned_resources = [(resource['url'], resource['destination']) for resource in plan['resources']]
+                    http_resources = {key: resource for key, resource in http_resources.items() if key in planned_resources}
+
+                check_launcher = not self.configs and plan['launcher']
+                if check_launcher:
+                    total_progress_steps += 1 # Self-update
+                total_progress_steps += len(pr_downloader_games)
+                if http_resources:
+                    total_progress_steps += 1 # Only one step for all resources, as they are fast to update
+
+                set_gauge_range(total_progress_steps)
+
+                if check_launcher:
+                    logger.info('Updating the launcher')
                     logger.info('================================================================================')
+
+                    current_progres_step += 1
+                    set_gauge_progress(current_progres_step)
+                    set_status_text(current_progres_step, total_progress_steps, 'updating the launcher')
+
+                    self.self_update()
+                elif self.configs:
+                    logger.info(f'Updating {len(self.configs)} configs: {len(pr_downloader_games)} games and {len(http_resources)} resources in total')
+
+                # The journal rolled back whatever the interrupted update left half done, so an existing destination is complete
+                pending_resources = []
+                for n in http_resources:
                     resource = http_resources[n]
-                    destination = resource['destination']
                     destination_path = file_manager.join_path(platform_manager.data_dir, resource['destination'])
 
-                    set_status_text(current_progres_step, total_progress_steps, f'updating {destination}')
-
                     if file_manager.file_exists(destination_path) or file_manager.dir_exists(destination_path):
                         logger.warning(f'"{destination_path}" already exists, skipping...')
                         continue
 
-                    url = resource['url']
-                    is_extract = 'extract' in resource and resource['extract']
+                    pending_resources.append(resource)
 
-                    downloaded_file = http_downloader.download_file(url, file_manager.get_temp_dir())
-                    if not downloaded_file:
-                        raise Exception(f'Error downloading: {url}!')
+                update_journal.begin(list(pr_downloader_games), pending_resources)
+
+                logger.info('Updating the game repositories')
+                for n in pr_downloader_games:
+                    logger.info('================================================================================')
+                    game = pr_downloader_games[n]
 
-                    if is_extract:
-                        if file_manager.file_exists(downloaded_file):
-                            logger.info(f'Creating target directories: "{destination_path}"')
-                            file_manager.make_dirs(destination_path)
+                    current_progres_step += 1
+                    set_gauge_progress(current_progres_step)
+                    set_status_text(current_progres_step, total_progress_steps, f'updating {game}')
 
-                            if not archive_extractor.extract_7zip(downloaded_file, destination_path):
-                                file_manager.remove_dir(destination_path) # Removing a (hopefully) empty directory
-                                raise Exception(f'Error extracting {downloaded_file}!')
+                    if update_journal.get_state(update_journal.get_game_key(game)) == 'committed':
+                        logger.info(f'{game} was updated by the interrupted update, skipping')
+                        game_results[game] = True
+                        continue
 
-                            logger.info(f'Removing a temp file: "{downloaded_file}"')
-                            file_manager.remove(downloaded_file)
-                        else:
-                            logger.info('Downloaded file didn\'t exist!')
+                    peer_cache.fetch_rapid_package(game)
+                    game_results[game] = pr_downloader.download_game(platform_manager.data_dir, game, outdated=plan is not None)
+                    if not game_results[game]:
+                        if not self.configs:
+                            raise Exception(f'Error updating {n}!')
+                        logger.error(f'Error updating {n}!')
                     else:
-                        if file_manager.file_exists(downloaded_file):
-                            destination_path_dir = file_manager.extract_dir_name(destination_path)
-                            logger.info(f'Creating target directories: "{destination_path_dir}"')
-                            file_manager.make_dirs(destination_path_dir)
+                        update_journal.set_state(update_journal.get_game_key(game), 'committed')
+
+                logger.info('Updating the engine and additional resources')
+                if len(http_resources) > 0:
+                    current_progres_step += 1
+                    set_gauge_progress(current_progres_step)
 
-                            logger.info(f'Renaming a temp file: "{downloaded_file}" to: "{destination_path}"')
-                            file_manager.rename(downloaded_file, destination_path)
-                        else:
-                            logger.info('Downloaded file didn\'t exist!')
+                # Engines with a published chunk index reuse what's in the installed ones and download only the rest
+                chunked_resources = [resource for resource in pending_resources if resource.get('chunk_index')]
+                if chunked_resources and settings_manager.get('chunked_updates'):
+                    set_status_text(current_progres_step, total_progress_steps, f'updating {len(chunked_resources)} engines incrementally')
+                    pending_resources = async_engine.run(chunked_updater.install_resources(pending_resources))
+                    for resource in chunked_resources:
+                        if resource not in pending_resources:
+                            update_journal.set_state(update_journal.get_resource_key(resource), 'committed')
+
+                # Downloading everything in parallel first, then extracting within the CPU/disk budget
+                def report_download_progress(rate_text):
+                    set_status_text(current_progres_step, total_progress_steps, f'downloading {len(pending_resources)} files ({rate_text})', log=False)
+
+                allow_failures = bool(self.configs) # One broken config shouldn't keep the others from updating
+                downloaded_files = async_engine.run(self.download_resources(pending_resources, report_download_progress, allow_failures))
+
+                def report_install_progress(destinations):
+                    set_status_text(current_progres_step, total_progress_steps, f'updating {", ".join(destinations)}')
+
+                async_engine.run(self.install_resources(pending_resources, downloaded_files, report_install_progress, allow_failures))
+                update_journal.finish()
+
+                if self.configs:
+                    self.report = self.get_readiness(self.configs, game_results)
+                    self.write_report(self.report)
+
+                    if settings_manager.get('engine_gc'):
+                        disk_manager.collect_garbage()
+
+                    ready_count = len([name for name, missing in self.report.items() if not missing])
+                    summary = f'{ready_count} out of {len(self.report)} configs are ready'
+                    logger.info(summary)
+                    metrics.inc('runs_total', mode=mode, result='success' if ready_count == len(self.report) else 'failed')
+                    if main_frame:
+                        wx.PostEvent(main_frame, ExecFinishedEvent(summary, report=self.report))
+                    return
 
             logger.info('Updating lobby config')
             logger.info('================================================================================')
@@ -808,7 +4848,12 @@ class UpdaterStarterThread(Thread):
             set_gauge_progress(current_progres_step)
             set_status_text(current_progres_step, total_progress_steps, 'updating lobby config')
 
-            lobby_config_path = platform_manager.get_resource_local_path('lobby_config', force_download_fresh=True, ignore_download_fail=True)
+            # Without updating, a slow or dead network shouldn't hold the game back, the cached lobby config will do
+            if not self.is_update and settings_manager.get('fast_start') and file_manager.file_exists(platform_manager.resources['lobby_config']['path']):
+                logger.info('Starting with the cached lobby config, refreshing it in the background')
+                Thread(target=self.refresh_lobby_config, name='LobbyConfigRefresh', daemon=True).start()
+            else:
+                platform_manager.get_resource_local_path('lobby_config', force_download_fresh=True, ignore_download_fail=True)
 
             logger.info('Starting the game')
             logger.info('================================================================================')
@@ -823,9 +4868,7 @@ class UpdaterStarterThread(Thread):
             # Starting the game
             start_args = config['launch']['start_args']
             engine = config['launch']['engine']
-            engine_dir = file_manager.join_path(platform_manager.data_dir, 'engine', engine)
-            spring_command = platform_manager.get_executable_command('spring')
-            spring_command[0] = file_manager.join_path(engine_dir, spring_command[0])
+            engine_dir, spring_command = self.get_spring_command(config)
 
             if not file_manager.dir_exists(engine_dir) or not file_manager.file_exists(spring_command[0]):
                 if file_manager.dir_exists(engine_dir):
@@ -834,31 +4877,144 @@ class UpdaterStarterThread(Thread):
 
             spring_command.extend(['--write-dir', platform_manager.data_dir, '--isolation'])
             spring_command.extend(start_args)
-            if not process_starter.start_process(spring_command):
+
+            disk_manager.mark_engine_used(engine)
+            if self.is_update and settings_manager.get('engine_gc'):
+                disk_manager.collect_garbage()
+
+            if settings_manager.get('prewarm_cache'):
+                set_status_text(current_progres_step, total_progress_steps, 'warming up the disk cache')
+                cache_prewarmer.prewarm(engine_dir, config['downloads'].get('games', []))
+
+            # Letting the background prefetch continue while the game is running
+            prefetch_manager.resume()
+            is_suspended = False
+
+            monitor = None
+            if settings_manager.get('game_telemetry') and game_session_monitor.is_supported():
+                monitor = game_session_monitor.sample
+
+            time_to_game = time.monotonic() - self.started
+            logger.info(f'Time from click to spawn: {time_to_game:.2f}s')
+            metrics.observe('time_to_game_seconds', time_to_game, mode=mode)
+            metrics.write_textfile()
+
+            is_success = process_starter.start_process(spring_command, monitor=monitor)
+            if monitor:
+                game_session_monitor.report()
+
+            if not is_success:
                 raise Exception('Error while running the game!')
 
             logger.info('Process finished!')
+            metrics.inc('runs_total', mode=mode, result='success')
             if main_frame:
                 wx.PostEvent(main_frame, ExecFinishedEvent(None))
+        except CancelledError:
+            logger.warning('Update/Start was cancelled!')
+            self.scope.cleanup()
+            metrics.inc('runs_total', mode=mode, result='cancelled')
+            if main_frame:
+                wx.PostEvent(main_frame, ExecFinishedEvent('Cancelled', cancelled=True))
         except:
             logger.error('Error while updating/starting the game!')
             e = str(sys.exc_info()[1])
             logger.error(e)
+            self.scope.cleanup()
+            metrics.inc('runs_total', mode=mode, result='failed')
             if main_frame:
                 wx.PostEvent(main_frame, ExecFinishedEvent(e))
+        finally:
+            if is_suspended:
+                prefetch_manager.resume()
+            metrics.write_textfile()
+            profile_manager.stop(profile, mode)
+
+
+# Cosmetic resources of the window. It opens with whatever is already on disk (or the fallbacks) and never waits for the network
+class AssetManager():
+    resource_names = ['icon_image', 'background_image', 'font_file']
+
+    def get_resources(self, resource_name):
+        resources = platform_manager.resources[resource_name]
+        return list(resources) if isinstance(resources, list) else [resources]
+
+    # A random one of the downloaded variants, None if there are none yet
+    def get_local_path(self, resource_name):
+        paths = [resource['path'] for resource in self.get_resources(resource_name) if file_manager.file_exists(resource['path'])]
+        return random.choice(paths) if paths else None
+
+    def get_icon(self, icon_path):
+        if icon_path:
+            try:
+                icon = wx.Icon(wx.Bitmap(icon_path))
+                if icon.IsOk():
+                    return icon
+            except:
+                logger.error(f'Couldn\'t load the icon from "{icon_path}"')
+        return wx.ArtProvider.GetIcon(wx.ART_INFORMATION, wx.ART_OTHER, (32, 32))
+
+    # Tries the variants in a random order until one of them is downloaded
+    async def fetch(self, resource_name):
+        global logger
+
+        resources = self.get_resources(resource_name)
+        random.shuffle(resources)
+        for resource in resources:
+            path, _ = await http_downloader.download_file_async(resource['url'], resource['path'])
+            if path:
+                if main_frame:
+                    wx.PostEvent(main_frame, AssetLoadedEvent(resource_name, path))
+                return path
+
+        logger.error(f'Couldn\'t download any of the {resource_name}, using the fallback')
+        return None
+
+    # The other variants are only needed by the later launches, so they go at the background prefetch rate
+    async def prefetch_variants(self, resource_name):
+        missing = [resource for resource in self.get_resources(resource_name) if not file_manager.file_exists(resource['path'])]
+        if not missing:
+            return
+
+        logger.info(f'Prefetching {len(missing)} more of the {resource_name}')
+        max_rate = settings_manager.get('prefetch_max_rate')
+        await asyncio.gather(*[http_downloader.download_file_async(resource['url'], resource['path'], max_rate=max_rate) for resource in missing])
+
+    async def load(self, missing):
+        await asyncio.gather(*[self.fetch(resource_name) for resource_name in missing])
+        await self.prefetch_variants('background_image')
+
+asset_manager = AssetManager()
+
+# Thread class that downloads the missing window assets after the window is opened
+class AssetLoaderThread(Thread):
+    def __init__(self, missing):
+        Thread.__init__(self, daemon=True)
+        self.missing = missing
+        self.start()
+
+    def run(self):
+        global logger
 
+        try:
+            async_engine.run(asset_manager.load(self.missing))
+        except:
+            logger.error('Downloading the launcher assets failed:')
+            e = str(sys.exc_info()[1])
+            logger.error(e)
 
 class CustomTaskBarIcon(wx.adv.TaskBarIcon):
-    def __init__(self, frame, icon_path):
+    def __init__(self, frame, icon):
         wx.adv.TaskBarIcon.__init__(self)
         self.frame = frame
-        self.icon = wx.Icon(wx.Bitmap(icon_path))
+        self.icon = icon
+        self.tooltip = game_name
 
-        self.SetIcon(self.icon, game_name)
+        self.SetIcon(self.icon, self.tooltip)
         #self.Bind(wx.adv.EVT_TASKBAR_LEFT_DCLICK, self.OnToggleHide)
 
-    def CreateMenuItem(self, menu, label, func):
-        item = wx.MenuItem(menu, -1, label)
+    def CreateMenuItem(self, menu, label, func, kind=wx.ITEM_NORMAL):
+        item = wx.MenuItem(menu, -1, label, kind=kind)
         menu.Bind(wx.EVT_MENU, func, id=item.GetId())
         menu.Append(item)
         return item
@@ -867,9 +5023,25 @@ class CustomTaskBarIcon(wx.adv.TaskBarIcon):
         menu = wx.Menu()
         self.CreateMenuItem(menu, 'Show/hide', self.OnToggleHide)
         menu.AppendSeparator()
+        item_prefetch = self.CreateMenuItem(menu, 'Background prefetch', self.OnTogglePrefetch, kind=wx.ITEM_CHECK)
+        item_prefetch.Check(settings_manager.get('background_prefetch'))
+        item_status = menu.Append(wx.ID_ANY, prefetch_manager.status)
+        item_status.Enable(False)
+        menu.AppendSeparator()
         self.CreateMenuItem(menu, 'Exit', self.OnTaskBarClose)
         return menu
 
+    def SetStatus(self, text):
+        self.tooltip = f'{game_name}\nPrefetch: {text}'
+        self.SetIcon(self.icon, self.tooltip)
+
+    def SetAppIcon(self, icon):
+        self.icon = icon
+        self.SetIcon(self.icon, self.tooltip)
+
+    def OnTogglePrefetch(self, event):
+        self.frame.SetPrefetchEnabled(not settings_manager.get('background_prefetch'))
+
     def OnTaskBarActivate(self, event):
         pass
 
@@ -882,6 +5054,8 @@ class CustomTaskBarIcon(wx.adv.TaskBarIcon):
             self.frame.Restore()
 
     def OnToggleHide(self, event):
+        if self.frame.IsIconized():
+            self.frame.SetLowFootprint(False)
         self.IconizeWindow(not self.frame.IsIconized())
 
     def OnTaskBarClose(self, event):
@@ -891,13 +5065,36 @@ class MainPanel(wx.Panel):
     def __init__(self, parent, background_path, font_path):
         wx.Panel.__init__(self, parent=parent)
         self.font_path = font_path
+        self.background_path = background_path
         self.SetBackgroundStyle(wx.BG_STYLE_CUSTOM)
-        self.bg = wx.Image(background_path, wx.BITMAP_TYPE_ANY)
-        self.proportion = self.bg.GetWidth() / self.bg.GetHeight()
+        self.bg = None
+        self.LoadBackground()
 
         self.Bind(wx.EVT_SIZE, self.OnSize)
         self.Bind(wx.EVT_PAINT, self.OnPaint)
 
+    def LoadBackground(self):
+        if self.bg or not self.background_path:
+            return
+        self.bg = wx.Image(self.background_path, wx.BITMAP_TYPE_ANY)
+        self.proportion = self.bg.GetWidth() / self.bg.GetHeight()
+        self.Refresh()
+
+    # Swapping in the assets that arrived after the window was opened
+    def SetBackground(self, background_path, load=True):
+        self.background_path = background_path
+        self.bg = None
+        if load:
+            self.LoadBackground()
+
+    def SetFontPath(self, font_path):
+        self.font_path = font_path
+        self.Refresh()
+
+    # The decoded image is the biggest thing the window holds, dropped while the game runs
+    def ReleaseBackground(self):
+        self.bg = None
+
     def OnSize(self, size):
         self.Layout()
         self.Refresh()
@@ -911,21 +5108,26 @@ class MainPanel(wx.Panel):
         if not client_width or not client_height:
             return
 
-        # Calculation the new image size with the window proportions, adjusting for height or width depending on image proportions
-        if client_width // self.proportion >= client_height:
-            client_height = int(client_width / self.proportion)
-        else:
-            client_width = int(client_height * self.proportion)
+        if self.bg:
+            # Calculation the new image size with the window proportions, adjusting for height or width depending on image proportions
+            if client_width // self.proportion >= client_height:
+                client_height = int(client_width / self.proportion)
+            else:
+                client_width = int(client_height * self.proportion)
 
-        scaled_background = self.bg.Scale(client_width, client_height, wx.IMAGE_QUALITY_HIGH)
+            scaled_background = self.bg.Scale(client_width, client_height, wx.IMAGE_QUALITY_HIGH)
 
-        dc.Clear()
-        # Drawing the image, aligning to be at the center as it will always be either wider or taller than the window
-        dc.DrawBitmap(wx.Bitmap(scaled_background), (window_size[0]-client_width)//2, (window_size[1]-client_height)//2)
+            dc.Clear()
+            # Drawing the image, aligning to be at the center as it will always be either wider or taller than the window
+            dc.DrawBitmap(wx.Bitmap(scaled_background), (window_size[0]-client_width)//2, (window_size[1]-client_height)//2)
+        else:
+            # Plain fill until the background is downloaded (or while it's released in the low-footprint mode)
+            dc.SetBackground(wx.Brush(wx.Colour(40, 44, 52)))
+            dc.Clear()
 
         font = wx.Font(24, wx.FONTFAMILY_SWISS, wx.FONTSTYLE_NORMAL, wx.FONTWEIGHT_BOLD, 0, "")
         try:
-            if platform_manager.current_platform != 'Darwin' and font.AddPrivateFont(self.font_path):
+            if self.font_path and platform_manager.current_platform != 'Darwin' and font.AddPrivateFont(self.font_path):
                 font.SetFaceName('Poppins')
         except AttributeError:
             pass
@@ -935,14 +5137,90 @@ class MainPanel(wx.Panel):
         dc.SetTextForeground(wx.WHITE)
         dc.DrawText(game_name, 30, 30)
 
+class SettingsDialog(wx.Dialog):
+    def __init__(self, parent):
+        wx.Dialog.__init__(self, parent, wx.ID_ANY, 'Settings')
+
+        sizer_main_vert = wx.BoxSizer(wx.VERTICAL)
+        sizer_grid = wx.FlexGridSizer(cols=2, vgap=4, hgap=8)
+
+        sizer_grid.Add(wx.StaticText(self, wx.ID_ANY, 'Bandwidth limit, KB/s (0 for unlimited):'), 0, wx.ALIGN_CENTER_VERTICAL, 0)
+        self.spin_bandwidth_limit = wx.SpinCtrl(self, wx.ID_ANY, min=0, max=10000000, initial=settings_manager.get('bandwidth_limit'))
+        sizer_grid.Add(self.spin_bandwidth_limit, 0, 0, 0)
+
+        sizer_grid.Add(wx.StaticText(self, wx.ID_ANY, 'Max parallel downloads:'), 0, wx.ALIGN_CENTER_VERTICAL, 0)
+        self.spin_max_downloads = wx.SpinCtrl(self, wx.ID_ANY, min=1, max=32, initial=settings_manager.get('max_concurrent_downloads'))
+        sizer_grid.Add(self.spin_max_downloads, 0, 0, 0)
+
+        sizer_main_vert.Add(sizer_grid, 0, wx.ALL | wx.EXPAND, 8)
+
+        self.checkbox_adaptive_concurrency = wx.CheckBox(self, wx.ID_ANY, 'Adjust the number of parallel downloads automatically')
+        self.checkbox_adaptive_concurrency.SetValue(settings_manager.get('adaptive_concurrency'))
+        sizer_main_vert.Add(self.checkbox_adaptive_concurrency, 0, wx.ALL, 8)
+
+        self.checkbox_background_prefetch = wx.CheckBox(self, wx.ID_ANY, 'Download updates in the background')
+        self.checkbox_background_prefetch.SetValue(settings_manager.get('background_prefetch'))
+        sizer_main_vert.Add(self.checkbox_background_prefetch, 0, wx.ALL, 8)
+
+        self.checkbox_fast_start = wx.CheckBox(self, wx.ID_ANY, 'Start right away, updating the lobby config in the background')
+        self.checkbox_fast_start.SetValue(settings_manager.get('fast_start'))
+        sizer_main_vert.Add(self.checkbox_fast_start, 0, wx.ALL, 8)
+
+        self.checkbox_low_footprint = wx.CheckBox(self, wx.ID_ANY, 'Free the launcher memory while the game is running')
+        self.checkbox_low_footprint.SetValue(settings_manager.get('low_footprint'))
+        sizer_main_vert.Add(self.checkbox_low_footprint, 0, wx.ALL, 8)
+
+        self.checkbox_prewarm_cache = wx.CheckBox(self, wx.ID_ANY, 'Preload the game files before starting')
+        self.checkbox_prewarm_cache.SetValue(settings_manager.get('prewarm_cache'))
+        sizer_main_vert.Add(self.checkbox_prewarm_cache, 0, wx.ALL, 8)
+
+        self.checkbox_engine_gc = wx.CheckBox(self, wx.ID_ANY, 'Remove the engines no config uses after updating')
+        self.checkbox_engine_gc.SetValue(settings_manager.get('engine_gc'))
+        sizer_main_vert.Add(self.checkbox_engine_gc, 0, wx.ALL, 8)
+
+        self.checkbox_peer_cache = wx.CheckBox(self, wx.ID_ANY, 'Share downloads with the launchers on the LAN')
+        self.checkbox_peer_cache.SetValue(settings_manager.get('peer_cache'))
+        sizer_main_vert.Add(self.checkbox_peer_cache, 0, wx.ALL, 8)
+
+        self.checkbox_game_telemetry = wx.CheckBox(self, wx.ID_ANY, 'Record game performance in the log')
+        self.checkbox_game_telemetry.SetValue(settings_manager.get('game_telemetry'))
+        self.checkbox_game_telemetry.Enable(game_session_monitor.is_supported())
+        sizer_main_vert.Add(self.checkbox_game_telemetry, 0, wx.ALL, 8)
+
+        sizer_main_vert.Add(self.CreateStdDialogButtonSizer(wx.OK | wx.CANCEL), 0, wx.ALL | wx.EXPAND, 8)
+
+        self.SetSizerAndFit(sizer_main_vert)
+        self.Centre()
+
+    def ApplySettings(self):
+        settings_manager.set('bandwidth_limit', self.spin_bandwidth_limit.GetValue())
+        settings_manager.set('max_concurrent_downloads', self.spin_max_downloads.GetValue())
+        settings_manager.set('adaptive_concurrency', self.checkbox_adaptive_concurrency.IsChecked())
+        settings_manager.set('game_telemetry', self.checkbox_game_telemetry.IsChecked())
+        settings_manager.set('prewarm_cache', self.checkbox_prewarm_cache.IsChecked())
+        settings_manager.set('engine_gc', self.checkbox_engine_gc.IsChecked())
+        settings_manager.set('fast_start', self.checkbox_fast_start.IsChecked())
+        settings_manager.set('low_footprint', self.checkbox_low_footprint.IsChecked())
+        settings_manager.set('peer_cache', self.checkbox_peer_cache.IsChecked())
+
+        bandwidth_limiter.set_rate(settings_manager.get('bandwidth_limit') * 1024)
+        concurrency_controller.configure(settings_manager.get('max_concurrent_downloads'), settings_manager.get('adaptive_concurrency'))
+        if settings_manager.get('peer_cache'):
+            peer_cache.start()
+        else:
+            peer_cache.stop()
+        self.GetParent().SetPrefetchEnabled(self.checkbox_background_prefetch.IsChecked())
+
 class LauncherFrame(wx.Frame):
 
     def __init__(self, *args, **kwds):
         global main_frame
 
-        icon_path = platform_manager.get_resource_local_path('icon_image', force_download_fresh=False, ignore_download_fail=False)
-        background_path = platform_manager.get_resource_local_path('background_image', force_download_fresh=False, ignore_download_fail=False)
-        font_path = platform_manager.get_resource_local_path('font_file', force_download_fresh=False, ignore_download_fail=False)
+        # Whatever isn't downloaded yet is fetched after the window is opened
+        asset_paths = {resource_name: asset_manager.get_local_path(resource_name) for resource_name in asset_manager.resource_names}
+        icon = asset_manager.get_icon(asset_paths['icon_image'])
+        background_path = asset_paths['background_image']
+        font_path = asset_paths['font_file']
 
         kwds["style"] = kwds.get("style", 0) | wx.CAPTION | wx.CLIP_CHILDREN | wx.CLOSE_BOX | wx.MINIMIZE_BOX | wx.SYSTEM_MENU
         wx.Frame.__init__(self, *args, **kwds)
@@ -998,6 +5276,9 @@ class LauncherFrame(wx.Frame):
         self.button_open_install_dir = wx.Button(self.panel_main, wx.ID_ANY, "Open Install Directory")
         sizer_log_buttonz_horz.Add(self.button_open_install_dir, 0, wx.ALL, 2)
 
+        self.button_settings = wx.Button(self.panel_main, wx.ID_ANY, "Settings")
+        sizer_log_buttonz_horz.Add(self.button_settings, 0, wx.ALL, 2)
+
         sizer_bottom_left_vert.Add((80, 20), 0, wx.ALL, 2)
 
         self.panel_status = wx.Panel(self.panel_main, wx.ID_ANY, style=wx.BORDER_STATIC)
@@ -1027,6 +5308,11 @@ class LauncherFrame(wx.Frame):
         self.checkbox_update.SetBackgroundColour(wx.Colour(236, 236, 236))
         sizer_bottom_right_vert.Add(self.checkbox_update, 0, wx.ALL, 2)
 
+        self.button_update_all = wx.Button(self.panel_main, wx.ID_ANY, "Update All")
+        self.button_update_all.SetMinSize((120, -1))
+        self.button_update_all.SetToolTip('Update every config for this platform without starting the game')
+        sizer_bottom_right_vert.Add(self.button_update_all, 0, wx.ALL, 2)
+
         sizer_bottom_horz.Add((20, 100), 0, 0, 0)
 
         sizer_main_vert.Add((600, 20), 0, wx.ALL, 2)
@@ -1045,14 +5331,16 @@ class LauncherFrame(wx.Frame):
         self.ToggleWindowStyle(wx.STAY_ON_TOP)
         self.ToggleWindowStyle(wx.STAY_ON_TOP)
 
-        self.tray_icon = CustomTaskBarIcon(self, icon_path)
-        self.SetIcon(wx.Icon(icon_path))
+        self.tray_icon = CustomTaskBarIcon(self, icon)
+        self.SetIcon(icon)
 
         self.Bind(wx.EVT_COMBOBOX, self.OnComboboxConfig, self.combobox_config)
         self.Bind(wx.EVT_BUTTON, self.OnButtonToggleLog, self.button_log_toggle)
         self.Bind(wx.EVT_BUTTON, self.OnButtonUploadLog, self.button_log_upload)
         self.Bind(wx.EVT_BUTTON, self.OnButtonOpenInstallDir, self.button_open_install_dir)
+        self.Bind(wx.EVT_BUTTON, self.OnButtonSettings, self.button_settings)
         self.Bind(wx.EVT_BUTTON, self.OnButtonStart, self.button_start)
+        self.Bind(wx.EVT_BUTTON, self.OnButtonUpdateAll, self.button_update_all)
         self.Bind(wx.EVT_CHECKBOX, self.OnCheckboxUpdate, self.checkbox_update)
         self.Bind(wx.EVT_CLOSE, self.OnCloseFrame)
 
@@ -1064,19 +5352,32 @@ class LauncherFrame(wx.Frame):
         EVT_STATUS_UPDATE(self, self.OnStatusUpdate)
         EVT_PROGRESS_UPDATE(self, self.OnProgressUpdate)
         EVT_ICONIZE_WINDOW(self, self.OnIconizeWindow)
+        EVT_PREFETCH_STATUS(self, self.OnPrefetchStatus)
         EVT_LOGGER_MSG(self, self.OnLoggerMsg)
+        EVT_ASSET_LOADED(self, self.OnAssetLoaded)
+        EVT_INSTANCE_COMMAND(self, self.OnInstanceCommand)
 
         self.updater_starter = None
         self.log_uploader = None
+        self.prefetcher = None
+        self.low_footprint = False
+        self.asset_loader = AssetLoaderThread([resource_name for resource_name, path in asset_paths.items() if not path])
 
-    def OnComboboxConfig(self, event=None):
-        config_manager.current_config = config_manager.compatible_configs[self.combobox_config.GetSelection()]
+    def SetPrefetchEnabled(self, enabled):
+        settings_manager.set('background_prefetch', enabled)
 
-        no_downloads = False
-        if 'no_downloads' in config_manager.current_config:
-            no_downloads = config_manager.current_config['no_downloads']
+        if enabled and not self.prefetcher:
+            logger.info('Background prefetch enabled')
+            self.prefetcher = PrefetchThread(settings_manager.get('prefetch_interval'))
+        elif not enabled and self.prefetcher:
+            logger.info('Background prefetch disabled')
+            self.prefetcher.stop()
+            self.prefetcher = None
 
-        self.checkbox_update.SetValue(not no_downloads)
+    def OnComboboxConfig(self, event=None):
+        config_manager.current_config = config_manager.get_compatible_config(self.combobox_config.GetStringSelection())
+
+        self.checkbox_update.SetValue(not config_manager.current_config.no_downloads)
         self.OnCheckboxUpdate()
 
     def SetLogVisible(self, visible):
@@ -1087,6 +5388,44 @@ class LauncherFrame(wx.Frame):
             self.text_ctrl_log.Hide()
             self.SetSize(window_size)
 
+    # While the game runs, drops the background image and the log view, which keeps getting the messages from the log file only
+    def SetLowFootprint(self, enabled):
+        global logger
+
+        if enabled == self.low_footprint:
+            return
+
+        rss_before = memory_manager.get_rss()
+        if enabled:
+            log_text_ctl_handler.suspended = True
+            self.text_ctrl_log.Clear()
+            self.panel_main.ReleaseBackground()
+            memory_manager.trim_heap()
+        else:
+            self.panel_main.LoadBackground()
+            self.text_ctrl_log.SetValue(self.ReadLogTail())
+            self.text_ctrl_log.ShowPosition(self.text_ctrl_log.GetLastPosition())
+            log_text_ctl_handler.suspended = False
+        self.low_footprint = enabled
+
+        state = 'on' if enabled else 'off'
+        logger.info(f'Low-footprint mode {state}, launcher RSS: {memory_manager.format_rss(rss_before)} -> {memory_manager.format_rss(memory_manager.get_rss())}')
+
+    # The end of the log file in the log view format, to fill the view back after the low-footprint mode
+    def ReadLogTail(self, max_size=256 * 1024):
+        log_file_handler.flush()
+        try:
+            with open(log_file_name, 'rb') as f:
+                f.seek(max(0, file_manager.get_file_size(log_file_name) - max_size))
+                lines = f.read().decode('utf-8', errors='replace').splitlines()
+        except OSError:
+            return ''
+
+        # Dropping the first line, it's likely cut in the middle, and the date and level the log view doesn't show
+        if len(lines) > 1:
+            lines = lines[1:]
+        return ''.join(re.sub(r'^\d{4}-\d{2}-\d{2} [\d:,]+ [A-Z]+ ', '', line) + '\n' for line in lines)
+
     def OnButtonToggleLog(self, event):
         self.SetLogVisible(not self.text_ctrl_log.IsShown())
 
@@ -1108,7 +5447,7 @@ class LauncherFrame(wx.Frame):
             logger.info('Uploading, please wait...')
             # File name to save as, with the current Unix timestamp for uniqueness
             object_name = '{0}_{2}{1}'.format(*file_manager.split_extension(log_file_name) + (str(int(time.time() * 1000)),))
-            self.log_uploader = LogUploaderThread(log_file_name, logs_bucket, object_name)
+            self.log_uploader = LogUploaderThread(log_file_name, logs_bucket, object_name, attachments=profile_manager.get_paths())
         else:
             logger.warning('Log upload process is already running!')
 
@@ -1121,6 +5460,13 @@ class LauncherFrame(wx.Frame):
         if not process_starter.start_process(command, nowait=True): # We don't need to track the output or kill the child process on exit
             logger.error(f'Couldn\'t open the install directory: {data_dir}')
 
+    def OnButtonSettings(self, event):
+        dlg = SettingsDialog(self)
+        if dlg.ShowModal() == wx.ID_OK:
+            dlg.ApplySettings()
+            logger.info('Settings saved')
+        dlg.Destroy()
+
     def OnCheckboxUpdate(self, event=None):
         if self.checkbox_update.IsChecked():
             self.button_start.SetLabel('Update\n&& Start')
@@ -1131,25 +5477,43 @@ class LauncherFrame(wx.Frame):
         global logger
 
         if not self.updater_starter:
-            self.button_start.Disable()
             self.checkbox_update.Disable()
             self.combobox_config.Disable()
+            self.button_update_all.Disable()
+            self.button_start.SetLabel('Cancel')
 
             self.updater_starter = UpdaterStarterThread(self.checkbox_update.IsChecked())
         else:
-            logger.warning('Update/Start process is already running!')
+            # The button turns into "Cancel" while updating
+            self.button_start.Disable()
+            self.updater_starter.cancel()
+
+    def OnButtonUpdateAll(self, event):
+        global logger
+
+        if self.updater_starter:
+            return
+
+        logger.info('Updating all the compatible configs')
+        self.checkbox_update.Disable()
+        self.combobox_config.Disable()
+        self.button_update_all.Disable()
+        self.button_start.SetLabel('Cancel')
+
+        self.updater_starter = UpdaterStarterThread(True, configs=config_manager.compatible_configs)
 
     def OnCloseFrame(self, event):
-        global child_process
+        if self.prefetcher:
+            self.prefetcher.stop()
+            prefetch_manager.suspended.set()
 
-        if child_process:
+        if self.updater_starter and async_engine.processes:
             if event.CanVeto():
                 if wx.MessageBox('There is still a child process running, do you want to close it?', 'Confirm closing', wx.ICON_QUESTION | wx.YES_NO) != wx.YES:
                     event.Veto()
                     return
 
-            child_process.terminate() # send sigterm
-            #child_process.kill()      # send sigkill
+        async_engine.terminate_processes()
 
         self.tray_icon.RemoveIcon()
         self.tray_icon.Destroy()
@@ -1158,12 +5522,25 @@ class LauncherFrame(wx.Frame):
     def OnExecFinished(self, event):
         global logger
 
+        self.updater_starter = None
+
         self.gauge_progress.SetValue(0)
         self.button_start.Enable()
         self.checkbox_update.Enable()
         self.combobox_config.Enable()
+        self.button_update_all.Enable()
+        self.OnCheckboxUpdate()
 
-        if event.data:
+        if event.cancelled:
+            self.SetLowFootprint(False)
+            self.label_update_status.SetLabel('Cancelled')
+        elif event.report is not None:
+            # All the configs were updated, nothing was started
+            self.label_update_status.SetLabel(event.data)
+            if any(event.report.values()):
+                self.SetLogVisible(True)
+        elif event.data:
+            self.SetLowFootprint(False)
             self.label_update_status.SetLabel(event.data)
             logger.error('Game process failed! Showing the logs...')
 
@@ -1174,8 +5551,6 @@ class LauncherFrame(wx.Frame):
             logger.info('Game finished successfully! Exiting...')
             self.OnCloseFrame(self)
 
-        self.updater_starter = None
-
     def OnLogUploaded(self, event):
         global logger
 
@@ -1214,7 +5589,60 @@ class LauncherFrame(wx.Frame):
         if not event.data:
             return
 
+        # The game is starting, nothing to cancel anymore
+        self.button_start.Disable()
         self.tray_icon.IconizeWindow(event.data)
+        if settings_manager.get('low_footprint'):
+            self.SetLowFootprint(True)
+
+    def OnPrefetchStatus(self, event):
+        if not event.data:
+            return
+
+        self.tray_icon.SetStatus(event.data)
+
+    def OnAssetLoaded(self, event):
+        if event.resource_name == 'icon_image':
+            icon = asset_manager.get_icon(event.path)
+            self.SetIcon(icon)
+            self.tray_icon.SetAppIcon(icon)
+        elif event.resource_name == 'background_image':
+            # Kept for later while the game is running
+            self.panel_main.SetBackground(event.path, load=not self.low_footprint)
+        elif event.resource_name == 'font_file':
+            self.panel_main.SetFontPath(event.path)
+
+    def OnInstanceCommand(self, event):
+        global logger
+
+        command = event.data.get('command')
+        logger.info(f'Got a command from another launcher: {command}')
+
+        if not self.IsShown() or self.IsIconized():
+            self.SetLowFootprint(False)
+            self.tray_icon.IconizeWindow(False)
+        self.Raise()
+
+        if command == 'show':
+            return
+
+        if self.updater_starter:
+            logger.warning(f'Already updating or running the game, ignoring: {command}')
+            return
+
+        if command == 'start':
+            config_name = event.data.get('config')
+            if config_name:
+                if not config_manager.get_compatible_config(config_name):
+                    logger.error(f'No compatible config named "{config_name}"!')
+                    return
+                self.combobox_config.SetStringSelection(config_name)
+                self.OnComboboxConfig()
+            if self.button_start.IsEnabled():
+                self.OnButtonStart(None)
+        elif command == 'update_all':
+            if self.button_update_all.IsEnabled():
+                self.OnButtonUpdateAll(None)
 
     def OnLoggerMsg(self, event):
         message = event.message.strip('\r')
@@ -1240,10 +5668,28 @@ class BARLauncher(wx.App):
             self.frame_launcher.label_update_status.SetLabel(message)
             self.frame_launcher.button_start.Disable()
             self.frame_launcher.checkbox_update.Disable()
+            self.frame_launcher.button_update_all.Disable()
 
         self.SetTopWindow(self.frame_launcher)
         self.frame_launcher.Show()
 
+        metrics.start()
+        peer_cache.start()
+
+        # From now on, starting the launcher again brings this one up instead
+        try:
+            instance_guard.serve(lambda message: wx.PostEvent(self.frame_launcher, InstanceCommandEvent(message)))
+        except OSError as e:
+            logger.warning(f'Couldn\'t listen for the other launchers: {e}')
+
+        if command_line.has_flag('--start'):
+            wx.PostEvent(self.frame_launcher, InstanceCommandEvent(instance_guard.get_command(command_line.args)))
+
+        # Starting after the config is selected, so the prefetch knows what to download
+        if settings_manager.get('background_prefetch'):
+            self.frame_launcher.SetPrefetchEnabled(True)
+
+        profile_manager.finish_startup()
         return True
 
 if __name__ == "__main__":
@@ -1255,6 +5701,67 @@ if __name__ == "__main__":
         process_starter.start_process([sys.argv[2]], nowait=True)
         sys.exit()
 
+    if command_line.has_flag('--gc'):
+        disk_manager.collect_garbage()
+        sys.exit()
+
+    if command_line.get_option('--make-chunk-index'):
+        source_dir = command_line.get_option('--make-chunk-index')
+        try:
+            chunked_updater.make_index(source_dir, command_line.get_option('--output', file_manager.extract_filename(os.path.normpath(source_dir))))
+        except:
+            logger.error('Indexing failed!')
+            e = str(sys.exc_info()[1])
+            logger.error(e)
+            sys.exit(1)
+        sys.exit()
+
+    if command_line.has_flag('--dry-run'):
+        try:
+            if command_line.has_flag('--update-all'):
+                configs = config_manager.compatible_configs
+            else:
+                configs = [config_manager.get_compatible_config(command_line.get_option('--config'))]
+            if not configs or not configs[0]:
+                raise Exception(f'No configs found for {platform_manager.current_platform} platform!')
+
+            plans = [update_planner.plan(config) for config in configs]
+            for plan in plans:
+                update_planner.log_plan(plan)
+            file_manager.write_json(update_planner.plan_path, plans)
+        except:
+            logger.error('Planning the update failed!')
+            e = str(sys.exc_info()[1])
+            logger.error(e)
+            sys.exit(1)
+        sys.exit()
+
+    if command_line.has_flag('--update-all'):
+        if not config_manager.compatible_configs:
+            logger.error(f'No configs found for {platform_manager.current_platform} platform!')
+            sys.exit(1)
+        profile_manager.finish_startup()
+        updater = UpdaterStarterThread(True, configs=config_manager.compatible_configs)
+        updater.join()
+        # Failing unless every config is ready to launch
+        sys.exit(0 if updater.report and not any(updater.report.values()) else 1)
+
+    if command_line.get_option('--export-bundle') or command_line.get_option('--import-bundle'):
+        try:
+            if command_line.get_option('--export-bundle'):
+                config = config_manager.get_compatible_config(command_line.get_option('--config'))
+                if not config:
+                    raise Exception('No compatible config to export!')
+                bundle_manager.export_bundle(command_line.get_option('--export-bundle'), config)
+            else:
+                bundle_manager.import_bundle(command_line.get_option('--import-bundle'))
+        except:
+            logger.error('Bundle failed!')
+            e = str(sys.exc_info()[1])
+            logger.error(e)
+            sys.exit(1)
+        sys.exit()
+
     # Ugly workaround to hide a black console window on Windows (can't use "pyinstaller --noconsole" because it disables stdout completely)
     if platform.system() == 'Windows':
         if getattr(sys, 'frozen', False):